@@ -9,113 +9,295 @@ Agents spécialisés basés sur PocketFlow:
 - CoderAgent: Génération de code
 """
 
+import asyncio
 import yaml
-from typing import Any, Dict, Optional, Callable, List
-
-from pocketflow import Node, AsyncNode
-from models import AgentConfig, LLMProvider
-from utils.llm import call_llm
+from typing import Any, Dict, Optional, Callable, List, Tuple, Type
 
+from pydantic import BaseModel
 
-class BaseAgent(Node):
-    """Agent de base avec fonctionnalités enrichies"""
+from pocketflow import Node, AsyncNode
+from models import (
+    AgentConfig, LLMProvider,
+    ResearchOutput, WriterOutput, ReviewOutput, CodeOutput, BuilderAction
+)
+from utils.events import PARTIAL_OUTPUT, PROMPT_TRIMMED, TOKEN, emit_event
+from utils.llm import call_llm, acall_llm, stream_llm, astream_llm, json_response_format
+from utils.batching import get_llm_batcher
+from agents.parsing import IncrementalParser, OutputParser
+from agents.history import HistoryPolicy, get_history_policy
+from agents.prompting import PromptBuilder, PromptPrefix, PromptReport, prefix_registry, prompt_budget
+
+
+class BaseAgent(AsyncNode):
+    """Agent de base avec fonctionnalités enrichies.
+
+    Utilisable en synchrone (`run` → `exec`) comme en asynchrone
+    (`run_async` → `exec_async`, appel LLM non bloquant).
+
+    Avec `config.stream`, la réponse est consommée token par token: chaque
+    chunk est publié sur l'exécution en cours (événement `token`) et la
+    sortie structurée partielle est passée à `on_partial_output`.
+    Avec `config.batch`, les appels asynchrones simultanés du même provider
+    (ex: AsyncParallelBatchNode sur 10k documents) partent par lots.
+
+    La partie statique du prompt (système, outils, format) est compilée à la
+    construction en `prompt_prefix` et envoyée comme prompt système, pour
+    profiter du cache de préfixe des providers; `build_prompt` ne produit
+    que la partie variable (contexte, historiques, input).
+
+    `output_schema` (modèle pydantic) valide la sortie structurée; en
+    `output_format` json, il est aussi transmis au mode JSON natif du provider.
+    """
+    
+    output_schema: Optional[Type[BaseModel]] = None
+    
+    # Clés de la sortie de `prep` qui sont des historiques (sections élagables du prompt)
+    history_keys: Tuple[str, ...] = ()
+    
+    OUTPUT_FORMAT_INSTRUCTIONS = {
+        "yaml": "Répondez en YAML valide.",
+        "json": "Répondez en JSON valide.",
+    }
     
     def __init__(self, config: AgentConfig, **kwargs):
         super().__init__(max_retries=config.max_retries, **kwargs)
         self.config = config
         self.tools: Dict[str, Callable] = {}
+        self.prompt_report: Optional[PromptReport] = None
+        self.prompt_prefix: PromptPrefix = self.compile_prefix()
+        self.output_parser = OutputParser(config.output_format, self.output_schema)
     
     @property
     def name(self) -> str:
         return self.config.name
     
+    @property
+    def history_policy(self) -> HistoryPolicy:
+        """Rétention des historiques de l'agent (config.history_retention)"""
+        return get_history_policy(self.config.history_retention)
+    
+    def append_history(self, shared: Dict, key: str, item: Any) -> None:
+        """Ajoute `item` à l'historique `key` de l'état partagé, borné par la politique"""
+        shared[key] = self.history_policy.append(shared.get(key, []), item, key)
+    
+    async def post_async(self, shared: Dict, prep_res: Any, exec_res: Any) -> str:
+        # Une politique qui écrit sur disque (spill) ne doit pas bloquer la boucle
+        if self.history_policy.blocking:
+            return await asyncio.to_thread(self.post, shared, prep_res, exec_res)
+        return self.post(shared, prep_res, exec_res)
+    
     def register_tool(self, name: str, func: Callable):
         """Enregistre un outil utilisable par l'agent"""
         self.tools[name] = func
+        self.prompt_prefix = self.compile_prefix()
+    
+    def compile_prefix(self) -> PromptPrefix:
+        """Compile la partie statique du prompt (partagée via le registre de préfixes)"""
+        return prefix_registry.compile(
+            [
+                ("System", self.config.system_prompt),
+                ("Outils disponibles", "\n".join(f"- {name}" for name in self.tools)),
+                ("Format de sortie", self.OUTPUT_FORMAT_INSTRUCTIONS.get(self.config.output_format, "")),
+            ],
+            model=self.config.model_name
+        )
     
     def build_prompt(
         self, 
-        user_input: str, 
+        user_input: Any, 
         context: Optional[Dict] = None
     ) -> str:
-        """Construit le prompt complet"""
-        parts = [f"# System\n{self.config.system_prompt}"]
-        
-        # Ajouter les outils disponibles
-        if self.tools:
-            tools_desc = "\n".join([f"- {name}" for name in self.tools])
-            parts.append(f"\n# Outils disponibles\n{tools_desc}")
+        """Construit la partie variable du prompt dans le budget de tokens du modèle.
+
+        Le budget est celui du modèle moins la réponse (`config.max_tokens`)
+        et `prompt_prefix`, envoyé à part comme prompt système. Si
+        `user_input` est un dict (sortie de `prep`), ses historiques
+        (`history_keys`) deviennent des sections élaguées en premier, des
+        éléments les plus anciens aux plus récents. Les réductions sont
+        décrites dans `prompt_report` et publiées (événement `prompt_trimmed`).
+        """
+        budget = prompt_budget(
+            self.config.model_name,
+            self.config.max_prompt_tokens,
+            output_tokens=self.config.max_tokens
+        )
+        builder = PromptBuilder(max(budget - self.prompt_prefix.tokens, 1), model=self.config.model_name)
         
         # Ajouter le contexte
         if context:
-            parts.append(f"\n# Contexte\n{yaml.dump(context, allow_unicode=True)}")
-        
-        # Ajouter l'input utilisateur
-        parts.append(f"\n# Input\n{user_input}")
+            builder.add("context", yaml.dump(context, allow_unicode=True), "Contexte", priority=20)
         
-        # Spécifier le format de sortie
-        if self.config.output_format == "yaml":
-            parts.append("\n# Format de sortie\nRépondez en YAML valide.")
-        elif self.config.output_format == "json":
-            parts.append("\n# Format de sortie\nRépondez en JSON valide.")
+        # Ajouter l'input utilisateur (les historiques à part, élagables)
+        if isinstance(user_input, dict):
+            histories = {
+                key: value
+                for key, value in user_input.items()
+                if key in self.history_keys and isinstance(value, list)
+            }
+            for key, items in histories.items():
+                builder.add_items(key, items, f"Historique: {key}", priority=10)
+            fields = {key: value for key, value in user_input.items() if key not in histories}
+            user_input = yaml.dump(fields, allow_unicode=True, sort_keys=False) if fields else ""
+        builder.add("input", str(user_input), "Input", priority=90, required=True)
         
-        return "\n".join(parts)
-    
-    def parse_output(self, raw_output: str) -> Any:
-        """Parse la sortie selon le format configuré"""
-        if self.config.output_format == "yaml":
-            try:
-                # Extraire le YAML des blocs de code si présent
-                if "```yaml" in raw_output:
-                    yaml_content = raw_output.split("```yaml")[1].split("```")[0]
-                    return yaml.safe_load(yaml_content)
-                return yaml.safe_load(raw_output)
-            except yaml.YAMLError:
-                return {"raw": raw_output, "parse_error": True}
-        elif self.config.output_format == "json":
-            import json
-            try:
-                if "```json" in raw_output:
-                    json_content = raw_output.split("```json")[1].split("```")[0]
-                    return json.loads(json_content)
-                return json.loads(raw_output)
-            except json.JSONDecodeError:
-                return {"raw": raw_output, "parse_error": True}
-        return raw_output
+        prompt, self.prompt_report = builder.build()
+        if self.prompt_report.trimmed:
+            emit_event(
+                PROMPT_TRIMMED,
+                node_id=getattr(self, "node_id", None),
+                node_name=self.name,
+                prefix_tokens=self.prompt_prefix.tokens,
+                **self.prompt_report.to_dict()
+            )
+        return prompt
+    
+    def parse_output(self, raw_output: str, native: bool = False) -> Any:
+        """Parse la sortie selon le format configuré (voir agents.parsing.OutputParser).
+
+        `native`: réponse produite par le mode JSON du provider.
+        """
+        return self.output_parser.parse(raw_output, native=native)
+    
+    def response_format(self) -> Optional[Dict[str, Any]]:
+        """Sortie JSON native demandée au provider (output_format json), sinon None"""
+        if self.config.output_format != "json" or not self.config.native_output:
+            return None
+        schema = self.output_parser.json_schema
+        return json_response_format(schema, name=self.output_schema.__name__ if schema else "output")
+    
+    def on_partial_output(self, partial: Any) -> None:
+        """Appelé pendant un stream quand la sortie partielle évolue.
+
+        Par défaut, publie un événement `partial_output` quand l'ensemble des
+        clés de premier niveau change (une clé de plus = un champ terminé
+        exploitable en aval), sans republier à chaque token.
+        """
+        keys = list(partial) if isinstance(partial, dict) else None
+        if keys is not None and keys == self._partial_keys:
+            return
+        self._partial_keys = keys
+        emit_event(
+            PARTIAL_OUTPUT,
+            node_id=getattr(self, "node_id", None),
+            node_name=self.name,
+            output=partial
+        )
+    
+    def _start_stream(self) -> IncrementalParser:
+        self._partial_keys = None
+        return IncrementalParser(self.config.output_format)
+    
+    def _on_chunk(self, parser: IncrementalParser, index: int, chunk: str) -> None:
+        emit_event(
+            TOKEN,
+            node_id=getattr(self, "node_id", None),
+            node_name=self.name,
+            index=index,
+            text=chunk
+        )
+        partial = parser.feed(chunk)
+        if partial is not None:
+            self.on_partial_output(partial)
     
     def exec(self, prep_res: Any) -> Any:
         """Exécute l'appel LLM"""
-        prompt = self.build_prompt(str(prep_res))
+        prompt = self.build_prompt(prep_res)
+        response_format = self.response_format()
+        if self.config.stream:
+            parser = self._start_stream()
+            chunks = stream_llm(
+                prompt,
+                model=self.config.model_name,
+                provider=self.config.model_provider,
+                temperature=self.config.temperature,
+                max_tokens=self.config.max_tokens,
+                system_prompt=self.prompt_prefix.text,
+                response_format=response_format
+            )
+            for index, chunk in enumerate(chunks):
+                self._on_chunk(parser, index, chunk)
+            return self.parse_output(parser.text, native=response_format is not None)
         raw_output = call_llm(
             prompt,
             model=self.config.model_name,
             provider=self.config.model_provider,
-            temperature=self.config.temperature
+            temperature=self.config.temperature,
+            max_tokens=self.config.max_tokens,
+            system_prompt=self.prompt_prefix.text,
+            use_cache=self.config.cache_responses,
+            response_format=response_format
         )
-        return self.parse_output(raw_output)
+        return self.parse_output(raw_output, native=response_format is not None)
+    
+    async def exec_async(self, prep_res: Any) -> Any:
+        """Exécute l'appel LLM sans bloquer la boucle d'événements"""
+        prompt = self.build_prompt(prep_res)
+        response_format = self.response_format()
+        if self.config.stream:
+            parser = self._start_stream()
+            chunks = astream_llm(
+                prompt,
+                model=self.config.model_name,
+                provider=self.config.model_provider,
+                temperature=self.config.temperature,
+                max_tokens=self.config.max_tokens,
+                system_prompt=self.prompt_prefix.text,
+                response_format=response_format
+            )
+            index = 0
+            async for chunk in chunks:
+                self._on_chunk(parser, index, chunk)
+                index += 1
+            return self.parse_output(parser.text, native=response_format is not None)
+        if self.config.batch:
+            raw_output = await get_llm_batcher(self.config.model_provider).acall(
+                prompt,
+                model=self.config.model_name,
+                temperature=self.config.temperature,
+                max_tokens=self.config.max_tokens,
+                system_prompt=self.prompt_prefix.text,
+                use_cache=self.config.cache_responses,
+                response_format=response_format
+            )
+            return self.parse_output(raw_output, native=response_format is not None)
+        raw_output = await acall_llm(
+            prompt,
+            model=self.config.model_name,
+            provider=self.config.model_provider,
+            temperature=self.config.temperature,
+            max_tokens=self.config.max_tokens,
+            system_prompt=self.prompt_prefix.text,
+            use_cache=self.config.cache_responses,
+            response_format=response_format
+        )
+        return self.parse_output(raw_output, native=response_format is not None)
 
 
-class AsyncBaseAgent(AsyncNode):
-    """Version asynchrone de BaseAgent"""
-    
-    def __init__(self, config: AgentConfig, **kwargs):
-        super().__init__(max_retries=config.max_retries, **kwargs)
-        self.config = config
-        self.tools: Dict[str, Callable] = {}
-    
-    # Mêmes méthodes que BaseAgent...
-    # (omis pour concision, identique à BaseAgent)
+class AsyncBaseAgent(BaseAgent):
+    """Version asynchrone de BaseAgent (conservée pour compatibilité).
+
+    BaseAgent implémente désormais `exec_async` directement.
+    """
 
 
 # =============================================================================
 # AGENTS SPÉCIALISÉS
 # =============================================================================
 
+def _agent_config(overrides: Optional[Dict[str, Any]], **defaults) -> AgentConfig:
+    """Config par défaut d'un agent, surchargée par `config_overrides`"""
+    return AgentConfig(**{**defaults, **(overrides or {})})
+
+
 class ResearchAgent(BaseAgent):
     """Agent spécialisé en recherche d'information"""
     
+    output_schema = ResearchOutput
+    history_keys = ("history",)
+    
     def __init__(self, **kwargs):
-        config = AgentConfig(
+        config = _agent_config(
+            kwargs.get("config_overrides"),
             name="Research Agent",
             description="Agent de recherche et analyse d'information",
             system_prompt="""Vous êtes un assistant de recherche expert.
@@ -132,8 +314,7 @@ confidence: high/medium/low
 sources_needed: true/false
 summary: <résumé concis>
 ```""",
-            output_format="yaml",
-            **kwargs.get("config_overrides", {})
+            output_format="yaml"
         )
         super().__init__(config)
     
@@ -146,9 +327,7 @@ summary: <résumé concis>
     
     def post(self, shared: Dict, prep_res: Any, exec_res: Any) -> str:
         # Sauvegarder les résultats
-        if "research_history" not in shared:
-            shared["research_history"] = []
-        shared["research_history"].append(exec_res)
+        self.append_history(shared, "research_history", exec_res)
         shared["latest_research"] = exec_res
         
         # Décider de la prochaine action
@@ -164,8 +343,11 @@ summary: <résumé concis>
 class WriterAgent(BaseAgent):
     """Agent spécialisé en rédaction"""
     
+    output_schema = WriterOutput
+    
     def __init__(self, **kwargs):
-        config = AgentConfig(
+        config = _agent_config(
+            kwargs.get("config_overrides"),
             name="Writer Agent",
             description="Agent de rédaction de contenu professionnel",
             system_prompt="""Vous êtes un rédacteur professionnel.
@@ -183,8 +365,7 @@ sections:
   - name: <nom section>
     content: <contenu>
 ```""",
-            output_format="yaml",
-            **kwargs.get("config_overrides", {})
+            output_format="yaml"
         )
         super().__init__(config)
     
@@ -207,8 +388,12 @@ sections:
 class ReviewerAgent(BaseAgent):
     """Agent spécialisé en révision et qualité"""
     
+    output_schema = ReviewOutput
+    history_keys = ("previous_reviews",)
+    
     def __init__(self, **kwargs):
-        config = AgentConfig(
+        config = _agent_config(
+            kwargs.get("config_overrides"),
             name="Reviewer Agent",
             description="Agent de révision et contrôle qualité",
             system_prompt="""Vous êtes un éditeur expert.
@@ -227,8 +412,7 @@ feedback: <feedback général>
 revised_content: |
   <version révisée si non approuvé>
 ```""",
-            output_format="yaml",
-            **kwargs.get("config_overrides", {})
+            output_format="yaml"
         )
         super().__init__(config)
     
@@ -245,9 +429,7 @@ revised_content: |
     
     def post(self, shared: Dict, prep_res: Any, exec_res: Any) -> str:
         # Sauvegarder la révision
-        if "review_history" not in shared:
-            shared["review_history"] = []
-        shared["review_history"].append(exec_res)
+        self.append_history(shared, "review_history", exec_res)
         shared["latest_review"] = exec_res
         
         if isinstance(exec_res, dict):
@@ -266,8 +448,11 @@ revised_content: |
 class CoderAgent(BaseAgent):
     """Agent spécialisé en génération de code"""
     
+    output_schema = CodeOutput
+    
     def __init__(self, **kwargs):
-        config = AgentConfig(
+        config = _agent_config(
+            kwargs.get("config_overrides"),
             name="Coder Agent",
             description="Agent de génération et analyse de code",
             system_prompt="""Vous êtes un développeur expert.
@@ -287,7 +472,6 @@ notes: <notes importantes>
 ```""",
             output_format="yaml",
             model_name="gpt-4o",  # Meilleur pour le code
-            **kwargs.get("config_overrides", {})
         )
         super().__init__(config)
     
@@ -310,8 +494,11 @@ notes: <notes importantes>
 class AgentBuilder(BaseAgent):
     """Agent Builder - Gère la création/modification/suppression d'agents et workflows via MCP Tools"""
     
+    output_schema = BuilderAction
+    
     def __init__(self, **kwargs):
-        config = AgentConfig(
+        config = _agent_config(
+            kwargs.get("config_overrides"),
             name="Agent Builder",
             description="Agent spécialisé en création et gestion d'agents et workflows",
             system_prompt="""Vous êtes un expert en orchestration d'agents IA.
@@ -347,8 +534,7 @@ Sortie JSON attendue:
   "reason": "Explication de l'action"
 }
 ```""",
-            output_format="json",
-            **kwargs.get("config_overrides", {})
+            output_format="json"
         )
         super().__init__(config)
         self.tool_registry = None  # Sera injecté par le flow
@@ -0,0 +1,252 @@
+"""
+Rétention des historiques d'agents
+
+Les agents qui bouclent (recherche, révision) accumulent leurs résultats
+dans l'état partagé (`research_history`, `review_history`) et les
+renvoient dans leurs prompts. Une politique de rétention borne ces listes:
+- all: tout conserver
+- ring:N: les N derniers éléments
+- summary:N: au-delà de N, les plus anciens sont résumés en un élément
+  `{"summary": ..., "compacted": n}` (résumé extractif, sans appel LLM)
+- spill:N: au-delà de N, les plus anciens sont déversés sur disque
+  (storage.history), paginables via l'API
+
+`append` retourne toujours une nouvelle liste (état partagé copy-on-write),
+un `History` qui numérote les ajouts: des branches parallèles (FanOut, DAG)
+ayant chacune borné l'historique, `merge_writes` rejoue sur l'état fusionné
+les éléments ajoutés par chaque branche au lieu de garder la dernière.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Flux de l'exécution en cours (execution_id), positionné par le moteur
+history_stream: ContextVar[Optional[str]] = ContextVar("history_stream", default=None)
+
+DEFAULT_HISTORY_RETENTION = os.getenv("AGENT_HISTORY_RETENTION", "all")
+
+
+class History(list):
+    """Historique numéroté: `seq` éléments ajoutés depuis `origin`.
+
+    Une liste ordinaire (état initial, checkpoint relu) devient un History
+    d'origine dérivée de son contenu, identique pour toutes les branches
+    parties du même état. Sérialisé comme une liste.
+    """
+
+    def __init__(self, items=(), seq: int = 0, origin: str = "", policy: "HistoryPolicy" = None, key: str = ""):
+        super().__init__(items)
+        self.seq = seq
+        self.origin = origin
+        self.policy = policy
+        self.key = key
+
+    @classmethod
+    def of(cls, history: Optional[List[Any]], policy: "HistoryPolicy", key: str) -> "History":
+        """`history` tel quel si c'est un History, sinon numéroté à partir de son contenu"""
+        if isinstance(history, History):
+            return history
+        items = list(history or [])
+        digest = hashlib.sha1(json.dumps(items, sort_keys=True, default=str).encode()).hexdigest()[:16]
+        return cls(items, seq=len(items), origin=digest, policy=policy, key=key)
+
+    def derive(self, items: List[Any], added: int = 1) -> "History":
+        """Nouvel historique de même origine, après `added` ajouts"""
+        return History(items, self.seq + added, self.origin, self.policy, self.key)
+
+    def item_id(self, index: int) -> str:
+        """Identifiant stable de l'élément `index` (hors résumé): `<origin>:<numéro>`"""
+        return f"{self.origin}:{self.seq - len(self) + index + 1}"
+
+    def merge_into(self, original: Optional[List[Any]], current: Any) -> List[Any]:
+        """Fusion par merge_writes: rejoue sur `current` les ajouts faits depuis `original`"""
+        if not isinstance(current, list) or current == (original or []):
+            return self
+        added = self.seq - History.of(original, self.policy, self.key).seq
+        if added <= 0 or self.policy is None:
+            return current
+        merged = current
+        for item in self[-added:]:
+            if not is_summary(item):
+                merged = self.policy.append(merged, item, self.key)
+        return merged
+
+
+class HistoryPolicy(ABC):
+    """Politique de rétention d'un historique"""
+
+    # `append` fait des I/O: l'agent l'appelle hors de la boucle d'événements
+    blocking = False
+
+    @abstractmethod
+    def append(self, history: List[Any], item: Any, key: str) -> History:
+        """Retourne l'historique (nouvelle liste) après ajout de `item`"""
+
+
+class KeepAll(HistoryPolicy):
+    """Historique non borné"""
+
+    def append(self, history: List[Any], item: Any, key: str) -> History:
+        history = History.of(history, self, key)
+        return history.derive(list(history) + [item])
+
+
+class RingBuffer(HistoryPolicy):
+    """Conserve les `max_items` derniers éléments"""
+
+    def __init__(self, max_items: int):
+        if max_items < 1:
+            raise ValueError("max_items doit être >= 1")
+        self.max_items = max_items
+
+    def append(self, history: List[Any], item: Any, key: str) -> History:
+        history = History.of(history, self, key)
+        return history.derive((list(history) + [item])[-self.max_items:])
+
+
+def is_summary(item: Any) -> bool:
+    return isinstance(item, dict) and "summary" in item and "compacted" in item
+
+
+def extractive_summary(items: List[Any], max_chars: int = 2000, item_chars: int = 200) -> str:
+    """Résumé extractif: début de chaque élément, le tout borné à `max_chars`"""
+    parts = []
+    for item in items:
+        if is_summary(item):
+            parts.append(str(item["summary"]))
+            continue
+        text = " ".join(str(item).split())
+        parts.append(text if len(text) <= item_chars else text[:item_chars - 1] + "…")
+    summary = " | ".join(parts)
+    # Les éléments récents sont les plus utiles: on coupe par le début
+    return summary if len(summary) <= max_chars else "…" + summary[-(max_chars - 1):]
+
+
+class SummarizeCompact(HistoryPolicy):
+    """Au-delà de `max_items`, résume les plus anciens en un seul élément.
+
+    Les `keep_recent` derniers éléments restent intacts; le résumé précédent
+    est intégré au nouveau. `summarizer` (ex: appel LLM) remplace le résumé
+    extractif par défaut.
+    """
+
+    def __init__(
+        self,
+        max_items: int,
+        keep_recent: Optional[int] = None,
+        summarizer: Callable[[List[Any]], str] = extractive_summary
+    ):
+        if max_items < 2:
+            raise ValueError("max_items doit être >= 2")
+        self.max_items = max_items
+        self.keep_recent = keep_recent if keep_recent is not None else max_items // 2
+        self.summarizer = summarizer
+
+    def append(self, history: List[Any], item: Any, key: str) -> History:
+        history = History.of(history, self, key)
+        items = list(history) + [item]
+        if len(items) <= self.max_items:
+            return history.derive(items)
+        split = len(items) - self.keep_recent
+        old, recent = items[:split], items[split:]
+        compacted = sum(entry["compacted"] if is_summary(entry) else 1 for entry in old)
+        return history.derive([{"summary": self.summarizer(old), "compacted": compacted}] + recent)
+
+
+class SpillToDisk(HistoryPolicy):
+    """Au-delà de `max_items`, déplace les plus anciens dans un store sur disque.
+
+    Le flux est `<execution_id>/<clé>` (execution_id lu dans `history_stream`).
+    Chaque élément est déversé avec son `History.item_id`: des branches
+    parallèles qui déversent les mêmes éléments anciens ne les dupliquent pas.
+    """
+
+    blocking = True
+
+    def __init__(self, max_items: int, store=None):
+        if max_items < 1:
+            raise ValueError("max_items doit être >= 1")
+        self.max_items = max_items
+        self._store = store
+
+    @property
+    def store(self):
+        if self._store is not None:
+            return self._store
+        from storage.history import get_history_store
+        return get_history_store()
+
+    def append(self, history: List[Any], item: Any, key: str) -> History:
+        history = History.of(history, self, key)
+        history = history.derive(list(history) + [item])
+        overflow = len(history) - self.max_items
+        if overflow <= 0:
+            return history
+        self.store.append(
+            spill_stream(key),
+            history[:overflow],
+            item_ids=[history.item_id(index) for index in range(overflow)]
+        )
+        return history.derive(history[overflow:], added=0)
+
+
+def spill_stream(key: str, execution_id: Optional[str] = None) -> str:
+    """Nom du flux de déversement d'un historique"""
+    return f"{execution_id or history_stream.get() or 'default'}/{key}"
+
+
+_policies: Dict[str, HistoryPolicy] = {}
+_policies_lock = threading.Lock()
+
+
+def create_history_policy(spec: Optional[str] = None) -> HistoryPolicy:
+    """Crée la politique décrite par `spec` (défaut: AGENT_HISTORY_RETENTION).
+
+    `all`, `ring:N`, `summary:N` ou `spill:N`.
+    """
+    spec = (spec or DEFAULT_HISTORY_RETENTION).strip().lower()
+    kind, _, size = spec.partition(":")
+    if kind == "all":
+        return KeepAll()
+    try:
+        max_items = int(size)
+    except ValueError:
+        raise ValueError(f"Politique d'historique invalide: {spec}") from None
+    if kind == "ring":
+        return RingBuffer(max_items)
+    if kind == "summary":
+        return SummarizeCompact(max_items)
+    if kind == "spill":
+        return SpillToDisk(max_items)
+    raise ValueError(f"Politique d'historique inconnue: {spec}")
+
+
+def get_history_policy(spec: Optional[str] = None) -> HistoryPolicy:
+    """Politique partagée pour `spec` (créée une seule fois)"""
+    spec = spec or DEFAULT_HISTORY_RETENTION
+    policy = _policies.get(spec)
+    if policy is None:
+        with _policies_lock:
+            policy = _policies.setdefault(spec, create_history_policy(spec))
+    return policy
+
+
+__all__ = [
+    "history_stream",
+    "History",
+    "HistoryPolicy",
+    "KeepAll",
+    "RingBuffer",
+    "SummarizeCompact",
+    "SpillToDisk",
+    "extractive_summary",
+    "spill_stream",
+    "create_history_policy",
+    "get_history_policy",
+]
@@ -0,0 +1,389 @@
+"""
+Parsing des sorties d'agents
+
+`OutputParser.parse(raw)` parse une réponse complète:
+1. sortie JSON native du provider (mode JSON): `json.loads` direct
+2. bloc ``` du format (ou texte entier), chargé avec le loader YAML C
+   (libyaml, `CSafeLoader`) quand il est disponible
+3. en cas d'échec, passe de réparation peu coûteuse (texte autour du
+   document, virgules finales, structures non fermées, valeurs YAML
+   contenant `: `...)
+4. validation optionnelle contre le schéma pydantic de l'agent
+Sinon, repli sur `{"raw": ..., "parse_error": True}`. Le chemin suivi est
+compté dans `agent_output_parse_total`.
+
+Pendant un stream, `IncrementalParser.feed(chunk)` retourne la sortie
+structurée partielle (dict/list) dès qu'elle évolue, pour que la logique
+aval puisse démarrer avant la fin de la génération.
+
+- YAML: chaque bloc de premier niveau (`clé: ...`) est parsé une seule
+  fois quand il est complet; seul le bloc en cours est re-parsé, et de
+  moins en moins souvent quand il grossit (coût total linéaire).
+- JSON: un scanner incrémental suit chaînes et crochets ouverts; le texte
+  reçu est complété par les fermetures manquantes avant `json.loads`.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import yaml
+from pydantic import BaseModel, ValidationError
+
+from utils.metrics import AGENT_OUTPUT_PARSE
+
+
+# Loader C (libyaml) si PyYAML a été compilé avec, sinon le loader Python
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_yaml(text: str) -> Any:
+    """Équivalent de `yaml.safe_load`, avec le loader C quand il est disponible"""
+    return yaml.load(text, Loader=YAML_LOADER)
+
+
+_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*$")
+_TOP_LEVEL_KEY = re.compile(r"^[^\s#\-][^:]*:(\s|$)")
+
+# Re-parse du bloc en cours: toujours sous ce seuil, sinon après croissance de 50%
+_SMALL_BLOCK = 2048
+_GROWTH = 1.5
+
+
+class IncrementalParser:
+    """Parse au fil de l'eau une sortie YAML ou JSON (éventuellement dans un bloc ```)"""
+
+    def __init__(self, output_format: str = "yaml"):
+        self.output_format = output_format
+        self._chunks: List[str] = []
+        self._last: Any = None
+        if output_format == "json":
+            self._json = _JSONScanner()
+        else:
+            self._pending_line = ""
+            self._in_fence = False
+            self._fence_closed = False
+            self._started = False
+            self._done: Dict[str, Any] = {}
+            self._reset_block()
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        """Ajoute un chunk; retourne la nouvelle sortie partielle si elle a changé"""
+        self._chunks.append(chunk)
+        if self.output_format == "json":
+            partial = self._json.feed(chunk)
+        elif self.output_format == "yaml":
+            partial = self._feed_yaml(chunk)
+        else:
+            return None
+        if partial is None or partial == self._last:
+            return None
+        self._last = partial
+        return partial
+
+    @property
+    def text(self) -> str:
+        """Texte reçu jusqu'ici"""
+        return "".join(self._chunks)
+
+    @property
+    def partial(self) -> Any:
+        """Dernière sortie partielle connue"""
+        return self._last
+
+    # -- YAML -----------------------------------------------------------------
+
+    def _feed_yaml(self, chunk: str) -> Optional[Any]:
+        lines = (self._pending_line + chunk).split("\n")
+        self._pending_line = lines.pop()
+        changed = False
+        for line in lines:
+            changed = self._add_yaml_line(line) or changed
+        if not changed:
+            return None
+        return self._yaml_partial()
+
+    def _add_yaml_line(self, line: str) -> bool:
+        """Traite une ligne complète; retourne True si un parse est utile"""
+        if self._fence_closed:
+            return False
+        if _FENCE.match(line):
+            if self._in_fence:
+                self._fence_closed = True
+                return self._close_block()
+            # Ouverture du bloc: ce qui précède était du texte libre
+            self._in_fence = True
+            self._started = False
+            self._done = {}
+            self._reset_block()
+            return False
+        if not self._started and not line.strip():
+            return False
+        self._started = True
+
+        if _TOP_LEVEL_KEY.match(line) and self._block:
+            self._close_block()
+        self._block.append(line)
+        self._block_size += len(line) + 1
+        return (
+            self._block_size < _SMALL_BLOCK
+            or self._block_size >= self._block_parsed_size * _GROWTH
+        )
+
+    def _reset_block(self) -> None:
+        self._block = []
+        self._block_size = 0
+        self._block_parsed_size = 0
+
+    def _close_block(self) -> bool:
+        """Parse définitivement le bloc de premier niveau terminé"""
+        if not self._block:
+            return False
+        value = _safe_yaml("\n".join(self._block))
+        if isinstance(value, dict):
+            self._done.update(value)
+        self._reset_block()
+        return True
+
+    def _yaml_partial(self) -> Optional[Any]:
+        if not self._block:
+            return dict(self._done) if self._done else None
+        self._block_parsed_size = self._block_size
+        value = _safe_yaml("\n".join(self._block))
+        if isinstance(value, dict):
+            return {**self._done, **value}
+        if not self._done and value is not None and not isinstance(value, str):
+            return value  # Sortie non mappée (ex: liste)
+        return dict(self._done) if self._done else None
+
+
+def _safe_yaml(text: str) -> Any:
+    try:
+        return load_yaml(text)
+    except yaml.YAMLError:
+        return None
+
+
+class _JSONScanner:
+    """Suit l'état lexical d'un JSON reçu par morceaux (une seule passe par caractère)"""
+
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.length = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+        self.stack: List[str] = []
+        # Positions où couper proprement, avec les fermetures nécessaires
+        self.cuts: List[Tuple[int, str]] = []
+        self.structural = False
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        for char in chunk:
+            self._scan(char)
+        if not self.structural or not self.started:
+            return None
+        self.structural = False
+        return self._parse()
+
+    def _scan(self, char: str) -> None:
+        if not self.started:
+            if char not in "{[":
+                return  # Texte ou ```json avant le document
+            self.started = True
+        if not self.stack and self.length and not self.in_string:
+            return  # Document terminé (ex: ``` fermant)
+
+        self.buffer.append(char)
+        self.length += 1
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif char == "\\":
+                self.escape = True
+            elif char == '"':
+                self.in_string = False
+            return
+
+        if char == '"':
+            self.in_string = True
+        elif char in "{[":
+            self.stack.append("}" if char == "{" else "]")
+            self.cuts.append((self.length, self._closers()))
+        elif char in "}]":
+            if self.stack:
+                self.stack.pop()
+            self.structural = True
+            self.cuts.append((self.length, self._closers()))
+        elif char == ",":
+            self.structural = True
+            self.cuts.append((self.length - 1, self._closers()))
+
+    def _closers(self) -> str:
+        return "".join(reversed(self.stack))
+
+    def _parse(self) -> Optional[Any]:
+        text = "".join(self.buffer)
+        if not self.stack:
+            return _safe_json(text)
+        # Couper au dernier point sûr et fermer les structures ouvertes
+        for position, closers in reversed(self.cuts[-8:]):
+            value = _safe_json(text[:position] + closers)
+            if value is not None:
+                return value
+        return None
+
+
+def _safe_json(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+# =============================================================================
+# PARSING DES SORTIES COMPLÈTES
+# =============================================================================
+
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+# `clé: valeur` dont la valeur non quotée casse le YAML (`: ` interne, indicateur en tête)
+_UNSAFE_YAML_VALUE = re.compile(r"^(\s*(?:- )?[\w\-]+:[ \t]+)(?![\"'|>\[{])(\S.*?: .*|[*&@`%!].*)$")
+_BLOCK_SCALAR = re.compile(r"^(\s*)(?:- )?[\w\-]+:[ \t]*[|>][-+0-9]*[ \t]*$")
+_YAML_START = re.compile(r"^(?:[\w\-\"']+\s*:|- |---)")
+
+
+def extract_payload(raw: str, output_format: str) -> str:
+    """Contenu du bloc ``` du format (à défaut du premier bloc), sinon le texte entier"""
+    fallback = None
+    start = raw.find("```")
+    while start >= 0:
+        line_end = raw.find("\n", start)
+        if line_end < 0:
+            break
+        language = raw[start + 3:line_end].strip().lower()
+        end = raw.find("```", line_end)
+        body = raw[line_end + 1:end if end >= 0 else len(raw)]  # Bloc non fermé: sortie tronquée
+        if language == output_format:
+            return body
+        if not language and fallback is None:
+            fallback = body
+        if end < 0:
+            break
+        start = raw.find("```", end + 3)
+    return fallback if fallback is not None else raw
+
+
+def repair_json(text: str) -> Any:
+    """Réparations courantes d'un JSON de LLM; lève ValueError si irréparable"""
+    start = min((i for i in (text.find("{"), text.find("[")) if i >= 0), default=-1)
+    if start < 0:
+        raise ValueError("Aucun objet JSON")
+    text = _TRAILING_COMMA.sub(r"\1", text[start:])
+    end = max(text.rfind("}"), text.rfind("]"))
+    try:
+        return json.loads(text[:end + 1])
+    except ValueError:
+        pass
+    # Sortie tronquée: fermer les structures ouvertes au dernier point sûr
+    scanner = _JSONScanner()
+    scanner.feed(text)
+    value = scanner._parse() if scanner.started else None
+    if value is None:
+        raise ValueError("JSON irréparable")
+    return value
+
+
+def repair_yaml(text: str) -> Any:
+    """Réparations courantes d'un YAML de LLM; lève yaml.YAMLError si irréparable"""
+    lines = text.expandtabs(2).split("\n")
+    # Texte libre avant le document
+    start = next((i for i, line in enumerate(lines) if _YAML_START.match(line)), 0)
+    repaired = []
+    block_indent = -1  # Contenu d'un bloc `|` / `>`: laissé tel quel
+    for line in lines[start:]:
+        if line.strip() == "```":
+            break
+        indent = len(line) - len(line.lstrip())
+        if block_indent >= 0 and (not line.strip() or indent > block_indent):
+            repaired.append(line)
+            continue
+        block = _BLOCK_SCALAR.match(line)
+        block_indent = len(block.group(1)) if block else -1
+        match = _UNSAFE_YAML_VALUE.match(line)
+        if match:
+            value = line[match.end(1):].replace("\\", "\\\\").replace('"', '\\"')
+            line = f'{match.group(1)}"{value}"'
+        repaired.append(line)
+    return load_yaml("\n".join(repaired))
+
+
+class OutputParser:
+    """Parse la sortie complète d'un agent (voir l'en-tête du module).
+
+    `schema`: modèle pydantic de la sortie; la valeur retournée est la sortie
+    validée (types convertis), limitée aux champs présents.
+    """
+
+    def __init__(self, output_format: str = "yaml", schema: Optional[Type[BaseModel]] = None):
+        self.output_format = output_format
+        self.schema = schema
+        self._json_schema: Optional[Dict[str, Any]] = None
+
+    @property
+    def json_schema(self) -> Optional[Dict[str, Any]]:
+        """Schéma JSON du modèle (calculé une fois), pour le mode JSON des providers"""
+        if self.schema is not None and self._json_schema is None:
+            self._json_schema = self.schema.model_json_schema()
+        return self._json_schema
+
+    def parse(self, raw: str, native: bool = False) -> Any:
+        """Sortie structurée de `raw`; `native`: réponse d'un mode JSON provider"""
+        if self.output_format not in ("yaml", "json"):
+            return raw
+        value, path = self._load(raw, native)
+        if path == "failed":
+            AGENT_OUTPUT_PARSE.labels(self.output_format, path).inc()
+            return {"raw": raw, "parse_error": True}
+        if self.schema is not None:
+            try:
+                value = self.schema.model_validate(value).model_dump(exclude_unset=True)
+            except ValidationError as e:
+                AGENT_OUTPUT_PARSE.labels(self.output_format, "invalid").inc()
+                return {
+                    "raw": raw,
+                    "parse_error": True,
+                    "validation_errors": e.errors(include_url=False, include_context=False)
+                }
+        AGENT_OUTPUT_PARSE.labels(self.output_format, path).inc()
+        return value
+
+    def _load(self, raw: str, native: bool) -> Tuple[Any, str]:
+        if native:
+            try:
+                return json.loads(raw), "native"
+            except ValueError:
+                pass  # Provider sans mode JSON effectif: chemin texte
+        loads, repair, error = (
+            (json.loads, repair_json, ValueError) if self.output_format == "json"
+            else (load_yaml, repair_yaml, yaml.YAMLError)
+        )
+        payload = extract_payload(raw, self.output_format)
+        try:
+            return loads(payload), "direct"
+        except error:
+            pass
+        try:
+            return repair(payload), "repaired"
+        except error:
+            return None, "failed"
+
+
+__all__ = [
+    "IncrementalParser",
+    "OutputParser",
+    "YAML_LOADER",
+    "load_yaml",
+    "extract_payload",
+    "repair_json",
+    "repair_yaml",
+]
@@ -0,0 +1,367 @@
+"""
+Budget de tokens des prompts d'agents
+
+`PromptBuilder` assemble un prompt par sections (système, outils, contexte,
+historiques, input, format) dont la taille est comptée en tokens. Si le
+total dépasse le budget du modèle (fenêtre de contexte moins la réponse
+attendue, ou `max_prompt_tokens`), les sections de plus faible priorité
+sont réduites d'abord:
+- historiques: les éléments les plus anciens sont retirés et remplacés par
+  une ligne de résumé
+- autres sections optionnelles: tronquées, puis retirées
+- en dernier recours, l'input est tronqué (système et format jamais)
+
+Le comptage utilise tiktoken s'il est installé, sinon l'estimation
+~4 caractères/token de utils.ratelimit. `PromptReport` décrit le résultat.
+
+La partie statique d'un agent (système, outils, format) est compilée une
+fois en `PromptPrefix` et envoyée comme bloc système: identique d'un appel
+à l'autre, elle est mise en cache côté provider (cache_control Anthropic,
+cache de préfixe automatique OpenAI). Les préfixes sont partagés via un
+registre indexé par leur empreinte.
+"""
+
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from agents.history import extractive_summary
+from utils.ratelimit import estimate_tokens
+
+
+# Fenêtres de contexte (tokens) par préfixe de nom de modèle; le plus long préfixe l'emporte
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "gpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "gpt-3.5-turbo": 16_385,
+    "o1": 128_000,
+    "claude": 200_000,
+    "gemini-1.5": 1_000_000,
+    "gemini": 32_760,
+    "llama": 8_192,
+    "mistral": 32_768,
+}
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("DEFAULT_CONTEXT_WINDOW", "8192"))
+
+# Tokens réservés à la réponse si l'appelant ne précise pas son max_tokens
+# (valeur par défaut des appels LLM, voir utils.llm)
+DEFAULT_OUTPUT_TOKENS = 4096
+
+# Plafond global optionnel du prompt (coût / latence), en plus de la fenêtre du modèle
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0")) or None
+
+# Nombre de préfixes compilés conservés par le registre
+PROMPT_PREFIX_CACHE_SIZE = int(os.getenv("PROMPT_PREFIX_CACHE_SIZE", "256"))
+
+# Une section optionnelle réduite en dessous de ce seuil est retirée
+_MIN_SECTION_TOKENS = 32
+_SUMMARY_CHARS = 200
+
+
+@functools.lru_cache(maxsize=32)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: Optional[str], model: Optional[str] = None) -> int:
+    """Nombre de tokens de `text` pour `model` (tiktoken si disponible, sinon estimation)"""
+    if not text:
+        return 0
+    encoding = _encoding(model or "gpt-4o")
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def context_window(model: Optional[str]) -> int:
+    """Fenêtre de contexte connue du modèle (DEFAULT_CONTEXT_WINDOW sinon)"""
+    if model:
+        name = model.lower().rsplit("/", 1)[-1]
+        matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if name.startswith(prefix)]
+        if matches:
+            return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def prompt_budget(
+    model: Optional[str],
+    max_prompt_tokens: Optional[int] = None,
+    output_tokens: int = DEFAULT_OUTPUT_TOKENS
+) -> int:
+    """Tokens disponibles pour le prompt: fenêtre moins la réponse, borné par les plafonds"""
+    budget = context_window(model) - output_tokens
+    for cap in (max_prompt_tokens, PROMPT_TOKEN_BUDGET):
+        if cap:
+            budget = min(budget, cap)
+    return max(budget, 1)
+
+
+class PromptPrefix:
+    """Partie statique d'un prompt, compilée une fois (texte, empreinte, tokens)"""
+
+    __slots__ = ("text", "hash", "tokens", "model")
+
+    def __init__(self, text: str, model: Optional[str] = None):
+        self.text = text
+        self.model = model
+        self.hash = prefix_hash(text)
+        self.tokens = count_tokens(text, model)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"hash": self.hash, "tokens": self.tokens, "model": self.model}
+
+
+def prefix_hash(text: str) -> str:
+    """Empreinte stable d'un préfixe (identifie l'entrée du cache provider)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class PrefixRegistry:
+    """Préfixes compilés par (modèle, empreinte), bornés en LRU.
+
+    Des agents de même configuration partagent le même `PromptPrefix`:
+    le texte n'est compté qu'une fois et `stats()` indique la réutilisation.
+    """
+
+    def __init__(self, max_size: int = PROMPT_PREFIX_CACHE_SIZE):
+        self.max_size = max_size
+        self._prefixes: "OrderedDict[Tuple[Optional[str], str], PromptPrefix]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, sections: List[Tuple[str, str]], model: Optional[str] = None, separator: str = "\n\n") -> PromptPrefix:
+        """Préfixe des sections (titre, texte) non vides, dans l'ordre"""
+        text = separator.join(f"# {header}\n{body}" for header, body in sections if body)
+        key = (model, prefix_hash(text))
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is not None:
+                self._prefixes.move_to_end(key)
+                self.hits += 1
+                return prefix
+            self.misses += 1
+        prefix = PromptPrefix(text, model)
+        with self._lock:
+            prefix = self._prefixes.setdefault(key, prefix)
+            while len(self._prefixes) > self.max_size:
+                self._prefixes.popitem(last=False)
+        return prefix
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._prefixes), "hits": self.hits, "misses": self.misses}
+
+
+# Registre partagé du processus
+prefix_registry = PrefixRegistry()
+
+
+class PromptSection:
+    """Section de prompt: texte, ou liste d'éléments élagables du plus ancien au plus récent"""
+
+    __slots__ = (
+        "name", "header", "text", "items", "item_tokens", "priority",
+        "required", "truncatable", "dropped_items", "dropped_text", "tokens", "removed"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        header: Optional[str],
+        text: str = "",
+        items: Optional[List[Any]] = None,
+        priority: int = 50,
+        required: bool = False,
+        truncatable: bool = True
+    ):
+        self.name = name
+        self.header = header
+        self.text = text
+        self.items = list(items) if items is not None else None
+        self.item_tokens: List[int] = []
+        self.priority = priority
+        self.required = required
+        self.truncatable = truncatable
+        self.dropped_items: List[Any] = []
+        self.dropped_text = 0
+        self.tokens = 0
+        self.removed = False
+
+    def render(self) -> str:
+        body = self.text
+        if self.items is not None:
+            lines = []
+            if self.dropped_items:
+                summary = extractive_summary(self.dropped_items, max_chars=_SUMMARY_CHARS, item_chars=60)
+                lines.append(f"({len(self.dropped_items)} éléments plus anciens omis: {summary})\n")
+            lines.extend(_render_item(item) for item in self.items)
+            body = "".join(lines)
+        return f"# {self.header}\n{body}" if self.header else body
+
+
+def _render_item(item: Any) -> str:
+    return yaml.dump([item], allow_unicode=True, sort_keys=False)
+
+
+class PromptReport:
+    """Taille du prompt construit et réductions appliquées"""
+
+    __slots__ = ("budget", "tokens", "sections", "dropped")
+
+    def __init__(self, budget: int, tokens: int, sections: Dict[str, int], dropped: List[Dict[str, Any]]):
+        self.budget = budget
+        self.tokens = tokens
+        self.sections = sections
+        self.dropped = dropped
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.dropped)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class PromptBuilder:
+    """Assemble des sections dans un budget de tokens.
+
+    Priorité haute = conservée le plus longtemps. Les sections `required`
+    ne sont jamais retirées; parmi elles, seules les `truncatable` peuvent
+    être tronquées, en dernier recours.
+    """
+
+    def __init__(self, budget: int, model: Optional[str] = None, separator: str = "\n\n"):
+        self.budget = budget
+        self.model = model
+        self.separator = separator
+        self.sections: List[PromptSection] = []
+
+    def add(
+        self,
+        name: str,
+        text: str,
+        header: Optional[str] = None,
+        priority: int = 50,
+        required: bool = False,
+        truncatable: bool = True
+    ) -> "PromptBuilder":
+        if text:
+            self.sections.append(PromptSection(
+                name, header, text=text, priority=priority, required=required, truncatable=truncatable
+            ))
+        return self
+
+    def add_items(self, name: str, items: List[Any], header: Optional[str] = None, priority: int = 10) -> "PromptBuilder":
+        """Section liste (historique), élaguée à partir des éléments les plus anciens"""
+        if items:
+            section = PromptSection(name, header, items=items, priority=priority)
+            section.item_tokens = [self._count(_render_item(item)) for item in section.items]
+            self.sections.append(section)
+        return self
+
+    def _count(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    def _measure(self, section: PromptSection) -> None:
+        if section.items is not None and not section.dropped_items:
+            section.tokens = self._count(f"# {section.header}\n" if section.header else "") + sum(section.item_tokens)
+        else:
+            section.tokens = self._count(section.render())
+
+    def _total(self) -> int:
+        live = [section for section in self.sections if not section.removed]
+        separators = self._count(self.separator) * max(len(live) - 1, 0)
+        return sum(section.tokens for section in live) + separators
+
+    def _trim(self, excess: int) -> bool:
+        """Réduit la section la moins prioritaire possible; False si rien n'est réductible"""
+        optional = [s for s in self.sections if not s.removed and not s.required]
+        for section in sorted(optional, key=lambda s: s.priority):
+            if section.items:
+                # Retirer assez d'éléments anciens pour couvrir l'excédent (le résumé est recompté ensuite)
+                freed, count = 0, 0
+                while count < len(section.items) and freed < excess:
+                    freed += section.item_tokens[count]
+                    count += 1
+                section.dropped_items.extend(section.items[:count])
+                del section.items[:count]
+                del section.item_tokens[:count]
+                if not section.items:
+                    section.removed = True
+                self._measure(section)
+                return True
+            if section.truncatable and section.items is None and section.tokens - excess >= _MIN_SECTION_TOKENS:
+                self._truncate(section, section.tokens - excess)
+                return True
+            section.removed = True
+            return True
+
+        truncatable = [s for s in self.sections if not s.removed and s.required and s.truncatable and s.tokens > 1]
+        if not truncatable:
+            return False
+        section = max(truncatable, key=lambda s: s.tokens)
+        self._truncate(section, max(section.tokens - excess, 1))
+        return True
+
+    def _truncate(self, section: PromptSection, target_tokens: int) -> None:
+        keep = max(int(len(section.text) * target_tokens / max(section.tokens, 1)) - 1, 0)
+        section.dropped_text += len(section.text) - keep
+        section.text = section.text[:keep] + "…"
+        self._measure(section)
+
+    def build(self) -> Tuple[str, PromptReport]:
+        """Retourne le prompt et son rapport (sections en tokens, réductions)"""
+        for section in self.sections:
+            self._measure(section)
+        total = self._total()
+        while total > self.budget and self._trim(total - self.budget):
+            total = self._total()
+
+        live = [section for section in self.sections if not section.removed]
+        dropped = []
+        for section in self.sections:
+            entry: Dict[str, Any] = {}
+            if section.dropped_items:
+                entry["items_dropped"] = len(section.dropped_items)
+            if section.dropped_text:
+                entry["chars_truncated"] = section.dropped_text
+            if section.removed:
+                entry["removed"] = True
+            if entry:
+                dropped.append({"section": section.name, **entry})
+        report = PromptReport(
+            budget=self.budget,
+            tokens=total,
+            sections={section.name: section.tokens for section in live},
+            dropped=dropped
+        )
+        return self.separator.join(section.render() for section in live), report
+
+
+__all__ = [
+    "MODEL_CONTEXT_WINDOWS",
+    "count_tokens",
+    "context_window",
+    "prompt_budget",
+    "PromptPrefix",
+    "PrefixRegistry",
+    "prefix_registry",
+    "prefix_hash",
+    "PromptSection",
+    "PromptBuilder",
+    "PromptReport",
+]
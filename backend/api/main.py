@@ -8,13 +8,18 @@ Endpoints pour:
 - Outils
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from uuid import UUID, uuid4
 from datetime import datetime
 import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
 
 from models import (
     AgentDefinition, AgentCreate, AgentUpdate, AgentResponse, AgentStatus,
@@ -23,15 +28,40 @@ from models import (
     ToolDefinition,
 )
 from workflows import workflow_engine, create_workflow_from_template, WORKFLOW_TEMPLATES
+from workflows.stats import summarize_steps
+from workflows.scheduler import (
+    ExecutionJob,
+    ExecutionScheduler,
+    QueueFull,
+    create_execution_queue,
+    make_execution_runner,
+)
 from tools import tool_registry
 from agents import AGENT_REGISTRY, AgentBuilder
+from utils.events import event_bus, EXECUTION_FINISHED
+from utils.llm import close_async_clients
+from utils.admission import AdmissionRejected, create_admission_controller
+from utils.metrics import metrics, CONTENT_TYPE, HTTP_REQUEST_DURATION
+from storage import create_execution_repository, IndexedStore, encode_cursor, decode_cursor
+from storage.history import get_history_store
+from agents.history import spill_stream
 
 
 # =============================================================================
 # APPLICATION
 # =============================================================================
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Démarrage: exécutions laissées par un processus disparu; arrêt: workers et connexions LLM"""
+    await execution_scheduler.recover()
+    yield
+    await execution_scheduler.stop()
+    await close_async_clients()
+
+
 app = FastAPI(
+    lifespan=lifespan,
     title="Nümtema Agents Studio API",
     description="Studio d'Agents IA - API REST basée sur PocketFlow",
     version="2.0.0",
@@ -46,20 +76,99 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
+class MetricsMiddleware:
+    """Middleware ASGI: durée des requêtes HTTP par route (modèle de chemin, pas l'URL)"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, str(status)).observe(
+                time.perf_counter() - started
+            )
+
+
+app.add_middleware(MetricsMiddleware)
+
+
 # =============================================================================
-# IN-MEMORY STORAGE (à remplacer par PostgreSQL en production)
+# STORAGE
 # =============================================================================
 
-agents_db: Dict[str, AgentDefinition] = {}
-workflows_db: Dict[str, WorkflowDefinition] = {}
-executions_db: Dict[str, Execution] = {}
+# Agents et workflows: en mémoire (à remplacer par PostgreSQL en production),
+# avec index secondaires pour filtrer et paginer sans parcours complet
+agents_db: IndexedStore[AgentDefinition] = IndexedStore(indexes={
+    "tag": lambda agent: agent.tags,
+})
+workflows_db: IndexedStore[WorkflowDefinition] = IndexedStore()
+
+# Taille maximale d'une page des endpoints de liste
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "1000"))
+
+# Exécutions: dépôt persistant partagé entre workers (EXECUTIONS_DATABASE_URL / DATABASE_URL)
+execution_repository = create_execution_repository()
+
+# Exécution d'un job par le moteur, résultat enregistré dans le dépôt
+run_execution = make_execution_runner(workflow_engine, execution_repository)
+
+# Exécutions asynchrones: file bornée (priorités, équité entre tenants)
+# servie par EXECUTION_WORKERS workers; 0 = workers séparés (file Redis)
+execution_scheduler = ExecutionScheduler(
+    run_execution,
+    queue=create_execution_queue(),
+    workers=int(os.getenv("EXECUTION_WORKERS", "4")),
+    repository=execution_repository
+)
+EXECUTION_QUEUE_RETRY_AFTER = int(os.getenv("EXECUTION_QUEUE_RETRY_AFTER", "5"))
+
+# Exécutions synchrones (le client attend le résultat): nombre borné,
+# file d'attente bornée, délai maximal d'attente du résultat
+sync_admission = create_admission_controller("SYNC_EXECUTION")
+SYNC_EXECUTION_TIMEOUT = float(os.getenv("SYNC_EXECUTION_TIMEOUT", "300"))
+
+# Références des tâches d'exécution en cours (évite leur ramasse-miettes)
+_execution_tasks: set = set()
+
+# Profondeur de file: lue (de façon asynchrone) à chaque scrape de /metrics
+EXECUTION_QUEUE_DEPTH = metrics.gauge(
+    "execution_queue_depth",
+    "Exécutions en attente dans la file, par priorité",
+    ("priority",)
+)
+metrics.collector(
+    "execution_workers_busy",
+    "Workers du scheduler occupés par une exécution",
+    lambda: execution_scheduler.running
+)
+metrics.collector(
+    "sync_executions_active",
+    "Exécutions synchrones en cours",
+    lambda: sync_admission.running
+)
 
 
 # =============================================================================
-# HEALTH CHECK
+# HEALTH CHECK / METRICS
 # =============================================================================
 
 @app.get("/health")
@@ -72,6 +181,15 @@ async def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Métriques au format Prometheus / OpenMetrics"""
+    depth = await execution_scheduler.queue.depth()
+    for priority, count in depth.items():
+        EXECUTION_QUEUE_DEPTH.labels(str(priority)).set(count)
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/")
 async def root():
     """Point d'entrée racine"""
@@ -105,19 +223,33 @@ async def create_agent(data: AgentCreate):
     )
 
 
+def _page(store: IndexedStore, response: Response, limit: int, offset: int,
+          cursor: Optional[str], **filters) -> list:
+    """Page keyset d'un IndexedStore; le curseur suivant est renvoyé dans X-Next-Cursor.
+
+    `offset` reste accepté pour compatibilité mais coûte O(offset).
+    """
+    try:
+        items, next_cursor = store.page(limit=offset + limit, cursor=cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if offset:
+        items = items[offset:]
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+
 @app.get("/api/v1/agents", response_model=List[AgentResponse], tags=["Agents"])
 async def list_agents(
+    response: Response,
     tag: Optional[str] = None,
-    limit: int = 100,
-    offset: int = 0
+    limit: int = Query(100, ge=1, le=API_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
 ):
-    """Liste tous les agents"""
-    agents = list(agents_db.values())
-    
-    if tag:
-        agents = [a for a in agents if tag in a.tags]
-    
-    agents = agents[offset:offset + limit]
+    """Liste les agents (pagination par curseur via l'en-tête X-Next-Cursor)"""
+    agents = _page(agents_db, response, limit, offset, cursor, tag=tag)
     
     return [
         AgentResponse(
@@ -163,6 +295,7 @@ async def update_agent(agent_id: str, data: AgentUpdate):
         agent.tags = data.tags
     
     agent.updated_at = datetime.utcnow()
+    agents_db.reindex(agent_id)
     
     return AgentResponse(
         id=agent.id,
@@ -206,7 +339,8 @@ async def create_workflow(data: WorkflowCreate):
         nodes=data.nodes,
         edges=data.edges,
         input_schema=data.input_schema,
-        output_schema=data.output_schema
+        output_schema=data.output_schema,
+        limits=data.limits
     )
     workflows_db[str(workflow.id)] = workflow
     return WorkflowResponse(
@@ -216,15 +350,21 @@ async def create_workflow(data: WorkflowCreate):
         version=workflow.version,
         nodes=workflow.nodes,
         edges=workflow.edges,
+        limits=workflow.limits,
         created_at=workflow.created_at,
         updated_at=workflow.updated_at
     )
 
 
 @app.get("/api/v1/workflows", response_model=List[WorkflowResponse], tags=["Workflows"])
-async def list_workflows(limit: int = 100, offset: int = 0):
-    """Liste tous les workflows"""
-    workflows = list(workflows_db.values())[offset:offset + limit]
+async def list_workflows(
+    response: Response,
+    limit: int = Query(100, ge=1, le=API_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
+):
+    """Liste les workflows (pagination par curseur via l'en-tête X-Next-Cursor)"""
+    workflows = _page(workflows_db, response, limit, offset, cursor)
     return [
         WorkflowResponse(
             id=w.id,
@@ -233,6 +373,7 @@ async def list_workflows(limit: int = 100, offset: int = 0):
             version=w.version,
             nodes=w.nodes,
             edges=w.edges,
+            limits=w.limits,
             created_at=w.created_at,
             updated_at=w.updated_at
         )
@@ -254,11 +395,27 @@ async def get_workflow(workflow_id: str):
         version=w.version,
         nodes=w.nodes,
         edges=w.edges,
+        limits=w.limits,
         created_at=w.created_at,
         updated_at=w.updated_at
     )
 
 
+@app.get("/api/v1/workflows/{workflow_id}/stats", tags=["Workflows"])
+async def get_workflow_stats(workflow_id: str, limit: int = 200):
+    """Percentiles par node (p50/p95) sur les `limit` dernières exécutions"""
+    if workflow_id not in workflows_db:
+        raise HTTPException(status_code=404, detail="Workflow non trouvé")
+    
+    recent = await execution_repository.latest(workflow_id=workflow_id, limit=max(limit, 1))
+    
+    return {
+        "workflow_id": workflow_id,
+        "executions": len(recent),
+        "nodes": summarize_steps(recent)
+    }
+
+
 @app.delete("/api/v1/workflows/{workflow_id}", tags=["Workflows"])
 async def delete_workflow(workflow_id: str):
     """Supprime un workflow"""
@@ -266,6 +423,7 @@ async def delete_workflow(workflow_id: str):
         raise HTTPException(status_code=404, detail="Workflow non trouvé")
     
     del workflows_db[workflow_id]
+    workflow_engine.invalidate(workflow_id)
     return {"status": "deleted", "id": workflow_id}
 
 
@@ -298,6 +456,7 @@ async def create_workflow_from_template_endpoint(template_name: str):
             version=workflow.version,
             nodes=workflow.nodes,
             edges=workflow.edges,
+            limits=workflow.limits,
             created_at=workflow.created_at,
             updated_at=workflow.updated_at
         )
@@ -309,81 +468,158 @@ async def create_workflow_from_template_endpoint(template_name: str):
 # ENDPOINTS EXECUTIONS
 # =============================================================================
 
-async def run_workflow_background(
-    execution_id: str,
-    workflow: WorkflowDefinition,
-    input_data: Dict
-):
-    """Exécute un workflow en arrière-plan"""
-    execution = executions_db[execution_id]
-    
-    try:
-        result = await workflow_engine.run_async(workflow, input_data)
-        execution.status = ExecutionStatus.COMPLETED
-        execution.output_data = result.output_data
-    except Exception as e:
-        execution.status = ExecutionStatus.FAILED
-        execution.error = str(e)
-    finally:
-        execution.completed_at = datetime.utcnow()
+async def _get_execution_or_404(execution_id: str) -> Execution:
+    execution = await execution_repository.get(execution_id)
+    if execution is None:
+        raise HTTPException(status_code=404, detail="Exécution non trouvée")
+    return execution
 
 
 @app.post("/api/v1/workflows/{workflow_id}/execute", response_model=ExecutionResponse, tags=["Executions"])
-async def execute_workflow(
-    workflow_id: str,
-    data: ExecutionRequest,
-    background_tasks: BackgroundTasks
-):
+async def execute_workflow(workflow_id: str, data: ExecutionRequest):
     """Lance l'exécution d'un workflow"""
     if workflow_id not in workflows_db:
         raise HTTPException(status_code=404, detail="Workflow non trouvé")
     
     workflow = workflows_db[workflow_id]
     
+    if not data.async_mode:
+        # Réserver une place avant de créer l'exécution: un refus ne laisse
+        # pas d'exécution orpheline en statut RUNNING
+        try:
+            await sync_admission.acquire()
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=str(e),
+                headers={"Retry-After": str(int(e.retry_after))}
+            )
+    
     # Créer l'exécution
     execution = Execution(
         workflow_id=UUID(workflow_id),
         input_data=data.input_data,
-        status=ExecutionStatus.PENDING if data.async_mode else ExecutionStatus.RUNNING
+        status=ExecutionStatus.RUNNING if not data.async_mode else ExecutionStatus.PENDING
+    )
+    job = ExecutionJob(
+        execution,
+        workflow,
+        parallel=data.parallel,
+        max_concurrency=data.max_concurrency,
+        tenant_id=data.tenant_id,
+        priority=data.priority
     )
-    executions_db[str(execution.id)] = execution
     
     if data.async_mode:
-        # Exécution asynchrone en arrière-plan
-        execution.status = ExecutionStatus.RUNNING
-        background_tasks.add_task(
-            run_workflow_background,
-            str(execution.id),
-            workflow,
-            data.input_data
-        )
+        # Exécution asynchrone: file bornée servie par les workers
+        execution_scheduler.claim(execution)
+        await execution_repository.save(execution)
+        try:
+            await execution_scheduler.submit(job)
+        except QueueFull as e:
+            await execution_repository.delete(str(execution.id))
+            raise HTTPException(
+                status_code=429,
+                detail=str(e),
+                headers={"Retry-After": str(EXECUTION_QUEUE_RETRY_AFTER)}
+            )
         return ExecutionResponse(
             execution_id=execution.id,
             status=execution.status,
-            message="Exécution démarrée en arrière-plan"
+            message="Exécution mise en file d'attente"
         )
-    else:
-        # Exécution synchrone
-        result = workflow_engine.run(workflow, data.input_data)
-        execution.status = result.status
-        execution.output_data = result.output_data
-        execution.error = result.error
-        execution.completed_at = datetime.utcnow()
-        
-        return ExecutionResponse(
-            execution_id=execution.id,
-            status=execution.status,
-            message="Exécution terminée"
+    
+    # Exécution synchrone: chemin async natif (la boucle d'événements reste
+    # disponible pour les autres requêtes), la place est libérée à la fin
+    # de l'exécution même si le client n'attend plus
+    try:
+        await execution_repository.save(execution)
+        task = asyncio.create_task(run_execution(job))
+    except BaseException:
+        sync_admission.release()
+        raise
+    _execution_tasks.add(task)
+    task.add_done_callback(_execution_tasks.discard)
+    task.add_done_callback(lambda _: sync_admission.release())
+    
+    try:
+        await asyncio.wait_for(asyncio.shield(task), SYNC_EXECUTION_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail=(
+                f"Exécution {execution.id} toujours en cours après "
+                f"{SYNC_EXECUTION_TIMEOUT:g}s; suivez-la via /api/v1/executions/{execution.id}"
+            )
         )
+    
+    return ExecutionResponse(
+        execution_id=execution.id,
+        status=execution.status,
+        message="Exécution terminée"
+    )
+
+
+@app.post("/api/v1/executions/{execution_id}/resume", response_model=ExecutionResponse, tags=["Executions"])
+async def resume_execution(execution_id: str, force: bool = False):
+    """Reprend une exécution interrompue depuis son dernier checkpoint.
+
+    Les étapes déjà terminées ne sont pas rejouées. Une exécution restée
+    "running" (process arrêté pendant l'exécution) n'est reprise qu'avec
+    `force=true`: l'appelant garantit qu'elle ne tourne plus ailleurs.
+    """
+    execution = await _get_execution_or_404(execution_id)
+    
+    if workflow_engine.get_execution(execution_id) is not None:
+        raise HTTPException(status_code=409, detail="Exécution en cours")
+    resumable = {ExecutionStatus.FAILED, ExecutionStatus.CANCELLED}
+    if force:
+        resumable.add(ExecutionStatus.RUNNING)
+    if execution.status not in resumable:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Exécution non reprenable (statut: {execution.status.value})"
+        )
+    
+    workflow_id = str(execution.workflow_id)
+    if workflow_id not in workflows_db:
+        raise HTTPException(status_code=404, detail="Workflow non trouvé")
+    if workflow_engine.checkpoint_store is None or workflow_engine.checkpoint_store.load(execution_id) is None:
+        raise HTTPException(status_code=409, detail="Aucun checkpoint pour cette exécution")
+    
+    previous_status = execution.status
+    execution.status = ExecutionStatus.PENDING
+    execution_scheduler.claim(execution)
+    await execution_repository.save(execution)
+    try:
+        await execution_scheduler.submit(ExecutionJob(execution, workflows_db[workflow_id], resume=True))
+    except QueueFull as e:
+        execution.status = previous_status
+        await execution_repository.save(execution)
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(EXECUTION_QUEUE_RETRY_AFTER)}
+        )
+    return ExecutionResponse(
+        execution_id=execution.id,
+        status=execution.status,
+        message="Reprise de l'exécution mise en file d'attente"
+    )
+
+
+@app.get("/api/v1/scheduler/stats", tags=["Executions"])
+async def get_scheduler_stats():
+    """Métriques de la file d'exécution (profondeur, temps d'attente, workers)"""
+    stats = await execution_scheduler.stats()
+    stats["sync_admission"] = sync_admission.stats()
+    return stats
 
 
 @app.get("/api/v1/executions/{execution_id}", tags=["Executions"])
 async def get_execution(execution_id: str):
     """Récupère le statut d'une exécution"""
-    if execution_id not in executions_db:
-        raise HTTPException(status_code=404, detail="Exécution non trouvée")
-    
-    execution = executions_db[execution_id]
+    execution = await _get_execution_or_404(execution_id)
     return {
         "id": str(execution.id),
         "workflow_id": str(execution.workflow_id),
@@ -392,26 +628,162 @@ async def get_execution(execution_id: str):
         "output_data": execution.output_data,
         "error": execution.error,
         "started_at": execution.started_at.isoformat(),
-        "completed_at": execution.completed_at.isoformat() if execution.completed_at else None
+        "completed_at": execution.completed_at.isoformat() if execution.completed_at else None,
+        "step_count": execution.step_count,
+        "edge_counts": execution.edge_counts,
+        "token_count": execution.token_count,
+        "limit_reached": execution.limit_reached,
+        "merge_conflicts": execution.merge_conflicts,
+        "checkpoint_error": execution.checkpoint_error
     }
 
 
+@app.get("/api/v1/executions/{execution_id}/steps", tags=["Executions"])
+async def list_execution_steps(execution_id: str):
+    """Étapes d'une exécution: durées par phase, retries, tokens et latence LLM"""
+    execution = await _get_execution_or_404(execution_id)
+    return {
+        "execution_id": str(execution.id),
+        "steps": [step.model_dump(mode="json") for step in execution.steps],
+        "count": len(execution.steps)
+    }
+
+
+@app.get("/api/v1/executions/{execution_id}/history/{key}", tags=["Executions"])
+async def page_execution_history(
+    execution_id: str,
+    key: str,
+    limit: int = Query(100, ge=1, le=API_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Historique complet d'un agent (ex: research_history), paginé par curseur.
+
+    Les éléments déversés sur disque (politique spill:N) viennent d'abord,
+    suivis de ceux conservés dans la sortie de l'exécution.
+    """
+    execution = await _get_execution_or_404(execution_id)
+    try:
+        after = decode_cursor(cursor, int)[0] if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Curseur invalide: {cursor}")
+    
+    store = get_history_store()
+    stream = spill_stream(key, execution_id)
+    spilled = await asyncio.to_thread(store.count, stream)
+    items = await asyncio.to_thread(store.page, stream, after, limit + 1)
+    
+    tail = (execution.output_data or {}).get(key)
+    if isinstance(tail, list) and len(items) <= limit:
+        start = max(after - spilled, 0)
+        items += [
+            (spilled + index + 1, item)
+            for index, item in enumerate(tail[start:start + limit + 1 - len(items)], start=start)
+        ]
+    
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1][0])
+    return {
+        "execution_id": execution_id,
+        "key": key,
+        "items": [{"seq": seq, "item": item} for seq, item in items],
+        "spilled": spilled,
+        "next_cursor": next_cursor
+    }
+
+
+async def _execution_events(execution: Execution) -> AsyncIterator[Dict[str, Any]]:
+    """Événements d'une exécution.
+
+    Le dépôt est relu quand aucun événement n'arrive: si l'exécution est
+    terminée (historique expiré, ou exécutée par un worker d'un autre
+    processus avec le bus mémoire), la fin est synthétisée.
+    """
+    execution_id = str(execution.id)
+    
+    async def finished() -> Optional[Dict[str, Any]]:
+        current = await execution_repository.get(execution_id)
+        if current is not None and current.status not in (
+            ExecutionStatus.COMPLETED, ExecutionStatus.FAILED, ExecutionStatus.CANCELLED
+        ):
+            return None
+        return {
+            "type": EXECUTION_FINISHED,
+            "execution_id": execution_id,
+            "status": current.status.value if current is not None else None,
+            "error": current.error if current is not None else "Exécution supprimée",
+        }
+    
+    async for event in event_bus.subscribe(execution_id, check=finished):
+        yield event
+
+
+@app.get("/api/v1/executions/{execution_id}/events", tags=["Executions"])
+async def stream_execution_events(execution_id: str):
+    """Stream SSE des événements d'une exécution (nodes, tokens, transitions)"""
+    execution = await _get_execution_or_404(execution_id)
+    
+    async def event_source():
+        async for event in _execution_events(execution):
+            yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.websocket("/api/v1/executions/{execution_id}/ws")
+async def execution_events_websocket(websocket: WebSocket, execution_id: str):
+    """Stream WebSocket des événements d'une exécution"""
+    await websocket.accept()
+    execution = await execution_repository.get(execution_id)
+    if execution is None:
+        await websocket.close(code=4404, reason="Exécution non trouvée")
+        return
+    
+    async def forward():
+        async for event in _execution_events(execution):
+            await websocket.send_text(json.dumps(event, default=str))
+    
+    async def disconnected():
+        # Détecte un client parti pendant un silence (rien à envoyer)
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    
+    sender = asyncio.ensure_future(forward())
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        done, _ = await asyncio.wait({sender, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if sender in done:
+            sender.result()
+            await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        watcher.cancel()
+
+
 @app.get("/api/v1/executions", tags=["Executions"])
 async def list_executions(
     workflow_id: Optional[str] = None,
     status: Optional[ExecutionStatus] = None,
-    limit: int = 100
+    limit: int = Query(100, ge=1, le=API_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
 ):
-    """Liste les exécutions"""
-    executions = list(executions_db.values())
-    
-    if workflow_id:
-        executions = [e for e in executions if str(e.workflow_id) == workflow_id]
-    
-    if status:
-        executions = [e for e in executions if e.status == status]
-    
-    executions = executions[:limit]
+    """Liste les exécutions (filtrage et pagination keyset effectués en base)"""
+    try:
+        executions, next_cursor = await execution_repository.list_page(
+            workflow_id=workflow_id,
+            status=status,
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "executions": [
@@ -424,7 +796,8 @@ async def list_executions(
             }
             for e in executions
         ],
-        "count": len(executions)
+        "count": len(executions),
+        "next_cursor": next_cursor
     }
 
 
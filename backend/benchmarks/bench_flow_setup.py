@@ -0,0 +1,44 @@
+"""
+Benchmark: coût de mise en place d'une exécution de workflow
+
+Compare la construction complète du flow (instanciation des agents,
+validation des AgentConfig, connexion des edges) à l'instanciation depuis
+le cache de flows compilés.
+
+Usage (depuis backend/):
+    python -m benchmarks.bench_flow_setup [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from workflows import WorkflowEngine, create_content_pipeline, create_code_generation_pipeline
+
+
+def bench(iterations: int = 2000) -> None:
+    engine = WorkflowEngine()
+    for template in (create_content_pipeline, create_code_generation_pipeline):
+        workflow = template()
+
+        def cold():
+            engine.clear_compiled()
+            engine.build_flow(workflow)
+
+        def cached():
+            engine.build_flow(workflow)
+
+        cold_us = min(timeit.repeat(cold, number=iterations, repeat=3)) / iterations * 1e6
+        engine.build_flow(workflow)
+        cached_us = min(timeit.repeat(cached, number=iterations, repeat=3)) / iterations * 1e6
+
+        print(
+            f"{workflow.name:<28} sans cache: {cold_us:8.1f} µs"
+            f"   avec cache: {cached_us:8.1f} µs   (x{cold_us / cached_us:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,89 @@
+"""
+Benchmark: parsing des sorties d'agents
+
+Compare, sur un corpus de réponses d'agents (benchmarks/corpus/agent_outputs),
+l'ancien parse (découpage sur ```yaml / ```json + `yaml.safe_load`) au
+parseur actuel (agents.parsing.OutputParser: loader C, réparation,
+validation du schéma de l'agent). Le nom de fichier donne l'agent et le
+format: `<agent>[_variante].<yaml|json>.txt`.
+
+Usage (depuis backend/):
+    python -m benchmarks.bench_output_parsing [iterations]
+"""
+
+import json
+import os
+import sys
+import timeit
+from pathlib import Path
+
+import yaml
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+from agents import AgentBuilder, CoderAgent, ResearchAgent, ReviewerAgent, WriterAgent
+from agents.parsing import YAML_LOADER, OutputParser
+
+
+CORPUS = Path(__file__).parent / "corpus" / "agent_outputs"
+
+AGENTS = {
+    "research": ResearchAgent,
+    "writer": WriterAgent,
+    "reviewer": ReviewerAgent,
+    "coder": CoderAgent,
+    "builder": AgentBuilder,
+}
+
+
+def legacy_parse(raw_output: str, output_format: str):
+    """Parse d'origine de BaseAgent.parse_output"""
+    if output_format == "yaml":
+        try:
+            if "```yaml" in raw_output:
+                return yaml.safe_load(raw_output.split("```yaml")[1].split("```")[0])
+            return yaml.safe_load(raw_output)
+        except yaml.YAMLError:
+            return {"raw": raw_output, "parse_error": True}
+    try:
+        if "```json" in raw_output:
+            return json.loads(raw_output.split("```json")[1].split("```")[0])
+        return json.loads(raw_output)
+    except json.JSONDecodeError:
+        return {"raw": raw_output, "parse_error": True}
+
+
+def _status(value) -> str:
+    if isinstance(value, dict) and value.get("parse_error"):
+        return "échec"
+    return "ok"
+
+
+def bench(iterations: int = 200) -> None:
+    print(f"Loader YAML: {YAML_LOADER.__name__}\n")
+    total_legacy = total_current = 0.0
+    for path in sorted(CORPUS.glob("*.txt")):
+        raw = path.read_text(encoding="utf-8")
+        agent_name, output_format = path.name.split(".")[0].split("_")[0], path.name.split(".")[1]
+        parser = OutputParser(output_format, AGENTS[agent_name].output_schema)
+
+        legacy_us = min(timeit.repeat(
+            lambda: legacy_parse(raw, output_format), number=iterations, repeat=3
+        )) / iterations * 1e6
+        current_us = min(timeit.repeat(
+            lambda: parser.parse(raw), number=iterations, repeat=3
+        )) / iterations * 1e6
+        total_legacy += legacy_us
+        total_current += current_us
+
+        print(
+            f"{path.name:<34} {len(raw):>6} o"
+            f"   avant: {legacy_us:8.1f} µs ({_status(legacy_parse(raw, output_format)):<5})"
+            f"   après: {current_us:8.1f} µs ({_status(parser.parse(raw)):<5})"
+            f"   x{legacy_us / current_us:.1f}"
+        )
+    print(f"\n{'Total':<43} avant: {total_legacy:8.1f} µs           après: {total_current:8.1f} µs")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -9,7 +9,7 @@ Définitions type-safe pour:
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Union
 from uuid import UUID, uuid4
 from datetime import datetime
 from enum import Enum
@@ -35,6 +35,12 @@ class ExecutionStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+class ExecutionPriority(str, Enum):
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+
 class NodeType(str, Enum):
     AGENT = "agent"
     TOOL = "tool"
@@ -64,8 +70,18 @@ class AgentConfig(BaseModel):
     tools: List[str] = Field(default_factory=list)
     max_retries: int = Field(default=3, ge=0, le=10)
     temperature: float = Field(default=0.7, ge=0, le=2)
+    max_tokens: int = Field(default=4096, ge=1)  # Tokens de réponse, réservés dans le budget du prompt
     output_format: str = Field(default="text")  # text, json, yaml
     output_key: Optional[str] = Field(default=None)  # Pour state sharing
+    cache_responses: bool = Field(default=False)  # Réutilise les réponses LLM identiques
+    stream: bool = Field(default=False)  # Publie les tokens et la sortie partielle pendant la génération
+    batch: bool = Field(default=False)  # Regroupe les appels simultanés en lots (voir utils.batching)
+    history_retention: Optional[str] = Field(  # all, ring:N, summary:N, spill:N (voir agents.history)
+        default=None,
+        pattern=r"^\s*(?i:all|(ring|spill):[1-9]\d*|summary:([2-9]|[1-9]\d+))\s*$"
+    )
+    max_prompt_tokens: Optional[int] = Field(default=None, ge=1)  # Plafond du prompt (défaut: fenêtre du modèle)
+    native_output: bool = Field(default=True)  # Mode JSON natif du provider si output_format == "json"
 
 
 class AgentDefinition(BaseModel):
@@ -105,6 +121,62 @@ class AgentResponse(BaseModel):
     tags: List[str] = Field(default_factory=list)
 
 
+# =============================================================================
+# AGENT OUTPUT MODELS
+# =============================================================================
+
+class AgentOutput(BaseModel):
+    """Base des sorties structurées d'agents (validation tolérante, champs en plus conservés)"""
+    
+    class Config:
+        extra = "allow"
+        coerce_numbers_to_str = True
+
+
+class ResearchOutput(AgentOutput):
+    """Sortie de ResearchAgent"""
+    topic: Optional[str] = None
+    key_findings: List[Any] = Field(default_factory=list)
+    confidence: Optional[str] = None  # high, medium, low
+    sources_needed: bool = False
+    summary: Optional[str] = None
+
+
+class WriterOutput(AgentOutput):
+    """Sortie de WriterAgent"""
+    title: Optional[str] = None
+    content: Optional[str] = None
+    word_count: Optional[Union[int, str]] = None
+    tone: Optional[str] = None
+    needs_review: bool = False
+    sections: List[Union[Dict[str, Any], str]] = Field(default_factory=list)
+
+
+class ReviewOutput(AgentOutput):
+    """Sortie de ReviewerAgent"""
+    approved: bool = False
+    score: Optional[Union[float, str]] = None
+    issues: List[Union[Dict[str, Any], str]] = Field(default_factory=list)
+    feedback: Optional[str] = None
+    revised_content: Optional[str] = None
+
+
+class CodeOutput(AgentOutput):
+    """Sortie de CoderAgent"""
+    language: Optional[str] = None
+    description: Optional[str] = None
+    code: Optional[str] = None
+    dependencies: List[Any] = Field(default_factory=list)
+    tests: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class BuilderAction(AgentOutput):
+    """Sortie d'AgentBuilder: outil MCP à appeler et ses paramètres"""
+    tool: str
+    parameters: Dict[str, Any] = Field(default_factory=dict)
+
+
 # =============================================================================
 # WORKFLOW MODELS
 # =============================================================================
@@ -127,6 +199,16 @@ class WorkflowEdge(BaseModel):
     target: UUID
     condition: Optional[str] = None  # Condition pour transition
     label: Optional[str] = None
+    max_iterations: Optional[int] = Field(default=None, ge=1)  # Passages max (cycles)
+
+
+class WorkflowLimits(BaseModel):
+    """Garde-fous d'exécution d'un workflow (None = valeur par défaut du moteur)"""
+    max_steps: Optional[int] = Field(default=None, ge=1)
+    max_edge_iterations: Optional[int] = Field(default=None, ge=1)  # Par edge, sauf max_iterations
+    timeout_seconds: Optional[float] = Field(default=None, gt=0)
+    max_tokens: Optional[int] = Field(default=None, ge=1)
+    fallback_action: Optional[str] = None  # Action suivie quand une limite est atteinte (None = échec)
 
 
 class WorkflowDefinition(BaseModel):
@@ -139,6 +221,7 @@ class WorkflowDefinition(BaseModel):
     edges: List[WorkflowEdge] = Field(default_factory=list)
     input_schema: Dict[str, Any] = Field(default_factory=dict)
     output_schema: Dict[str, Any] = Field(default_factory=dict)
+    limits: WorkflowLimits = Field(default_factory=WorkflowLimits)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     created_by: Optional[UUID] = None
@@ -155,6 +238,7 @@ class WorkflowCreate(BaseModel):
     edges: List[WorkflowEdge] = Field(default_factory=list)
     input_schema: Dict[str, Any] = Field(default_factory=dict)
     output_schema: Dict[str, Any] = Field(default_factory=dict)
+    limits: WorkflowLimits = Field(default_factory=WorkflowLimits)
 
 
 class WorkflowResponse(BaseModel):
@@ -165,6 +249,7 @@ class WorkflowResponse(BaseModel):
     version: str
     nodes: List[WorkflowNode]
     edges: List[WorkflowEdge]
+    limits: WorkflowLimits = Field(default_factory=WorkflowLimits)
     created_at: datetime
     updated_at: datetime
 
@@ -184,6 +269,17 @@ class ExecutionStep(BaseModel):
     output_data: Dict[str, Any] = Field(default_factory=dict)
     error: Optional[str] = None
     duration_ms: Optional[int] = None
+    action: Optional[str] = None
+    retries: int = 0
+    # Durées des phases du node (ms)
+    prep_ms: Optional[float] = None
+    exec_ms: Optional[float] = None
+    post_ms: Optional[float] = None
+    # Appels LLM faits pendant l'étape
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    llm_latency_ms: float = 0.0
 
 
 class Execution(BaseModel):
@@ -198,6 +294,17 @@ class Execution(BaseModel):
     completed_at: Optional[datetime] = None
     error: Optional[str] = None
     user_id: Optional[UUID] = None
+    # Compteurs des garde-fous (WorkflowLimits)
+    step_count: int = 0
+    edge_counts: Dict[str, int] = Field(default_factory=dict)
+    token_count: int = 0
+    limit_reached: Optional[str] = None
+    # Checkpoint impossible (état non sérialisable): exécution non reprenable
+    checkpoint_error: Optional[str] = None
+    # Instance d'API qui sert l'exécution (file mémoire, voir ExecutionScheduler.claim)
+    owner: Optional[str] = None
+    # Clés écrites différemment par des branches parallèles (dernière écriture gardée)
+    merge_conflicts: List[str] = Field(default_factory=list)
     
     class Config:
         from_attributes = True
@@ -207,6 +314,10 @@ class ExecutionRequest(BaseModel):
     """Requête d'exécution"""
     input_data: Dict[str, Any] = Field(default_factory=dict)
     async_mode: bool = True
+    parallel: bool = False  # Exécute les branches indépendantes en parallèle (DAG)
+    max_concurrency: Optional[int] = Field(default=None, ge=1, le=64)
+    priority: ExecutionPriority = ExecutionPriority.NORMAL  # Mode async (file d'exécution)
+    tenant_id: Optional[str] = None  # Équité entre tenants dans la file d'exécution
 
 
 class ExecutionResponse(BaseModel):
@@ -254,21 +365,30 @@ class ToolResult(BaseModel):
 # =============================================================================
 
 class SharedState(BaseModel):
-    """État partagé entre agents dans un workflow"""
+    """État partagé entre agents dans un workflow, versionné par clé"""
     data: Dict[str, Any] = Field(default_factory=dict)
-    history: List[Dict[str, Any]] = Field(default_factory=list)
+    # Journal compact des écritures: (version, clé), élagué aux history_limit dernières
+    history: List[Tuple[int, str]] = Field(default_factory=list)
+    history_limit: int = Field(default=1000, ge=1)
+    versions: Dict[str, int] = Field(default_factory=dict)
+    version: int = 0
     metadata: Dict[str, Any] = Field(default_factory=dict)
     
     def get(self, key: str, default: Any = None) -> Any:
         return self.data.get(key, default)
     
     def set(self, key: str, value: Any) -> None:
+        self.version += 1
         self.data[key] = value
-        self.history.append({
-            "action": "set",
-            "key": key,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        self.versions[key] = self.version
+        self.history.append((self.version, key))
+        if len(self.history) >= 2 * self.history_limit:
+            # Élagage par blocs: coût amorti constant par écriture
+            del self.history[:-self.history_limit]
+    
+    def changes_since(self, version: int) -> Dict[str, Any]:
+        """Valeurs des clés écrites après `version`"""
+        return {key: self.data[key] for key, v in self.versions.items() if v > version}
 
 
 # Exports
@@ -276,6 +396,7 @@ __all__ = [
     # Enums
     "AgentStatus",
     "ExecutionStatus", 
+    "ExecutionPriority",
     "NodeType",
     "LLMProvider",
     # Agent
@@ -284,9 +405,17 @@ __all__ = [
     "AgentCreate",
     "AgentUpdate",
     "AgentResponse",
+    # Agent outputs
+    "AgentOutput",
+    "ResearchOutput",
+    "WriterOutput",
+    "ReviewOutput",
+    "CodeOutput",
+    "BuilderAction",
     # Workflow
     "WorkflowNode",
     "WorkflowEdge",
+    "WorkflowLimits",
     "WorkflowDefinition",
     "WorkflowCreate",
     "WorkflowResponse",
@@ -5,24 +5,164 @@ Ce module fournit les primitives de base pour orchestrer des agents IA:
 - Node: Unité de base avec prep/exec/post
 - Flow: Orchestration de nodes avec transitions conditionnelles
 - BatchNode: Traitement par lots
+- AsyncParallelBatchNode: Lots asynchrones à concurrence bornée (ItemResult par item)
+- StreamingBatchNode: Lots en flux par chunks, avec sink et checkpoint de position
 - AsyncNode: Support asynchrone
+- FanOut: Exécution parallèle de branches (fan-out / fan-in)
+- RetryPolicy: Retry avec backoff exponentiel et full jitter
+- FlowLimits: Garde-fous des flows (étapes, passages par transition, durée, tokens)
+- VersionedState: État partagé copy-on-write, versionné par clé
 """
 
-from typing import Any, Dict, List, Optional, Callable
+from typing import (
+    Any, AsyncIterator, Callable, ContextManager, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+)
 from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from contextvars import ContextVar, copy_context
 import asyncio
+import copy
+import inspect
+import itertools
+import json
+import logging
+import os
+import random
 import time
 
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# RETRY
+# =============================================================================
+
+# Codes HTTP pour lesquels un nouvel essai a une chance d'aboutir
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+# Erreurs de programmation ou de données: réessayer ne change rien
+PERMANENT_ERRORS = (
+    TypeError, AttributeError, NameError, KeyError, ValueError,
+    NotImplementedError, AssertionError,
+)
+
+_TRANSIENT_NAMES = ("Timeout", "RateLimit", "Connection", "Overloaded", "Unavailable", "InternalServer")
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Retourne True si l'erreur est probablement temporaire.
+
+    Rate limits, timeouts, erreurs réseau et 5xx sont temporaires; les
+    autres 4xx et les erreurs de programmation sont permanentes. Une
+    erreur inconnue est considérée temporaire.
+    """
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status_code, int):
+        return status_code in TRANSIENT_STATUS_CODES or status_code >= 500
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if any(name in type(error).__name__ for name in _TRANSIENT_NAMES):
+        return True
+    return not isinstance(error, PERMANENT_ERRORS)
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Délai Retry-After (en secondes) indiqué par la réponse d'erreur"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Politique de retry: backoff exponentiel avec full jitter.
+
+    Le délai avant l'essai n+1 est tiré dans [0, min(max_delay, base_delay * 2**n)]
+    (au moins le Retry-After du provider s'il est fourni). On abandonne si
+    l'erreur n'est pas retentable (`retry_on`), après `max_retries` retries,
+    ou si le prochain essai dépasserait `deadline` secondes depuis le premier.
+    """
+    
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        deadline: Optional[float] = None,
+        retry_on: Callable[[BaseException], bool] = is_transient_error,
+        jitter: bool = True
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retry_on = retry_on
+        self.jitter = jitter
+    
+    def backoff(self, attempt: int) -> float:
+        """Délai après l'échec de l'essai `attempt` (0 = premier essai)"""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap) if self.jitter else cap
+    
+    def next_delay(self, attempt: int, error: BaseException, elapsed: float) -> Optional[float]:
+        """Délai avant le prochain essai, ou None pour abandonner"""
+        if attempt >= self.max_retries or not self.retry_on(error):
+            return None
+        delay = self.backoff(attempt)
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        if self.deadline is not None and elapsed + delay > self.deadline:
+            return None
+        return delay
+
+
+# Observateur des essais en échec, positionné par Flow pendant son exécution
+attempt_observer: ContextVar[Optional[Callable[["Node", Dict], None]]] = ContextVar(
+    "attempt_observer", default=None
+)
+
+
+# =============================================================================
+# NODES
+# =============================================================================
 
 class Node(ABC):
     """Unité de base - chaque agent hérite de Node"""
     
-    def __init__(self, max_retries: int = 3, wait: int = 1):
+    def __init__(
+        self,
+        max_retries: int = 3,
+        wait: float = 1,
+        retry_policy: Optional[RetryPolicy] = None
+    ):
         self.max_retries = max_retries
         self.wait = wait
+        self._retry_policy = retry_policy
         self.cur_retry = 0
+        self.attempts: List[Dict[str, Any]] = []
+        self.timings: Dict[str, float] = {}
         self.successors: Dict[str, "Node"] = {}
     
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        """Politique explicite, sinon dérivée de max_retries / wait"""
+        if self._retry_policy is not None:
+            return self._retry_policy
+        return RetryPolicy(max_retries=self.max_retries, base_delay=self.wait)
+    
+    @retry_policy.setter
+    def retry_policy(self, policy: Optional[RetryPolicy]) -> None:
+        self._retry_policy = policy
+    
     def prep(self, shared: Dict) -> Any:
         """Prépare les données depuis le store partagé"""
         return None
@@ -36,25 +176,85 @@ class Node(ABC):
         """Post-traite et retourne l'action suivante"""
         return "default"
     
+    def _on_failed_attempt(
+        self,
+        policy: RetryPolicy,
+        attempt: int,
+        error: Exception,
+        started: float,
+        item: Optional[int] = None
+    ) -> Optional[float]:
+        """Enregistre un essai en échec et retourne le délai avant le suivant (None = abandon).
+
+        `item` est l'index de l'item concerné pour les retries item par item.
+        """
+        elapsed = time.monotonic() - started
+        delay = policy.next_delay(attempt, error, elapsed)
+        self.cur_retry = max(self.cur_retry, attempt + 1) if item is not None else attempt + 1
+        record = {
+            "attempt": attempt + 1,
+            "error": f"{type(error).__name__}: {error}",
+            "retryable": delay is not None,
+            "delay": delay,
+            "elapsed_ms": int(elapsed * 1000),
+        }
+        if item is not None:
+            record["item"] = item
+        self.attempts.append(record)
+        observer = attempt_observer.get()
+        if observer is not None:
+            observer(self, record)
+        return delay
+    
     def _exec_with_retry(self, prep_res: Any) -> Any:
-        """Exécute avec retry automatique"""
-        for attempt in range(self.max_retries + 1):
+        """Exécute avec retry selon la politique du node"""
+        policy = self.retry_policy
+        started = time.monotonic()
+        self.cur_retry = 0
+        self.attempts = []
+        for attempt in itertools.count():
             try:
                 return self.exec(prep_res)
             except Exception as e:
-                self.cur_retry = attempt + 1
-                if attempt == self.max_retries:
-                    raise e
-                time.sleep(self.wait * (2 ** attempt))  # Backoff exponentiel
+                delay = self._on_failed_attempt(policy, attempt, e, started)
+                if delay is None:
+                    raise
+                time.sleep(delay)
     
     def run(self, shared: Dict) -> str:
-        """Exécute le node complet"""
+        """Exécute le node complet (durées des phases dans `timings`)"""
+        self.timings = {}
+        started = time.perf_counter()
         prep_res = self.prep(shared)
+        started = self._timed("prep_ms", started)
         exec_res = self._exec_with_retry(prep_res)
-        return self.post(shared, prep_res, exec_res)
+        started = self._timed("exec_ms", started)
+        action = self.post(shared, prep_res, exec_res)
+        self._timed("post_ms", started)
+        return action
     
-    def __rshift__(self, other: "Node") -> "Node":
-        """Opérateur >> pour connexion par défaut"""
+    def _timed(self, phase: str, started: float) -> float:
+        """Enregistre la durée d'une phase et retourne le début de la suivante"""
+        now = time.perf_counter()
+        self.timings[phase] = round((now - started) * 1000, 3)
+        return now
+    
+    def clone(self) -> "Node":
+        """Copie légère pour une exécution.
+
+        La configuration est partagée avec l'original; l'état d'exécution
+        (retries, successeurs) est propre à la copie.
+        """
+        node = copy.copy(self)
+        node.cur_retry = 0
+        node.attempts = []
+        node.timings = {}
+        node.successors = {}
+        return node
+    
+    def __rshift__(self, other: Union["Node", List["Node"]]) -> "Node":
+        """Opérateur >> pour connexion par défaut (une liste crée un fan-out)"""
+        other = _as_successor(other)
         self.successors["default"] = other
         return other
     
@@ -70,8 +270,9 @@ class _ConditionalTransition:
         self.source = source
         self.condition = condition
     
-    def __rshift__(self, target: Node) -> Node:
+    def __rshift__(self, target: Union[Node, List[Node]]) -> Node:
         """Opérateur >> pour compléter la connexion conditionnelle"""
+        target = _as_successor(target)
         self.source.successors[self.condition] = target
         return target
 
@@ -88,10 +289,31 @@ class AsyncNode(Node):
     async def post_async(self, shared: Dict, prep_res: Any, exec_res: Any) -> str:
         return self.post(shared, prep_res, exec_res)
     
+    async def _exec_with_retry_async(self, prep_res: Any) -> Any:
+        """Exécute avec retry sans bloquer la boucle d'événements"""
+        policy = self.retry_policy
+        started = time.monotonic()
+        self.cur_retry = 0
+        self.attempts = []
+        for attempt in itertools.count():
+            try:
+                return await self.exec_async(prep_res)
+            except Exception as e:
+                delay = self._on_failed_attempt(policy, attempt, e, started)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+    
     async def run_async(self, shared: Dict) -> str:
+        self.timings = {}
+        started = time.perf_counter()
         prep_res = await self.prep_async(shared)
-        exec_res = await self.exec_async(prep_res)
-        return await self.post_async(shared, prep_res, exec_res)
+        started = self._timed("prep_ms", started)
+        exec_res = await self._exec_with_retry_async(prep_res)
+        started = self._timed("exec_ms", started)
+        action = await self.post_async(shared, prep_res, exec_res)
+        self._timed("post_ms", started)
+        return action
 
 
 class BatchNode(Node):
@@ -106,43 +328,1072 @@ class BatchNode(Node):
         raise NotImplementedError
 
 
+class ItemResult:
+    """Résultat d'un item de lot: sa valeur, ou l'erreur après ses retries"""
+    
+    __slots__ = ("index", "value", "error", "attempts")
+    
+    def __init__(
+        self,
+        index: int,
+        value: Any = None,
+        error: Optional[BaseException] = None,
+        attempts: int = 1
+    ):
+        self.index = index
+        self.value = value
+        self.error = error
+        self.attempts = attempts
+    
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+    
+    def unwrap(self) -> Any:
+        """Retourne la valeur ou relève l'erreur de l'item"""
+        if self.error is not None:
+            raise self.error
+        return self.value
+    
+    def __repr__(self) -> str:
+        outcome = f"value={self.value!r}" if self.ok else f"error={self.error!r}"
+        return f"ItemResult(index={self.index}, {outcome}, attempts={self.attempts})"
+
+
 class AsyncParallelBatchNode(AsyncNode):
-    """Node pour traitement parallèle asynchrone"""
+    """Node pour traitement parallèle asynchrone.
+
+    Les items sont consommés au fil de l'eau (liste ou générateur): au plus
+    `max_concurrency` sont traités simultanément et au plus deux fois plus
+    attendent d'être restitués dans l'ordre, la mémoire reste donc bornée
+    quelle que soit la taille du lot (`iter_results`).
+
+    Chaque item est retenté selon `item_retry_policy` (par défaut la
+    politique du node) au lieu de rejouer tout le lot; chaque essai en
+    échec est ajouté à `attempts` (avec l'index `item`) et publié comme
+    `node_retry`. Avec `return_exceptions=True`, `exec_async` retourne des
+    `ItemResult` et les items réussis sont conservés malgré les échecs.
+
+    Sans `sink`, `exec_async` rassemble les résultats en liste. Avec un
+    `sink` (BatchSink ou fonction), chaque résultat y est écrit dès qu'il
+    est restitué et `exec_async` ne retourne qu'un résumé: la mémoire du
+    node reste constante.
+    """
     
-    async def exec_async(self, items: List[Any]) -> List[Any]:
-        tasks = [self.exec_item_async(item) for item in items]
-        return await asyncio.gather(*tasks)
+    DEFAULT_MAX_CONCURRENCY = 32
+    
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        item_retry_policy: Optional[RetryPolicy] = None,
+        return_exceptions: bool = False,
+        sink: Optional[Union["BatchSink", Callable[[List[Any]], None]]] = None,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.max_concurrency = max_concurrency or self.DEFAULT_MAX_CONCURRENCY
+        self.item_retry_policy = item_retry_policy
+        self.return_exceptions = return_exceptions
+        if sink is not None and not isinstance(sink, BatchSink):
+            sink = CallbackSink(sink)
+        self.sink = sink
     
     async def exec_item_async(self, item: Any) -> Any:
         raise NotImplementedError
+    
+    async def _run_item(self, semaphore: asyncio.Semaphore, index: int, item: Any) -> ItemResult:
+        policy = self.item_retry_policy or self.retry_policy
+        started = time.monotonic()
+        for attempt in itertools.count():
+            try:
+                async with semaphore:
+                    value = await self.exec_item_async(item)
+                return ItemResult(index, value=value, attempts=attempt + 1)
+            except Exception as e:
+                delay = self._on_failed_attempt(policy, attempt, e, started, item=index)
+                if delay is None:
+                    return ItemResult(index, error=e, attempts=attempt + 1)
+                await asyncio.sleep(delay)
+    
+    async def iter_results(self, items: Iterable[Any]) -> AsyncIterator[ItemResult]:
+        """Restitue les résultats dans l'ordre des items, au fil des complétions"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        window = 2 * self.max_concurrency
+        iterator = enumerate(items)
+        pending: Deque[asyncio.Future] = deque()
+        
+        def start_next() -> bool:
+            entry = next(iterator, None)
+            if entry is None:
+                return False
+            pending.append(asyncio.ensure_future(self._run_item(semaphore, *entry)))
+            return True
+        
+        try:
+            while len(pending) < window and start_next():
+                pass
+            while pending:
+                result = await pending.popleft()
+                start_next()
+                yield result
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def exec_async(self, items: Iterable[Any]) -> Any:
+        results = []
+        processed = failed = 0
+        async for result in self.iter_results(items):
+            output = result if self.return_exceptions else result.unwrap()
+            processed += 1
+            failed += not result.ok
+            if self.sink is not None:
+                self.sink.write([output])
+            else:
+                results.append(output)
+        if self.sink is not None:
+            return {"processed": processed, "failed": failed}
+        return results
+    
+    async def _exec_with_retry_async(self, prep_res: Any) -> Any:
+        """Les retries sont faits item par item: le lot n'est exécuté qu'une fois"""
+        self.cur_retry = 0
+        self.attempts = []
+        return await self.exec_async(prep_res)
+    
+    async def run_async(self, shared: Dict) -> str:
+        if self.sink is not None:
+            self.sink.open(shared)
+        try:
+            return await super().run_async(shared)
+        finally:
+            if self.sink is not None:
+                self.sink.close()
+
+
+# =============================================================================
+# STREAMING BATCH
+# =============================================================================
+
+class BatchSink:
+    """Destination des résultats d'un StreamingBatchNode, écrits chunk par chunk"""
+    
+    def open(self, shared: Dict) -> None:
+        """Appelé au début de l'exécution du node"""
+    
+    def write(self, results: List[Any]) -> None:
+        raise NotImplementedError
+    
+    def close(self) -> None:
+        """Appelé à la fin de l'exécution (succès ou échec)"""
+
+
+class CallbackSink(BatchSink):
+    """Passe chaque chunk de résultats à une fonction"""
+    
+    def __init__(self, callback: Callable[[List[Any]], None]):
+        self.callback = callback
+    
+    def write(self, results: List[Any]) -> None:
+        self.callback(results)
+
+
+class SharedListSink(BatchSink):
+    """Ajoute les résultats à une liste du store partagé (journal en ajout seul)"""
+    
+    def __init__(self, key: str):
+        self.key = key
+        self._shared: Optional[Dict] = None
+        self._log: Optional[List[Any]] = None
+    
+    def open(self, shared: Dict) -> None:
+        self._shared = shared
+        self._log = shared.setdefault(self.key, [])
+    
+    def write(self, results: List[Any]) -> None:
+        self._log.extend(results)
+        if isinstance(self._shared, VersionedState):
+            self._shared.touch(self.key)
+
+
+class JSONLinesSink(BatchSink):
+    """Ajoute les résultats à un fichier JSON Lines (un résultat par ligne)"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+    
+    def write(self, results: List[Any]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.writelines(json.dumps(result, default=str) + "\n" for result in results)
+        self._file.flush()
+    
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class BatchCheckpoint:
+    """Position (nombre d'items traités) d'un StreamingBatchNode, en mémoire"""
+    
+    def __init__(self):
+        self.position = 0
+    
+    def load(self) -> int:
+        return self.position
+    
+    def save(self, position: int) -> None:
+        self.position = position
+    
+    def clear(self) -> None:
+        self.position = 0
+
+
+class FileBatchCheckpoint(BatchCheckpoint):
+    """Position persistée dans un fichier JSON (écriture atomique)"""
+    
+    def __init__(self, path: str):
+        self.path = path
+    
+    def load(self) -> int:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return int(json.load(f).get("position", 0))
+        except (OSError, ValueError):
+            return 0
+    
+    def save(self, position: int) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"position": position}, f)
+        os.replace(tmp_path, self.path)
+    
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class StreamingBatchNode(AsyncNode):
+    """Lot en flux pour des jeux de données plus grands que la mémoire.
+
+    `prep` retourne un itérable (ou itérable asynchrone en mode async):
+    lignes de fichier, curseur de base, pages d'un outil... Les items sont
+    traités par chunks de `chunk_size`; chaque chunk est écrit dans `sink`
+    puis la position est enregistrée dans `checkpoint`. Après un crash,
+    l'exécution reprend au dernier chunk enregistré (au pire ce chunk est
+    écrit deux fois). `exec` retourne un résumé; les résultats ne sont pas
+    conservés en mémoire.
+
+    La reprise suppose un `checkpoint` persistant (FileBatchCheckpoint...)
+    propre à la source. Sans checkpoint fourni, chaque exécution part d'une
+    position en mémoire neuve: un échec ne décale pas l'exécution suivante
+    ni les copies du node.
+
+    Chaque chunk est retenté selon la politique du node. `skip` peut être
+    surchargé pour se positionner directement dans la source (OFFSET SQL,
+    seek dans un fichier) au lieu de consommer les items déjà traités.
+    """
+    
+    def __init__(
+        self,
+        chunk_size: int = 100,
+        sink: Optional[Union[BatchSink, Callable[[List[Any]], None]]] = None,
+        checkpoint: Optional[BatchCheckpoint] = None,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.chunk_size = max(1, chunk_size)
+        if sink is not None and not isinstance(sink, BatchSink):
+            sink = CallbackSink(sink)
+        self.sink = sink
+        self._owns_checkpoint = checkpoint is None
+        self.checkpoint = checkpoint or BatchCheckpoint()
+    
+    def _open(self, shared: Dict) -> None:
+        if self._owns_checkpoint:
+            self.checkpoint = BatchCheckpoint()
+        if self.sink is not None:
+            self.sink.open(shared)
+    
+    def exec_item(self, item: Any) -> Any:
+        raise NotImplementedError
+    
+    async def exec_item_async(self, item: Any) -> Any:
+        return self.exec_item(item)
+    
+    def exec_chunk(self, chunk: List[Any]) -> List[Any]:
+        return [self.exec_item(item) for item in chunk]
+    
+    async def exec_chunk_async(self, chunk: List[Any]) -> List[Any]:
+        return await asyncio.gather(*(self.exec_item_async(item) for item in chunk))
+    
+    def skip(self, source: Iterable[Any], position: int) -> Iterable[Any]:
+        """Retourne la source privée de ses `position` premiers items"""
+        return itertools.islice(source, position, None)
+    
+    def _chunks(self, source: Iterable[Any], position: int):
+        iterator = iter(self.skip(source, position) if position else source)
+        while True:
+            chunk = list(itertools.islice(iterator, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+    
+    async def _achunks(self, source: Any, position: int):
+        if not hasattr(source, "__aiter__"):
+            for chunk in self._chunks(source, position):
+                yield chunk
+            return
+        chunk: List[Any] = []
+        index = 0
+        async for item in source:
+            index += 1
+            if index <= position:
+                continue
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def _commit(self, position: int, chunk: List[Any], results: List[Any]) -> int:
+        if self.sink is not None:
+            self.sink.write(results)
+        position += len(chunk)
+        self.checkpoint.save(position)
+        return position
+    
+    def _finish(self, start: int, position: int, chunks: int) -> Dict[str, int]:
+        """Source épuisée: la prochaine exécution repart du début"""
+        self.checkpoint.clear()
+        return {"processed": position - start, "chunks": chunks, "resumed_from": start, "total": position}
+    
+    def exec(self, source: Iterable[Any]) -> Dict[str, int]:
+        start = position = self.checkpoint.load()
+        chunks = 0
+        for chunk in self._chunks(source, position):
+            results = self._retry_chunk(chunk)
+            position = self._commit(position, chunk, results)
+            chunks += 1
+        return self._finish(start, position, chunks)
+    
+    async def exec_async(self, source: Any) -> Dict[str, int]:
+        start = position = self.checkpoint.load()
+        chunks = 0
+        async for chunk in self._achunks(source, position):
+            results = await self._retry_chunk_async(chunk)
+            position = self._commit(position, chunk, results)
+            chunks += 1
+        return self._finish(start, position, chunks)
+    
+    def _retry_chunk(self, chunk: List[Any]) -> List[Any]:
+        policy = self.retry_policy
+        started = time.monotonic()
+        for attempt in itertools.count():
+            try:
+                return self.exec_chunk(chunk)
+            except Exception as e:
+                delay = self._on_failed_attempt(policy, attempt, e, started)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+    
+    async def _retry_chunk_async(self, chunk: List[Any]) -> List[Any]:
+        policy = self.retry_policy
+        started = time.monotonic()
+        for attempt in itertools.count():
+            try:
+                return await self.exec_chunk_async(chunk)
+            except Exception as e:
+                delay = self._on_failed_attempt(policy, attempt, e, started)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+    
+    def _exec_with_retry(self, prep_res: Any) -> Any:
+        """Les retries sont faits chunk par chunk: la source n'est parcourue qu'une fois"""
+        self.cur_retry = 0
+        self.attempts = []
+        return self.exec(prep_res)
+    
+    async def _exec_with_retry_async(self, prep_res: Any) -> Any:
+        self.cur_retry = 0
+        self.attempts = []
+        return await self.exec_async(prep_res)
+    
+    def run(self, shared: Dict) -> str:
+        self._open(shared)
+        try:
+            return super().run(shared)
+        finally:
+            if self.sink is not None:
+                self.sink.close()
+    
+    async def run_async(self, shared: Dict) -> str:
+        self._open(shared)
+        try:
+            return await super().run_async(shared)
+        finally:
+            if self.sink is not None:
+                self.sink.close()
+
+
+# =============================================================================
+# ÉTAT PARTAGÉ
+# =============================================================================
+
+class VersionedState(MutableMapping):
+    """État partagé copy-on-write, versionné par clé.
+
+    `snapshot()` est O(1): la copie partage ses tables avec l'original, et
+    chacun ne les duplique (copie superficielle, valeurs partagées) qu'à sa
+    première écriture. Chaque écriture incrémente `version` et l'attribue à
+    la clé: `changes_since(version)` retourne les écritures depuis un point
+    (checkpoint incrémental), `writes_since(base)` celles d'une branche
+    depuis son fork.
+
+    Les valeurs étant partagées entre copies, on écrit une nouvelle valeur
+    (`state[k] = state[k] + [x]`) plutôt que de la modifier en place; une
+    modification en place doit être signalée par `touch(k)`.
+
+    Une branche parallèle travaille sur un `fork()`: chaque valeur mutable
+    (list, dict, set) y est copiée (sur un niveau) à sa première lecture,
+    une modification en place ne touche donc jamais l'état des autres
+    branches, et `writes_since` la détecte en comparant la copie.
+    """
+    
+    __slots__ = ("_data", "_versions", "_owned", "_copied", "version")
+    
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        self._data: Dict[str, Any] = dict(data or {})
+        # Version de la dernière écriture de chaque clé (clé absente de _data: supprimée)
+        self._versions: Dict[str, int] = dict.fromkeys(self._data, 0)
+        self._owned = True
+        self._copied: Optional[Set[str]] = None  # Clés copiées à la lecture (fork)
+        self.version = 0
+    
+    def snapshot(self) -> "VersionedState":
+        """Copie O(1) (tables partagées jusqu'à la première écriture)"""
+        state = VersionedState.__new__(VersionedState)
+        state._data = self._data
+        state._versions = self._versions
+        state._owned = False
+        state._copied = None
+        state.version = self.version
+        self._owned = False
+        return state
+    
+    copy = snapshot
+    
+    def fork(self) -> "VersionedState":
+        """Snapshot isolé pour une branche: valeurs mutables copiées à la première lecture"""
+        state = self.snapshot()
+        state._copied = set()
+        return state
+    
+    def _own(self) -> None:
+        if not self._owned:
+            self._data = dict(self._data)
+            self._versions = dict(self._versions)
+            self._owned = True
+    
+    def _write(self, key: str) -> None:
+        self._own()
+        self.version += 1
+        self._versions[key] = self.version
+    
+    def __getitem__(self, key: str) -> Any:
+        value = self._data[key]
+        if self._copied is not None and key not in self._copied and isinstance(value, (list, dict, set)):
+            self._own()
+            value = self._data[key] = copy.copy(value)
+            self._copied.add(key)
+        return value
+    
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._write(key)
+        self._data[key] = value
+    
+    def __delitem__(self, key: str) -> None:
+        if key not in self._data:
+            raise KeyError(key)
+        self._write(key)
+        del self._data[key]
+    
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __repr__(self) -> str:
+        return f"VersionedState(version={self.version}, {self._data!r})"
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self._data else default
+    
+    def touch(self, key: str) -> None:
+        """Signale une modification en place de la valeur de `key`"""
+        if key in self._data:
+            self._write(key)
+    
+    def version_of(self, key: str) -> int:
+        """Version de la dernière écriture de `key` (0: jamais écrite)"""
+        return self._versions.get(key, 0)
+    
+    def changes_since(self, version: int) -> Tuple[Dict[str, Any], List[str]]:
+        """Clés écrites (avec leur valeur) et clés supprimées après `version`"""
+        written, deleted = {}, []
+        for key, key_version in self._versions.items():
+            if key_version > version:
+                if key in self._data:
+                    written[key] = self._data[key]
+                else:
+                    deleted.append(key)
+        return written, deleted
+    
+    def writes_since(self, base: "VersionedState") -> Dict[str, Any]:
+        """Clés ajoutées ou modifiées depuis le fork `base`.
+
+        Les versions suffisent, sauf pour les valeurs copiées à la lecture
+        (fork), comparées à celles de `base` pour détecter une modification
+        en place.
+        """
+        if self._versions is base._versions:
+            return {}
+        writes = {
+            key: value
+            for key, value in self._data.items()
+            if self._versions.get(key) != base._versions.get(key)
+        }
+        for key in self._copied or ():
+            if key not in writes and key in self._data and self._data[key] != base._data.get(key, _MISSING):
+                writes[key] = self._data[key]
+        return writes
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self._data)
+
+
+# =============================================================================
+# FAN-OUT / FAN-IN
+# =============================================================================
+
+_MISSING = object()
+
+
+def fork_shared(shared: Dict) -> Dict:
+    """Copie de `shared` pour une branche (conteneurs copiés sur un niveau).
+
+    Un VersionedState est copié par `fork()`, en O(1): ses conteneurs ne
+    sont copiés qu'à leur première lecture par la branche.
+    """
+    if isinstance(shared, VersionedState):
+        return shared.fork()
+    return {
+        key: copy.copy(value) if isinstance(value, (list, dict, set)) else value
+        for key, value in shared.items()
+    }
+
+
+def branch_writes(base: Dict, branch: Dict) -> Dict:
+    """Retourne les clés ajoutées ou modifiées par une branche"""
+    if isinstance(base, VersionedState) and isinstance(branch, VersionedState):
+        return branch.writes_since(base)
+    writes = {}
+    for key, value in branch.items():
+        original = base.get(key, _MISSING)
+        if value is original:
+            continue
+        if isinstance(value, (list, dict, set)) and value == original:
+            continue
+        writes[key] = value
+    return writes
+
+
+def _changed(value: Any, original: Any) -> bool:
+    return value is not original and value != original
+
+
+def _merge_dict(original: Dict, current: Dict, value: Dict, path: str, conflicts: List[str]) -> Dict:
+    """Applique à `current` les clés qu'une branche a modifiées dans `original` (récursif)"""
+    merged = dict(current)
+    for key in {**original, **value}:
+        before = original.get(key, _MISSING)
+        after = value.get(key, _MISSING)
+        if not _changed(after, before):
+            continue
+        now = current.get(key, _MISSING)
+        if isinstance(after, dict) and isinstance(before, dict) and isinstance(now, dict):
+            merged[key] = _merge_dict(before, now, after, f"{path}.{key}", conflicts)
+            continue
+        if _changed(now, before) and _changed(now, after):
+            conflicts.append(f"{path}.{key}")
+        if after is _MISSING:
+            merged.pop(key, None)
+        else:
+            merged[key] = after
+    return merged
+
+
+def merge_writes(shared: Dict, base: Dict, writes: List[Dict]) -> List[str]:
+    """Fusionne dans `shared` les écritures de branches parties de `base`.
+
+    Les éléments ajoutés à une même liste par plusieurs branches sont
+    concaténés dans l'ordre des branches; les dicts sont fusionnés clé par
+    clé (récursivement), des branches écrivant des clés distinctes ne se
+    gênent donc pas. Une valeur qui définit `merge_into(original, current)`
+    (ex: agents.history.History, liste bornée) fusionne elle-même ses ajouts.
+    Pour les autres valeurs la dernière branche l'emporte.
+    Retourne les conflits: clés (ou chemins `clé.sous_clé`) écrites
+    différemment par plusieurs branches ou, pour un VersionedState,
+    modifiées dans `shared` depuis `base`.
+    """
+    versioned = isinstance(shared, VersionedState) and isinstance(base, VersionedState)
+    merged = set()
+    conflicts = []
+    for branch_write in writes:
+        for key, value in branch_write.items():
+            original = base.get(key)
+            current = shared.get(key)
+            if hasattr(value, "merge_into"):
+                shared[key] = value.merge_into(original, current)
+                continue
+            if (
+                isinstance(value, list)
+                and isinstance(original, list)
+                and isinstance(current, list)
+                and value[:len(original)] == original
+            ):
+                shared[key] = current + value[len(original):]
+                continue
+            if isinstance(value, dict) and isinstance(original, dict) and isinstance(current, dict):
+                shared[key] = _merge_dict(original, current, value, key, conflicts)
+                continue
+            if key in merged or (versioned and shared.version_of(key) != base.version_of(key)):
+                conflicts.append(key)
+            shared[key] = value
+            merged.add(key)
+    return list(dict.fromkeys(conflicts))
+
+
+class FanOut(AsyncNode):
+    """Exécute plusieurs branches en parallèle puis fusionne leurs écritures.
+
+    Chaque branche est un node (ou le début d'une chaîne de nodes) exécuté
+    sur une copie de `shared`. Le node attend toutes les branches, ou les
+    `wait_for` premières terminées (les autres sont annulées), puis fusionne
+    les clés écrites par chaque branche dans `shared` via `merge`.
+
+    Les clés écrites différemment par plusieurs branches (voir
+    `merge_writes`) sont journalisées et gardées dans `conflicts`; un Flow
+    les publie dans un événement "merge_conflict" (keys).
+
+        research >> [topic_a, topic_b, topic_c] >> writer
+    """
+    
+    def __init__(
+        self,
+        branches: List[Node],
+        wait_for: Optional[int] = None,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        if not branches:
+            raise ValueError("FanOut nécessite au moins une branche")
+        if wait_for is not None and not 1 <= wait_for <= len(branches):
+            raise ValueError(f"wait_for doit être entre 1 et {len(branches)}")
+        self.branches = list(branches)
+        self.wait_for = wait_for
+        self.conflicts: List[str] = []
+    
+    def exec(self, prep_res: Any) -> Any:
+        return None
+    
+    def merge(self, shared: Dict, base: Dict, writes: List[Dict]) -> List[str]:
+        """Fusionne les écritures des branches et retourne les conflits (override pour une autre stratégie)"""
+        return merge_writes(shared, base, writes)
+    
+    def _fan_in(self, shared: Dict, results: List[Optional[Dict]]) -> str:
+        base = shared.snapshot() if isinstance(shared, VersionedState) else dict(shared)
+        writes = [
+            branch_writes(base, branch_shared)
+            for branch_shared in results
+            if branch_shared is not None
+        ]
+        self.conflicts = self.merge(shared, base, writes) or []
+        if self.conflicts:
+            logger.warning("FanOut: clés écrites par plusieurs branches: %s", ", ".join(self.conflicts))
+        return "default"
+    
+    def run(self, shared: Dict) -> str:
+        """Exécute les branches dans un pool de threads (mode synchrone)"""
+        results: List[Optional[Dict]] = [None] * len(self.branches)
+        needed = self.wait_for or len(self.branches)
+        
+        pool = ThreadPoolExecutor(max_workers=len(self.branches))
+        try:
+            futures = {
+                # Chaque branche hérite du contexte (observateur, sink, usage)
+                pool.submit(copy_context().run, Flow(start=branch).run, fork_shared(shared)): i
+                for i, branch in enumerate(self.branches)
+            }
+            for finished, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if finished >= needed:
+                    break
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        
+        return self._fan_in(shared, results)
+    
+    async def run_async(self, shared: Dict) -> str:
+        """Exécute les branches de manière concurrente avec asyncio"""
+        tasks = [
+            asyncio.ensure_future(Flow(start=branch).run_async(fork_shared(shared)))
+            for branch in self.branches
+        ]
+        
+        if self.wait_for is None:
+            results: List[Optional[Dict]] = list(await asyncio.gather(*tasks))
+            return self._fan_in(shared, results)
+        
+        results = [None] * len(tasks)
+        pending = set(tasks)
+        finished = 0
+        try:
+            while finished < self.wait_for:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    results[tasks.index(task)] = task.result()
+                    finished += 1
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        return self._fan_in(shared, results)
+
+
+def _as_successor(target: Union[Node, List[Node]]) -> Node:
+    """Convertit une liste de nodes en FanOut"""
+    if isinstance(target, (list, tuple)):
+        return FanOut(list(target))
+    return target
+
+
+# =============================================================================
+# LIMITES D'EXÉCUTION
+# =============================================================================
+
+class BudgetExceeded(Exception):
+    """Une limite d'exécution du flow a été atteinte (sans action de repli)"""
+    
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class FlowLimits:
+    """Garde-fous d'un flow (cycles, durée, consommation).
+
+    - `max_steps`: nombre maximal de nodes exécutés
+    - `max_edge_visits`: passages maximaux par transition (node, action),
+      surchargés par `edge_limits[(node, action)]`
+    - `deadline`: durée maximale en secondes (un node async en cours est
+      interrompu, un node synchrone est attendu jusqu'à sa fin)
+    - `max_tokens`: budget de tokens, mesuré par `token_counter()`
+
+    Quand une limite est atteinte à une transition, le flow suit l'action
+    `fallback` du node courant (une seule étape supplémentaire, ou fin du
+    flow si le node n'a pas ce successeur); sans `fallback`, BudgetExceeded
+    est levée.
+    """
+    
+    def __init__(
+        self,
+        max_steps: Optional[int] = None,
+        max_edge_visits: Optional[int] = None,
+        edge_limits: Optional[Dict[Tuple["Node", str], int]] = None,
+        deadline: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        token_counter: Optional[Callable[[], int]] = None,
+        fallback: Optional[str] = None
+    ):
+        self.max_steps = max_steps
+        self.max_edge_visits = max_edge_visits
+        self.edge_limits = edge_limits or {}
+        self.deadline = deadline
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter
+        self.fallback = fallback
+    
+    def tokens_used(self) -> int:
+        return self.token_counter() if self.token_counter is not None else 0
+    
+    def exceeded(self, steps: int, elapsed: float) -> Optional[str]:
+        """Limite globale atteinte (steps, deadline, tokens), ou None"""
+        if self.max_steps is not None and steps >= self.max_steps:
+            return "max_steps"
+        if self.deadline is not None and elapsed >= self.deadline:
+            return "deadline"
+        if self.max_tokens is not None and self.tokens_used() >= self.max_tokens:
+            return "max_tokens"
+        return None
+    
+    def edge_limit(self, node: "Node", action: str) -> Optional[int]:
+        return self.edge_limits.get((node, action), self.max_edge_visits)
+
+
+def _node_label(node: "Node") -> str:
+    return getattr(node, "node_id", None) or type(node).__name__
 
 
 class Flow:
-    """Orchestrateur de nodes"""
+    """Orchestrateur de nodes.
+
+    `listener(event, node, data)` est appelé à chaque étape avec les
+    événements "node_started", "node_retry" (attempt, error, retryable,
+    delay), "node_finished" (action, duration_ms, retries),
+    "node_failed" (error, duration_ms, retries) et "transition" (action, target).
+
+    `checkpoint(next_node, shared)` est appelé après chaque node terminé
+    (`next_node` vaut None en fin de flow) pour permettre une reprise; en
+    mode async, il peut retourner un awaitable (attendu avant le node
+    suivant). `run(shared, start=node)` reprend l'exécution à partir d'un
+    node.
+
+    `limits` (FlowLimits) borne les cycles, la durée et la consommation;
+    l'événement "limit_reached" (reason, action) est publié quand une
+    limite est atteinte et `stats()` donne les compteurs de l'exécution.
+    `counters` (résultat de `stats()` d'une exécution précédente) fait
+    repartir les compteurs de steps et d'edges de leurs valeurs lors d'une
+    reprise. Un node synchrone tourne dans un thread qui ne peut pas être
+    interrompu: la deadline est vérifiée à sa fin, avant le node suivant.
+
+    Après un node qui signale des `conflicts` de fusion (FanOut),
+    l'événement "merge_conflict" (keys) est publié.
+
+    `step_context(node)` (context manager) entoure l'exécution de chaque
+    node, dans le contexte du node: l'appelant y installe par exemple ses
+    compteurs propres à l'étape.
+    """
     
-    def __init__(self, start: Node):
+    def __init__(
+        self,
+        start: Node,
+        listener: Optional[Callable[[str, Node, Dict], None]] = None,
+        checkpoint: Optional[Callable[[Optional[Node], Dict], Any]] = None,
+        limits: Optional[FlowLimits] = None,
+        counters: Optional[Dict[str, Any]] = None,
+        step_context: Optional[Callable[[Node], ContextManager]] = None
+    ):
         self.start = start
+        self.listener = listener
+        self.checkpoint = checkpoint
+        self.limits = limits
+        self.counters = counters
+        self.step_context = step_context
+        self._reset_counters()
+    
+    def _reset_counters(self) -> None:
+        self.steps = 0
+        self.edge_counts: Dict[Tuple[Node, str], int] = {}
+        self.limit_reached: Optional[str] = None
+        self._started = time.monotonic()
+        if self.counters:
+            self._restore_counters(self.counters)
+    
+    def _restore_counters(self, counters: Dict[str, Any]) -> None:
+        """Reprend les compteurs enregistrés (edges retrouvées par leur libellé)"""
+        self.steps = counters.get("steps", 0)
+        edges = counters.get("edges") or {}
+        seen: Set[int] = set()
+        stack = [self.start]
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            for action, successor in node.successors.items():
+                count = edges.get(f"{_node_label(node)}:{action}")
+                if count:
+                    self.edge_counts[(node, action)] = count
+                stack.append(successor)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs de la dernière exécution"""
+        return {
+            "steps": self.steps,
+            "edges": {
+                f"{_node_label(node)}:{action}": count
+                for (node, action), count in self.edge_counts.items()
+            },
+            "tokens": self.limits.tokens_used() if self.limits is not None else 0,
+            "limit_reached": self.limit_reached,
+        }
+    
+    def _remaining_time(self) -> Optional[float]:
+        if self.limits is None or self.limits.deadline is None:
+            return None
+        return self.limits.deadline - (time.monotonic() - self._started)
     
-    def run(self, shared: Dict) -> Dict:
+    def _next_node(self, node: Node, action: str) -> Optional[Node]:
+        """Successeur de `node` pour `action`, en appliquant les limites"""
+        successor = node.successors.get(action)
+        if successor is None or self.limits is None:
+            return successor
+        if self.limit_reached is not None:
+            return None  # Étape de repli déjà exécutée
+        
+        reason = self.limits.exceeded(self.steps, time.monotonic() - self._started)
+        if reason is None:
+            limit = self.limits.edge_limit(node, action)
+            if limit is not None and self.edge_counts.get((node, action), 0) >= limit:
+                reason = "max_edge_iterations"
+        if reason is None:
+            self.edge_counts[(node, action)] = self.edge_counts.get((node, action), 0) + 1
+            return successor
+        
+        self.limit_reached = reason
+        self._emit("limit_reached", node, reason=reason, action=action)
+        fallback = self.limits.fallback
+        if fallback is None:
+            raise BudgetExceeded(
+                reason,
+                f"Limite d'exécution atteinte ({reason}) après {self.steps} étapes "
+                f"sur la transition {_node_label(node)} -> {action}"
+            )
+        target = node.successors.get(fallback) if fallback != action else None
+        if target is not None:
+            self.edge_counts[(node, fallback)] = self.edge_counts.get((node, fallback), 0) + 1
+        return target
+    
+    def _deadline_exceeded(self) -> BudgetExceeded:
+        self.limit_reached = "deadline"
+        return BudgetExceeded("deadline", f"Durée maximale du flow dépassée ({self.limits.deadline:g}s)")
+    
+    def _emit(self, event: str, node: Node, **data) -> None:
+        if self.listener is not None:
+            self.listener(event, node, data)
+    
+    def _step(self, node: Node) -> ContextManager:
+        return self.step_context(node) if self.step_context is not None else nullcontext()
+    
+    def _observe_attempts(self):
+        """Relaie les essais en échec des nodes au listener (token à réinitialiser)"""
+        if self.listener is None:
+            return None
+        return attempt_observer.set(
+            lambda node, attempt: self._emit("node_retry", node, **attempt)
+        )
+    
+    def _fail_step(self, node: Node, error: Exception, started: float) -> None:
+        self._emit(
+            "node_failed", node,
+            error=str(error),
+            duration_ms=int((time.perf_counter() - started) * 1000),
+            retries=node.cur_retry,
+            **getattr(node, "timings", {})
+        )
+    
+    def _finish_step(self, node: Node, action: str, started: float) -> Optional[Node]:
+        """Publie la fin d'un node et retourne le suivant"""
+        conflicts = getattr(node, "conflicts", None)
+        if conflicts:
+            self._emit("merge_conflict", node, keys=list(conflicts))
+        self._emit(
+            "node_finished", node,
+            action=action,
+            duration_ms=int((time.perf_counter() - started) * 1000),
+            retries=node.cur_retry,
+            **getattr(node, "timings", {})
+        )
+        successor = self._next_node(node, action)
+        if successor is not None:
+            self._emit("transition", node, action=action, target=successor)
+        return successor
+    
+    def _save_checkpoint(self, successor: Optional[Node], shared: Dict) -> Any:
+        if self.checkpoint is not None:
+            return self.checkpoint(successor, shared)
+        return None
+    
+    def run(self, shared: Dict, start: Optional[Node] = None) -> Dict:
         """Exécute le flow de manière synchrone"""
-        current = self.start
+        current = start or self.start
+        token = self._observe_attempts()
+        self._reset_counters()
         
-        while current is not None:
-            action = current.run(shared)
-            current = current.successors.get(action)
+        try:
+            while current is not None:
+                self.steps += 1
+                self._emit("node_started", current)
+                started = time.perf_counter()
+                try:
+                    with self._step(current):
+                        action = current.run(shared)
+                except Exception as e:
+                    self._fail_step(current, e, started)
+                    raise
+                current = self._finish_step(current, action, started)
+                self._save_checkpoint(current, shared)
+        finally:
+            if token is not None:
+                attempt_observer.reset(token)
         
         return shared
     
-    async def run_async(self, shared: Dict) -> Dict:
+    async def _run_async_node(self, node: AsyncNode, shared: Dict) -> str:
+        """Exécute un node async, annulé s'il dépasse la deadline du flow"""
+        remaining = self._remaining_time()
+        if remaining is None:
+            return await node.run_async(shared)
+        try:
+            return await asyncio.wait_for(node.run_async(shared), max(remaining, 0))
+        except asyncio.TimeoutError:
+            if self._remaining_time() > 0:
+                raise  # Timeout propre au node
+            raise self._deadline_exceeded() from None
+    
+    async def run_async(self, shared: Dict, start: Optional[Node] = None) -> Dict:
         """Exécute le flow de manière asynchrone"""
-        current = self.start
+        current = start or self.start
+        token = self._observe_attempts()
+        self._reset_counters()
         
-        while current is not None:
-            if isinstance(current, AsyncNode):
-                action = await current.run_async(shared)
-            else:
-                action = current.run(shared)
-            current = current.successors.get(action)
+        try:
+            while current is not None:
+                self.steps += 1
+                self._emit("node_started", current)
+                started = time.perf_counter()
+                try:
+                    with self._step(current):
+                        if isinstance(current, AsyncNode):
+                            action = await self._run_async_node(current, shared)
+                        else:
+                            # Node synchrone: exécuté dans un thread pour ne pas bloquer la
+                            # boucle, et attendu jusqu'au bout (deadline vérifiée ensuite)
+                            action = await asyncio.to_thread(current.run, shared)
+                except Exception as e:
+                    self._fail_step(current, e, started)
+                    raise
+                current = self._finish_step(current, action, started)
+                saved = self._save_checkpoint(current, shared)
+                if inspect.isawaitable(saved):
+                    await saved
+        finally:
+            if token is not None:
+                attempt_observer.reset(token)
         
         return shared
 
@@ -153,5 +1404,23 @@ __all__ = [
     "AsyncNode", 
     "BatchNode",
     "AsyncParallelBatchNode",
+    "ItemResult",
+    "StreamingBatchNode",
+    "BatchSink",
+    "CallbackSink",
+    "SharedListSink",
+    "JSONLinesSink",
+    "BatchCheckpoint",
+    "FileBatchCheckpoint",
+    "FanOut",
     "Flow",
+    "FlowLimits",
+    "BudgetExceeded",
+    "RetryPolicy",
+    "is_transient_error",
+    "attempt_observer",
+    "VersionedState",
+    "fork_shared",
+    "branch_writes",
+    "merge_writes",
 ]
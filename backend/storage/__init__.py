@@ -0,0 +1,50 @@
+"""
+Stockage persistant pour Nümtema Agents Studio
+
+- ExecutionRepository: dépôt des exécutions (SQLite ou SQLAlchemy async)
+- IndexedStore: stockage en mémoire avec index secondaires et pagination keyset
+- CheckpointStore: checkpoints d'exécution pour la reprise (fichiers ou SQLite)
+- SQLiteHistoryStore: historiques d'agents déversés sur disque (paginables)
+"""
+
+from .executions import (
+    ExecutionRepository,
+    SQLiteExecutionRepository,
+    SQLAlchemyExecutionRepository,
+    create_execution_repository,
+)
+from .checkpoints import (
+    ExecutionCheckpoint,
+    CheckpointStore,
+    FileCheckpointStore,
+    SQLiteCheckpointStore,
+    create_checkpoint_store,
+    snapshot_values,
+)
+from .history import (
+    SQLiteHistoryStore,
+    get_history_store,
+)
+from .pagination import (
+    IndexedStore,
+    encode_cursor,
+    decode_cursor,
+)
+
+__all__ = [
+    "ExecutionRepository",
+    "SQLiteExecutionRepository",
+    "SQLAlchemyExecutionRepository",
+    "create_execution_repository",
+    "ExecutionCheckpoint",
+    "CheckpointStore",
+    "FileCheckpointStore",
+    "SQLiteCheckpointStore",
+    "create_checkpoint_store",
+    "snapshot_values",
+    "SQLiteHistoryStore",
+    "get_history_store",
+    "IndexedStore",
+    "encode_cursor",
+    "decode_cursor",
+]
@@ -0,0 +1,334 @@
+"""
+Checkpoints d'exécution
+
+Après chaque node, le moteur enregistre l'état partagé (`shared`) et la
+position dans le workflow. Une exécution interrompue (crash, redéploiement)
+peut ainsi reprendre sans rejouer les étapes déjà payées:
+- FileCheckpointStore: un fichier JSON par exécution (écriture atomique)
+- SQLiteCheckpointStore: table sqlite3 (fichier en mode WAL, ou ":memory:")
+
+L'état partagé est sérialisé en JSON. Les dates, ensembles et modèles
+pydantic (ex: sortie YAML `published: 2024-05-01`) sont encodés sous une
+forme étiquetée, restaurée à la lecture; toute autre valeur non
+sérialisable rend le checkpoint impossible (ValueError) plutôt que d'être
+enregistrée sous une forme qui ne pourrait pas être reprise.
+
+Un checkpoint `partial` ne contient que les clés écrites (et supprimées)
+depuis le précédent: SQLite ne réécrit que ces clés, le store fichier les
+applique à l'état complet.
+"""
+
+import importlib
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+# Clé des valeurs encodées (type non JSON restauré à la lecture)
+_TYPE_KEY = "__checkpoint_type__"
+
+
+def _encode(value: Any) -> Dict[str, Any]:
+    """`default` de json.dumps: types de l'état partagé sans équivalent JSON"""
+    if isinstance(value, datetime):
+        return {_TYPE_KEY: "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {_TYPE_KEY: "date", "value": value.isoformat()}
+    if isinstance(value, (set, frozenset)):
+        return {_TYPE_KEY: "set", "items": list(value)}
+    if isinstance(value, BaseModel):
+        model = type(value)
+        return {
+            _TYPE_KEY: "model",
+            "class": f"{model.__module__}:{model.__qualname__}",
+            "value": value.model_dump(mode="json"),
+        }
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode(data: Dict[str, Any]) -> Any:
+    """`object_hook` de json.loads, inverse de `_encode`"""
+    kind = data.get(_TYPE_KEY)
+    if kind is None:
+        return data
+    if kind == "datetime":
+        return datetime.fromisoformat(data["value"])
+    if kind == "date":
+        return date.fromisoformat(data["value"])
+    if kind == "set":
+        return set(data["items"])
+    if kind == "model":
+        module, _, qualname = data["class"].partition(":")
+        try:
+            model = importlib.import_module(module)
+            for name in qualname.split("."):
+                model = getattr(model, name)
+        except (ImportError, AttributeError):
+            return data["value"]  # Classe disparue: valeurs brutes
+        if isinstance(model, type) and issubclass(model, BaseModel):
+            return model.model_validate(data["value"])
+        return data["value"]
+    return data
+
+
+def dump_value(value: Any) -> str:
+    """JSON d'une valeur d'état (types encodés, voir `_encode`)"""
+    return json.dumps(value, default=_encode)
+
+
+def load_value(data: str) -> Any:
+    """Valeur d'état relue depuis `dump_value`"""
+    return json.loads(data, object_hook=_decode)
+
+
+class ExecutionCheckpoint:
+    """Position d'une exécution et état partagé après son dernier node terminé.
+
+    Séquentiel: `node_id` est le prochain node à exécuter. DAG (`parallel`):
+    `completed` liste les nodes terminés. Avec `partial`, `shared` et
+    `deleted` sont les changements depuis le checkpoint précédent.
+    `counters` conserve les compteurs des garde-fous (steps, edges, tokens)
+    pour qu'une reprise ne remette pas les budgets à zéro.
+    """
+
+    __slots__ = (
+        "execution_id", "workflow_id", "node_id", "shared", "completed", "parallel", "step", "updated_at",
+        "partial", "deleted", "counters"
+    )
+
+    def __init__(
+        self,
+        execution_id: str,
+        workflow_id: str,
+        shared: Dict[str, Any],
+        node_id: Optional[str] = None,
+        completed: Optional[List[str]] = None,
+        parallel: bool = False,
+        step: int = 0,
+        updated_at: Optional[str] = None,
+        partial: bool = False,
+        deleted: Optional[List[str]] = None,
+        counters: Optional[Dict[str, Any]] = None
+    ):
+        self.execution_id = execution_id
+        self.workflow_id = workflow_id
+        self.shared = shared
+        self.node_id = node_id
+        self.completed = completed or []
+        self.parallel = parallel
+        self.step = step
+        self.updated_at = updated_at or datetime.utcnow().isoformat()
+        self.partial = partial
+        self.deleted = deleted or []
+        self.counters = counters or {}
+
+    def to_json(self) -> str:
+        return dump_value({slot: getattr(self, slot) for slot in self.__slots__})
+
+    @classmethod
+    def from_json(cls, data: str) -> "ExecutionCheckpoint":
+        return cls(**load_value(data))
+
+
+def snapshot_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Copie JSON (types encodés) de valeurs d'état, indépendante des objets d'origine.
+
+    Lève ValueError en nommant la première clé non sérialisable.
+    """
+    snapshot = {}
+    for key, value in values.items():
+        try:
+            snapshot[key] = json.loads(dump_value(value))
+        except (TypeError, ValueError) as e:
+            raise ValueError(
+                f"Checkpoint impossible: la clé '{key}' de l'état n'est pas sérialisable en JSON ({e})"
+            ) from e
+    return snapshot
+
+
+class CheckpointStore(ABC):
+    """Interface de stockage des checkpoints (appels synchrones et courts)"""
+
+    @abstractmethod
+    def save(self, checkpoint: ExecutionCheckpoint) -> None:
+        """Remplace le checkpoint de l'exécution"""
+
+    @abstractmethod
+    def load(self, execution_id: str) -> Optional[ExecutionCheckpoint]:
+        """Dernier checkpoint de l'exécution"""
+
+    @abstractmethod
+    def delete(self, execution_id: str) -> bool:
+        """Supprime le checkpoint (exécution terminée)"""
+
+
+class FileCheckpointStore(CheckpointStore):
+    """Un fichier `<execution_id>.json` par exécution"""
+
+    def __init__(self, directory: str = "data/checkpoints"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, execution_id: str) -> str:
+        return os.path.join(self.directory, f"{os.path.basename(execution_id)}.json")
+
+    def save(self, checkpoint: ExecutionCheckpoint) -> None:
+        if checkpoint.partial:
+            checkpoint = _apply_changes(self.load(checkpoint.execution_id), checkpoint)
+        path = self._path(checkpoint.execution_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(checkpoint.to_json())
+        os.replace(tmp_path, path)
+
+    def load(self, execution_id: str) -> Optional[ExecutionCheckpoint]:
+        try:
+            with open(self._path(execution_id), encoding="utf-8") as f:
+                return ExecutionCheckpoint.from_json(f.read())
+        except FileNotFoundError:
+            return None
+
+    def delete(self, execution_id: str) -> bool:
+        try:
+            os.remove(self._path(execution_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def _apply_changes(previous: Optional[ExecutionCheckpoint], checkpoint: ExecutionCheckpoint) -> ExecutionCheckpoint:
+    """Checkpoint complet obtenu en appliquant un checkpoint partiel au précédent"""
+    shared = dict(previous.shared) if previous is not None else {}
+    shared.update(checkpoint.shared)
+    for key in checkpoint.deleted:
+        shared.pop(key, None)
+    return ExecutionCheckpoint(
+        checkpoint.execution_id,
+        checkpoint.workflow_id,
+        shared,
+        node_id=checkpoint.node_id,
+        completed=checkpoint.completed,
+        parallel=checkpoint.parallel,
+        step=checkpoint.step,
+        updated_at=checkpoint.updated_at,
+        counters=checkpoint.counters
+    )
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """Checkpoints SQLite: position dans `checkpoints`, état partagé clé par clé
+    dans `checkpoint_values` (un checkpoint partiel ne réécrit que ses clés)"""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS checkpoints ("
+        " execution_id TEXT PRIMARY KEY,"
+        " updated_at TEXT NOT NULL,"
+        " data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS checkpoint_values ("
+        " execution_id TEXT NOT NULL,"
+        " key TEXT NOT NULL,"
+        " value TEXT NOT NULL,"
+        " PRIMARY KEY (execution_id, key))",
+    )
+
+    def __init__(self, path: str = "data/checkpoints.db"):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+
+    def save(self, checkpoint: ExecutionCheckpoint) -> None:
+        execution_id = checkpoint.execution_id
+        values = [
+            (execution_id, key, dump_value(value))
+            for key, value in checkpoint.shared.items()
+        ]
+        position = ExecutionCheckpoint(
+            execution_id,
+            checkpoint.workflow_id,
+            {},
+            node_id=checkpoint.node_id,
+            completed=checkpoint.completed,
+            parallel=checkpoint.parallel,
+            step=checkpoint.step,
+            updated_at=checkpoint.updated_at,
+            counters=checkpoint.counters
+        )
+        with self._lock:
+            if not checkpoint.partial:
+                self._conn.execute("DELETE FROM checkpoint_values WHERE execution_id = ?", (execution_id,))
+            self._conn.executemany(
+                "DELETE FROM checkpoint_values WHERE execution_id = ? AND key = ?",
+                [(execution_id, key) for key in checkpoint.deleted]
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO checkpoint_values (execution_id, key, value) VALUES (?, ?, ?)",
+                values
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (execution_id, updated_at, data) VALUES (?, ?, ?)",
+                (execution_id, checkpoint.updated_at, position.to_json())
+            )
+            self._conn.commit()
+
+    def load(self, execution_id: str) -> Optional[ExecutionCheckpoint]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM checkpoints WHERE execution_id = ?", (execution_id,)
+            ).fetchone()
+            values = self._conn.execute(
+                "SELECT key, value FROM checkpoint_values WHERE execution_id = ?", (execution_id,)
+            ).fetchall()
+        if row is None:
+            return None
+        checkpoint = ExecutionCheckpoint.from_json(row[0])
+        checkpoint.shared.update((key, load_value(value)) for key, value in values)
+        return checkpoint
+
+    def delete(self, execution_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM checkpoints WHERE execution_id = ?", (execution_id,))
+            self._conn.execute("DELETE FROM checkpoint_values WHERE execution_id = ?", (execution_id,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+
+def create_checkpoint_store(url: Optional[str] = None) -> Optional[CheckpointStore]:
+    """Crée le store configuré par EXECUTION_CHECKPOINTS.
+
+    `sqlite:///chemin.db` (défaut: data/checkpoints.db), `sqlite://` pour la
+    mémoire, `file:///répertoire`, ou `none` pour désactiver les checkpoints.
+    """
+    url = url or os.getenv("EXECUTION_CHECKPOINTS", "sqlite:///data/checkpoints.db")
+    if url == "none":
+        return None
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        return SQLiteCheckpointStore(":memory:")
+    if url.startswith("sqlite:///"):
+        return SQLiteCheckpointStore(url[len("sqlite:///"):])
+    if url.startswith("file://"):
+        return FileCheckpointStore(url[len("file://"):])
+    raise ValueError(f"Store de checkpoints inconnu: {url}")
+
+
+__all__ = [
+    "ExecutionCheckpoint",
+    "CheckpointStore",
+    "FileCheckpointStore",
+    "SQLiteCheckpointStore",
+    "create_checkpoint_store",
+    "snapshot_values",
+]
@@ -0,0 +1,363 @@
+"""
+Dépôt des exécutions
+
+Persistance des `Execution` avec filtrage en base (index sur workflow_id,
+status et started_at):
+- SQLiteExecutionRepository: sqlite3 standard, pour le local et les tests
+- SQLAlchemyExecutionRepository: SQLAlchemy async (PostgreSQL/asyncpg)
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from models import Execution, ExecutionStatus
+from .pagination import encode_cursor, decode_cursor
+
+
+def _serialize(execution: Execution) -> str:
+    return json.dumps(execution.model_dump(mode="python"), default=str)
+
+
+def _deserialize(data: str) -> Execution:
+    return Execution.model_validate(json.loads(data))
+
+
+def _status(status: Optional[ExecutionStatus]) -> Optional[str]:
+    return status.value if isinstance(status, ExecutionStatus) else status
+
+
+class ExecutionRepository(ABC):
+    """Interface de stockage des exécutions"""
+
+    @abstractmethod
+    async def save(self, execution: Execution) -> None:
+        """Crée ou met à jour une exécution"""
+
+    @abstractmethod
+    async def get(self, execution_id: str) -> Optional[Execution]:
+        """Récupère une exécution par son ID"""
+
+    @abstractmethod
+    async def list(
+        self,
+        workflow_id: Optional[str] = None,
+        status: Optional[ExecutionStatus] = None,
+        limit: int = 100,
+        after: Optional[Sequence[str]] = None
+    ) -> List[Execution]:
+        """Liste les exécutions (ordre de démarrage), filtrées en base.
+
+        `after` = (started_at ISO, id): ne retourne que les exécutions
+        situées après cette position (pagination keyset).
+        """
+    
+    @abstractmethod
+    async def latest(
+        self,
+        workflow_id: Optional[str] = None,
+        status: Optional[ExecutionStatus] = None,
+        limit: int = 100
+    ) -> List[Execution]:
+        """Les `limit` exécutions les plus récentes (la plus récente d'abord)"""
+    
+    async def list_page(
+        self,
+        workflow_id: Optional[str] = None,
+        status: Optional[ExecutionStatus] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Execution], Optional[str]]:
+        """Retourne une page d'exécutions et le curseur de la suivante"""
+        if limit < 1:
+            raise ValueError("limit doit être >= 1")
+        after = decode_cursor(cursor, str, str) if cursor else None
+        if after is not None:
+            try:
+                datetime.fromisoformat(after[0])
+            except ValueError as e:
+                raise ValueError(f"Curseur invalide: {cursor}") from e
+        executions = await self.list(workflow_id, status, limit + 1, after=after)
+        if len(executions) <= limit:
+            return executions, None
+        executions = executions[:limit]
+        last = executions[-1]
+        return executions, encode_cursor(last.started_at.isoformat(), str(last.id))
+
+    @abstractmethod
+    async def delete(self, execution_id: str) -> bool:
+        """Supprime une exécution"""
+
+
+class SQLiteExecutionRepository(ExecutionRepository):
+    """Dépôt SQLite (fichier en mode WAL, ou ":memory:")"""
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS executions ("
+        " id TEXT PRIMARY KEY,"
+        " workflow_id TEXT NOT NULL,"
+        " status TEXT NOT NULL,"
+        " started_at TEXT NOT NULL,"
+        " completed_at TEXT,"
+        " data TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_executions_workflow_id ON executions (workflow_id, started_at)",
+        "CREATE INDEX IF NOT EXISTS idx_executions_status ON executions (status, started_at)",
+        "CREATE INDEX IF NOT EXISTS idx_executions_started_at ON executions (started_at)",
+    ]
+
+    def __init__(self, path: str = "data/executions.db"):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+
+    def _save(self, execution: Execution) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO executions"
+                " (id, workflow_id, status, started_at, completed_at, data)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    str(execution.id),
+                    str(execution.workflow_id),
+                    _status(execution.status),
+                    execution.started_at.isoformat(),
+                    execution.completed_at.isoformat() if execution.completed_at else None,
+                    _serialize(execution),
+                )
+            )
+            self._conn.commit()
+
+    def _get(self, execution_id: str) -> Optional[Execution]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM executions WHERE id = ?", (execution_id,)
+            ).fetchone()
+        return _deserialize(row[0]) if row else None
+
+    def _list(
+        self,
+        workflow_id: Optional[str],
+        status: Optional[ExecutionStatus],
+        limit: int,
+        after: Optional[Sequence[str]],
+        newest_first: bool = False
+    ) -> List[Execution]:
+        clauses, params = [], []
+        if after:
+            clauses.append("(started_at > ? OR (started_at = ? AND id > ?))")
+            params.extend([after[0], after[0], after[1]])
+        if workflow_id:
+            clauses.append("workflow_id = ?")
+            params.append(workflow_id)
+        if status:
+            clauses.append("status = ?")
+            params.append(_status(status))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "started_at DESC, id DESC" if newest_first else "started_at, id"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM executions{where} ORDER BY {order} LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [_deserialize(row[0]) for row in rows]
+
+    def _delete(self, execution_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM executions WHERE id = ?", (execution_id,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    async def save(self, execution: Execution) -> None:
+        await asyncio.to_thread(self._save, execution)
+
+    async def get(self, execution_id: str) -> Optional[Execution]:
+        return await asyncio.to_thread(self._get, execution_id)
+
+    async def list(
+        self,
+        workflow_id: Optional[str] = None,
+        status: Optional[ExecutionStatus] = None,
+        limit: int = 100,
+        after: Optional[Sequence[str]] = None
+    ) -> List[Execution]:
+        return await asyncio.to_thread(self._list, workflow_id, status, limit, after)
+
+    async def latest(
+        self,
+        workflow_id: Optional[str] = None,
+        status: Optional[ExecutionStatus] = None,
+        limit: int = 100
+    ) -> List[Execution]:
+        return await asyncio.to_thread(self._list, workflow_id, status, limit, None, True)
+
+    async def delete(self, execution_id: str) -> bool:
+        return await asyncio.to_thread(self._delete, execution_id)
+
+
+class SQLAlchemyExecutionRepository(ExecutionRepository):
+    """Dépôt SQLAlchemy async (ex: postgresql+asyncpg://...)"""
+
+    def __init__(self, url: str, pool_size: int = 10):
+        import sqlalchemy as sa
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        self._sa = sa
+        engine_kwargs = {"pool_pre_ping": True}
+        if not url.startswith("sqlite"):
+            engine_kwargs["pool_size"] = pool_size
+        self.engine = create_async_engine(url, **engine_kwargs)
+        self.metadata = sa.MetaData()
+        self.table = sa.Table(
+            "executions",
+            self.metadata,
+            sa.Column("id", sa.String(36), primary_key=True),
+            sa.Column("workflow_id", sa.String(36), nullable=False),
+            sa.Column("status", sa.String(16), nullable=False),
+            sa.Column("started_at", sa.DateTime, nullable=False),
+            sa.Column("completed_at", sa.DateTime, nullable=True),
+            sa.Column("data", sa.Text, nullable=False),
+            sa.Index("idx_executions_workflow_id", "workflow_id", "started_at"),
+            sa.Index("idx_executions_status", "status", "started_at"),
+            sa.Index("idx_executions_started_at", "started_at"),
+        )
+        self._schema_ready = False
+        self._schema_lock = asyncio.Lock()
+
+    async def _ensure_schema(self) -> None:
+        if self._schema_ready:
+            return
+        async with self._schema_lock:
+            if not self._schema_ready:
+                async with self.engine.begin() as conn:
+                    await conn.run_sync(self.metadata.create_all)
+                self._schema_ready = True
+
+    async def save(self, execution: Execution) -> None:
+        await self._ensure_schema()
+        values = {
+            "workflow_id": str(execution.workflow_id),
+            "status": _status(execution.status),
+            "started_at": execution.started_at,
+            "completed_at": execution.completed_at,
+            "data": _serialize(execution),
+        }
+        async with self.engine.begin() as conn:
+            await conn.execute(self._upsert(str(execution.id), values))
+
+    def _upsert(self, execution_id: str, values: dict):
+        """INSERT ... ON CONFLICT UPDATE atomique (API et workers écrivent la même ligne)"""
+        dialect = self.engine.dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect in ("mysql", "mariadb"):
+            from sqlalchemy.dialects.mysql import insert
+            return insert(self.table).values(id=execution_id, **values).on_duplicate_key_update(**values)
+        else:
+            raise ValueError(f"Upsert non supporté pour le dialecte {dialect}")
+        return insert(self.table).values(id=execution_id, **values).on_conflict_do_update(
+            index_elements=[self.table.c.id], set_=values
+        )
+
+    async def get(self, execution_id: str) -> Optional[Execution]:
+        await self._ensure_schema()
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(
+                self._sa.select(self.table.c.data).where(self.table.c.id == execution_id)
+            )).first()
+        return _deserialize(row[0]) if row else None
+
+    def _filtered(self, workflow_id: Optional[str], status: Optional[ExecutionStatus]):
+        query = self._sa.select(self.table.c.data)
+        if workflow_id:
+            query = query.where(self.table.c.workflow_id == workflow_id)
+        if status:
+            query = query.where(self.table.c.status == _status(status))
+        return query
+
+    async def _fetch(self, query) -> List[Execution]:
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(query)).all()
+        return [_deserialize(row[0]) for row in rows]
+
+    async def list(
+        self,
+        workflow_id: Optional[str] = None,
+        status: Optional[ExecutionStatus] = None,
+        limit: int = 100,
+        after: Optional[Sequence[str]] = None
+    ) -> List[Execution]:
+        await self._ensure_schema()
+        query = self._filtered(workflow_id, status)
+        if after:
+            started_at = datetime.fromisoformat(after[0])
+            query = query.where(self._sa.or_(
+                self.table.c.started_at > started_at,
+                self._sa.and_(
+                    self.table.c.started_at == started_at,
+                    self.table.c.id > after[1]
+                )
+            ))
+        query = query.order_by(self.table.c.started_at, self.table.c.id).limit(limit)
+        return await self._fetch(query)
+
+    async def latest(
+        self,
+        workflow_id: Optional[str] = None,
+        status: Optional[ExecutionStatus] = None,
+        limit: int = 100
+    ) -> List[Execution]:
+        await self._ensure_schema()
+        query = self._filtered(workflow_id, status).order_by(
+            self.table.c.started_at.desc(), self.table.c.id.desc()
+        ).limit(limit)
+        return await self._fetch(query)
+
+    async def delete(self, execution_id: str) -> bool:
+        await self._ensure_schema()
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                self.table.delete().where(self.table.c.id == execution_id)
+            )
+        return result.rowcount > 0
+
+
+def create_execution_repository(url: Optional[str] = None) -> ExecutionRepository:
+    """Crée le dépôt configuré par EXECUTIONS_DATABASE_URL ou DATABASE_URL.
+
+    `sqlite:///chemin.db` (ou `sqlite://` pour la mémoire) utilise sqlite3;
+    toute autre URL (ex: postgresql+asyncpg://...) passe par SQLAlchemy async.
+    """
+    url = (
+        url
+        or os.getenv("EXECUTIONS_DATABASE_URL")
+        or os.getenv("DATABASE_URL")
+        or "sqlite:///data/executions.db"
+    )
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        return SQLiteExecutionRepository(":memory:")
+    if url.startswith("sqlite:///"):
+        return SQLiteExecutionRepository(url[len("sqlite:///"):])
+    return SQLAlchemyExecutionRepository(url)
+
+
+__all__ = [
+    "ExecutionRepository",
+    "SQLiteExecutionRepository",
+    "SQLAlchemyExecutionRepository",
+    "create_execution_repository",
+]
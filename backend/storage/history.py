@@ -0,0 +1,135 @@
+"""
+Historiques déversés sur disque
+
+Les éléments anciens des historiques d'agents (voir agents.history.SpillToDisk)
+sont déplacés dans une table SQLite indexée par (flux, séquence): la
+mémoire et les prompts ne gardent que les derniers éléments, et l'API
+pagine l'historique complet par curseur.
+
+Un flux est nommé `<execution_id>/<clé>` (ex: `.../research_history`).
+Les flux plus anciens que HISTORY_SPILL_TTL (secondes, 0: jamais) sont
+supprimés à l'ouverture du store partagé.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+
+HISTORY_SPILL_TTL = int(os.getenv("HISTORY_SPILL_TTL", str(7 * 86400)))
+
+
+class SQLiteHistoryStore:
+    """Éléments d'historique numérotés par flux (séquence croissante à partir de 1).
+
+    Un élément ajouté avec un `item_id` déjà présent dans le flux est ignoré.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS history ("
+        " stream TEXT NOT NULL,"
+        " seq INTEGER NOT NULL,"
+        " item_id TEXT,"
+        " data TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " PRIMARY KEY (stream, seq),"
+        " UNIQUE (stream, item_id))"
+    )
+
+    def __init__(self, path: str = "data/history.db"):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(self.SCHEMA)
+            self._conn.commit()
+
+    def append(self, stream: str, items: List[Any], item_ids: Optional[List[str]] = None) -> int:
+        """Ajoute des éléments en fin de flux; retourne la séquence du dernier"""
+        item_ids = item_ids or [None] * len(items)
+        now = time.time()
+        with self._lock:
+            last = self._count(stream)
+            for item, item_id in zip(items, item_ids):
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO history (stream, seq, item_id, data, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (stream, last + 1, item_id, json.dumps(item, default=str), now)
+                )
+                last += cursor.rowcount
+            self._conn.commit()
+        return last
+
+    def _count(self, stream: str) -> int:
+        row = self._conn.execute("SELECT MAX(seq) FROM history WHERE stream = ?", (stream,)).fetchone()
+        return row[0] or 0
+
+    def count(self, stream: str) -> int:
+        """Nombre d'éléments déversés dans le flux"""
+        with self._lock:
+            return self._count(stream)
+
+    def page(self, stream: str, after: int = 0, limit: int = 100) -> List[Tuple[int, Any]]:
+        """(séquence, élément) situés après `after`, dans l'ordre"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, data FROM history WHERE stream = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (stream, after, limit)
+            ).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    def delete(self, stream: str) -> int:
+        """Supprime un flux; retourne le nombre d'éléments supprimés"""
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM history WHERE stream = ?", (stream,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def delete_execution(self, execution_id: str) -> int:
+        """Supprime les flux d'une exécution (`<execution_id>/...`)"""
+        prefix = f"{execution_id}/"
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM history WHERE substr(stream, 1, ?) = ?", (len(prefix), prefix)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def purge(self, max_age: float) -> int:
+        """Supprime les flux dont le dernier ajout date de plus de `max_age` secondes"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM history WHERE stream IN ("
+                " SELECT stream FROM history GROUP BY stream HAVING MAX(created_at) < ?)",
+                (time.time() - max_age,)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+
+_history_store: Optional[SQLiteHistoryStore] = None
+_history_store_lock = threading.Lock()
+
+
+def get_history_store() -> SQLiteHistoryStore:
+    """Store partagé (HISTORY_SPILL_PATH, défaut data/history.db), créé au premier usage"""
+    global _history_store
+    with _history_store_lock:
+        if _history_store is None:
+            _history_store = SQLiteHistoryStore(os.getenv("HISTORY_SPILL_PATH", "data/history.db"))
+            if HISTORY_SPILL_TTL > 0:
+                _history_store.purge(HISTORY_SPILL_TTL)
+        return _history_store
+
+
+__all__ = [
+    "SQLiteHistoryStore",
+    "get_history_store",
+]
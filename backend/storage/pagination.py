@@ -0,0 +1,221 @@
+"""
+Pagination par curseur (keyset) et index secondaires en mémoire
+
+- encode_cursor / decode_cursor: curseurs opaques (base64 URL-safe)
+- IndexedStore: dictionnaire ordonné par insertion avec index secondaires
+  (ex: tag → ids) et pagination keyset en O(log n + limit)
+"""
+
+import base64
+import json
+from bisect import bisect_left, bisect_right
+from typing import (
+    Any, Callable, Dict, Generic, Iterable, Iterator, List,
+    Optional, Tuple, TypeVar,
+)
+
+T = TypeVar("T")
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode une position de pagination en curseur opaque"""
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: type) -> List[Any]:
+    """Décode un curseur; lève ValueError s'il est invalide.
+
+    Avec `types`, le curseur doit contenir exactement une valeur de chaque
+    type (dans l'ordre): un curseur forgé ne peut pas atteindre les
+    requêtes avec des valeurs d'un autre type.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Curseur invalide: {cursor}") from e
+    if not isinstance(values, list):
+        raise ValueError(f"Curseur invalide: {cursor}")
+    if types and (
+        len(values) != len(types)
+        or not all(
+            isinstance(value, expected) and not (expected is int and isinstance(value, bool))
+            for value, expected in zip(values, types)
+        )
+    ):
+        raise ValueError(f"Curseur invalide: {cursor}")
+    return values
+
+
+class IndexedStore(Generic[T]):
+    """Dictionnaire id → item avec index secondaires et pagination keyset.
+
+    Chaque item reçoit un numéro de séquence à sa première insertion; les
+    index (nom → fonction retournant les clés d'un item) maintiennent pour
+    chaque clé la liste triée des séquences correspondantes. Un item
+    modifié sur place doit être ré-indexé via `reindex(id)` (ou réassigné).
+    """
+
+    def __init__(self, indexes: Optional[Dict[str, Callable[[T], Iterable[Any]]]] = None):
+        self._indexes = indexes or {}
+        self._items: Dict[str, T] = {}
+        self._seq: Dict[str, int] = {}
+        self._ids: Dict[int, str] = {}
+        self._order: List[int] = []
+        self._keys: Dict[str, Dict[str, Tuple[Any, ...]]] = {name: {} for name in self._indexes}
+        self._postings: Dict[str, Dict[Any, List[int]]] = {name: {} for name in self._indexes}
+        self._next_seq = 0
+
+    # -- Interface dict --------------------------------------------------------
+
+    def __setitem__(self, item_id: str, item: T) -> None:
+        if item_id not in self._seq:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seq[item_id] = seq
+            self._ids[seq] = item_id
+            self._order.append(seq)
+        self._items[item_id] = item
+        self.reindex(item_id)
+
+    def __getitem__(self, item_id: str) -> T:
+        return self._items[item_id]
+
+    def __delitem__(self, item_id: str) -> None:
+        self.pop(item_id)
+
+    def __contains__(self, item_id: object) -> bool:
+        return item_id in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._ids[seq] for seq in self._order)
+
+    def get(self, item_id: str, default: Optional[T] = None) -> Optional[T]:
+        return self._items.get(item_id, default)
+
+    def pop(self, item_id: str, *default: Any) -> T:
+        if item_id not in self._items:
+            if default:
+                return default[0]
+            raise KeyError(item_id)
+        seq = self._seq.pop(item_id)
+        for name in self._indexes:
+            for key in self._keys[name].pop(item_id, ()):
+                self._discard(name, key, seq)
+        _remove_sorted(self._order, seq)
+        del self._ids[seq]
+        return self._items.pop(item_id)
+
+    def values(self) -> List[T]:
+        return [self._items[self._ids[seq]] for seq in self._order]
+
+    def items(self) -> List[Tuple[str, T]]:
+        return [(self._ids[seq], self._items[self._ids[seq]]) for seq in self._order]
+
+    def clear(self) -> None:
+        for item_id in list(self._items):
+            self.pop(item_id)
+
+    # -- Index -----------------------------------------------------------------
+
+    def reindex(self, item_id: str) -> None:
+        """Met à jour les index d'un item (après modification sur place)"""
+        seq = self._seq[item_id]
+        item = self._items[item_id]
+        for name, key_fn in self._indexes.items():
+            old_keys = self._keys[name].get(item_id, ())
+            new_keys = tuple(dict.fromkeys(key_fn(item) or ()))
+            for key in old_keys:
+                if key not in new_keys:
+                    self._discard(name, key, seq)
+            for key in new_keys:
+                if key not in old_keys:
+                    _insert_sorted(self._postings[name].setdefault(key, []), seq)
+            self._keys[name][item_id] = new_keys
+
+    def _discard(self, name: str, key: Any, seq: int) -> None:
+        postings = self._postings[name].get(key)
+        if postings is not None:
+            _remove_sorted(postings, seq)
+            if not postings:
+                del self._postings[name][key]
+
+    def _candidates(self, filters: Dict[str, Any]) -> Tuple[List[int], List[Tuple[str, Any]]]:
+        """Liste de séquences la plus sélective + filtres restant à vérifier"""
+        active = [(name, key) for name, key in filters.items() if key is not None]
+        for name, _ in active:
+            if name not in self._indexes:
+                raise ValueError(f"Index inconnu: {name}")
+        if not active:
+            return self._order, []
+        lists = [(self._postings[name].get(key, []), (name, key)) for name, key in active]
+        lists.sort(key=lambda entry: len(entry[0]))
+        return lists[0][0], [condition for _, condition in lists[1:]]
+
+    def count(self, **filters: Any) -> int:
+        """Nombre d'items correspondant aux filtres (index égalité)"""
+        candidates, remaining = self._candidates(filters)
+        if not remaining:
+            return len(candidates)
+        return sum(1 for seq in candidates if self._matches(seq, remaining))
+
+    def _matches(self, seq: int, conditions: List[Tuple[str, Any]]) -> bool:
+        item_id = self._ids[seq]
+        return all(key in self._keys[name][item_id] for name, key in conditions)
+
+    def page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        **filters: Any
+    ) -> Tuple[List[T], Optional[str]]:
+        """Retourne une page d'items et le curseur de la page suivante.
+
+        Le coût ne dépend pas de la position de la page: la recherche du
+        point de départ est une bissection sur la liste d'index.
+        """
+        if limit < 1:
+            raise ValueError("limit doit être >= 1")
+        candidates, remaining = self._candidates(filters)
+        start = 0
+        if cursor:
+            (after,) = decode_cursor(cursor, int)
+            start = bisect_right(candidates, after)
+
+        page: List[T] = []
+        last_seq = None
+        for position in range(start, len(candidates)):
+            seq = candidates[position]
+            if remaining and not self._matches(seq, remaining):
+                continue
+            if len(page) == limit:
+                return page, encode_cursor(last_seq)
+            page.append(self._items[self._ids[seq]])
+            last_seq = seq
+        return page, None
+
+
+def _insert_sorted(values: List[int], value: int) -> None:
+    if not values or values[-1] < value:
+        values.append(value)  # Cas courant: séquence croissante
+    else:
+        position = bisect_left(values, value)
+        if position == len(values) or values[position] != value:
+            values.insert(position, value)
+
+
+def _remove_sorted(values: List[int], value: int) -> None:
+    position = bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        del values[position]
+
+
+__all__ = [
+    "encode_cursor",
+    "decode_cursor",
+    "IndexedStore",
+]
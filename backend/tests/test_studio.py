@@ -107,6 +107,272 @@ def test_flow_execution():
     assert result["value"] == 3
 
 
+def test_fan_out_runs_branches_concurrently():
+    """Test du fan-out / fan-in asynchrone"""
+    import asyncio
+    import time
+    from pocketflow import AsyncNode, Node, Flow, FanOut
+    
+    class SlowBranch(AsyncNode):
+        def __init__(self, key):
+            super().__init__()
+            self.key = key
+        
+        def exec(self, prep_res):
+            return self.key
+        
+        async def exec_async(self, prep_res):
+            await asyncio.sleep(0.1)
+            return self.key
+        
+        async def post_async(self, shared, prep_res, exec_res):
+            shared[self.key] = exec_res
+            shared.setdefault("log", []).append(exec_res)
+            shared["results"][self.key] = {"topic": shared["topic"], "done": True}
+            return "default"
+    
+    class Split(Node):
+        def exec(self, prep_res):
+            return None
+        
+        def post(self, shared, prep_res, exec_res):
+            shared["topic"] = "llm"
+            shared["results"] = {"existing": {"done": False}}
+            return "default"
+    
+    class Join(Node):
+        def exec(self, prep_res):
+            return None
+        
+        def post(self, shared, prep_res, exec_res):
+            shared["joined"] = sorted(shared["log"])
+            return "default"
+    
+    split = Split()
+    fan_out = split >> [SlowBranch("a"), SlowBranch("b"), SlowBranch("c")]
+    assert isinstance(fan_out, FanOut)
+    fan_out >> Join()
+    
+    started = time.perf_counter()
+    result = asyncio.run(Flow(start=split).run_async({"log": []}))
+    elapsed = time.perf_counter() - started
+    
+    assert elapsed < 0.25
+    assert result["joined"] == ["a", "b", "c"]
+    assert (result["a"], result["b"], result["c"]) == ("a", "b", "c")
+    # Clés distinctes d'un même dict écrites par chaque branche: fusionnées
+    assert result["results"] == {
+        "existing": {"done": False},
+        "a": {"topic": "llm", "done": True},
+        "b": {"topic": "llm", "done": True},
+        "c": {"topic": "llm", "done": True},
+    }
+    
+    # Même sous-clé écrite différemment: signalée comme conflit
+    from pocketflow import merge_writes
+    shared = {"config": {"model": "a", "options": {"t": 0}}}
+    base = {"config": {"model": "a", "options": {"t": 0}}}
+    conflicts = merge_writes(shared, base, [
+        {"config": {"model": "b", "options": {"t": 0}}},
+        {"config": {"model": "c", "options": {"t": 0, "k": 1}}},
+    ])
+    assert conflicts == ["config.model"]
+    assert shared["config"] == {"model": "c", "options": {"t": 0, "k": 1}}
+
+
+def test_fan_out_wait_for_first_branches():
+    """Test du fan-in partiel (wait_for) en mode synchrone"""
+    import time
+    from pocketflow import Node, Flow, FanOut
+    
+    class Branch(Node):
+        def __init__(self, key, delay):
+            super().__init__()
+            self.key = key
+            self.delay = delay
+        
+        def exec(self, prep_res):
+            time.sleep(self.delay)
+            return self.key
+        
+        def post(self, shared, prep_res, exec_res):
+            shared[self.key] = exec_res
+            return "default"
+    
+    fan_out = FanOut([Branch("fast", 0.01), Branch("slow", 0.3)], wait_for=1)
+    result = Flow(start=fan_out).run({})
+    
+    assert result == {"fast": "fast"}
+
+
+def test_flow_listener_events():
+    """Test des événements publiés par Flow"""
+    from pocketflow import Node, Flow
+    
+    class Step(Node):
+        def exec(self, prep_res):
+            return None
+    
+    first, second = Step(), Step()
+    first >> second
+    events = []
+    Flow(start=first, listener=lambda event, node, data: events.append((event, node))).run({})
+    
+    assert [event for event, _ in events] == [
+        "node_started", "node_finished", "transition",
+        "node_started", "node_finished",
+    ]
+    assert events[3][1] is second
+
+
+def test_retry_policy_async_and_permanent_errors():
+    """Test de la politique de retry (jitter, erreurs permanentes, deadline, télémétrie)"""
+    import asyncio
+    from pocketflow import AsyncNode, Flow, RetryPolicy, is_transient_error
+    
+    policy = RetryPolicy(max_retries=5, base_delay=0.01, max_delay=0.02)
+    assert all(0 <= policy.backoff(attempt) <= 0.02 for attempt in range(10))
+    
+    class RateLimited(Exception):
+        status_code = 429
+    
+    class Unauthorized(Exception):
+        status_code = 401
+    
+    assert is_transient_error(RateLimited()) and is_transient_error(TimeoutError())
+    assert not is_transient_error(Unauthorized()) and not is_transient_error(ValueError())
+    
+    class Flaky(AsyncNode):
+        def __init__(self, errors, **kwargs):
+            super().__init__(**kwargs)
+            self.errors = list(errors)
+        
+        def exec(self, prep_res):
+            return None
+        
+        async def exec_async(self, prep_res):
+            if self.errors:
+                raise self.errors.pop(0)
+            return "ok"
+    
+    events = []
+    flaky = Flaky([RateLimited(), TimeoutError()], retry_policy=policy)
+    listener = lambda event, node, data: events.append((event, data))
+    asyncio.run(Flow(start=flaky, listener=listener).run_async({}))
+    
+    assert flaky.cur_retry > 0
+    assert [attempt["retryable"] for attempt in flaky.attempts] == [True, True]
+    assert [event for event, _ in events].count("node_retry") == 2
+    assert events[-1][1]["retries"] == 2
+    
+    # Nouvelle exécution du même node sans échec: compteur remis à zéro
+    asyncio.run(flaky.run_async({}))
+    assert flaky.cur_retry == 0 and flaky.attempts == []
+    
+    # Erreur permanente: pas de nouvel essai
+    permanent = Flaky([Unauthorized(), Unauthorized()], retry_policy=policy)
+    with pytest.raises(Unauthorized):
+        asyncio.run(permanent.run_async({}))
+    assert permanent.cur_retry == 1
+    
+    # Deadline dépassée: abandon
+    slow = Flaky([TimeoutError()] * 3, retry_policy=RetryPolicy(base_delay=10, jitter=False, deadline=1))
+    with pytest.raises(TimeoutError):
+        asyncio.run(slow.run_async({}))
+    assert slow.attempts[0]["retryable"] is False
+    
+    # Branches synchrones d'un FanOut: l'observateur des essais est hérité
+    from pocketflow import FanOut, Node, attempt_observer
+    
+    class FlakySync(Node):
+        def __init__(self):
+            super().__init__(retry_policy=policy)
+            self.failed = False
+        
+        def exec(self, prep_res):
+            if not self.failed:
+                self.failed = True
+                raise TimeoutError()
+            return "ok"
+    
+    observed = []
+    token = attempt_observer.set(lambda node, attempt: observed.append(attempt["attempt"]))
+    try:
+        FanOut([FlakySync(), FlakySync()]).run({})
+    finally:
+        attempt_observer.reset(token)
+    assert observed == [1, 1]
+
+
+def test_streaming_batch_node_resumes_from_checkpoint(tmp_path):
+    """Test du lot en flux: chunks, sinks et reprise après crash"""
+    import asyncio
+    import json
+    from pocketflow import FileBatchCheckpoint, JSONLinesSink, SharedListSink, StreamingBatchNode
+    
+    class Double(StreamingBatchNode):
+        crash_at = None
+        
+        def prep(self, shared):
+            return (i for i in range(shared["size"]))
+        
+        def exec_item(self, item):
+            if item == self.crash_at:
+                raise ValueError("crash")
+            return item * 2
+    
+    checkpoint = FileBatchCheckpoint(str(tmp_path / "position.json"))
+    node = Double(chunk_size=10, sink=SharedListSink("doubled"), checkpoint=checkpoint, max_retries=0)
+    node.crash_at = 17
+    shared = {"size": 25}
+    with pytest.raises(ValueError):
+        node.run(shared)
+    assert checkpoint.load() == 10 and shared["doubled"] == [i * 2 for i in range(10)]
+    
+    node.crash_at = None
+    node.run(shared)
+    assert shared["doubled"] == [i * 2 for i in range(25)]
+    assert checkpoint.load() == 0  # Terminé: checkpoint effacé
+    
+    # Sans checkpoint persistant: un échec ne décale pas l'exécution suivante
+    node = Double(chunk_size=10, sink=SharedListSink("doubled"), max_retries=0)
+    node.crash_at = 17
+    shared = {"size": 25}
+    with pytest.raises(ValueError):
+        node.clone().run(shared)
+    node.crash_at = None
+    shared = {"size": 25}
+    node.run(shared)
+    assert shared["doubled"] == [i * 2 for i in range(25)]
+    
+    # Instance réutilisée: les retries d'une exécution ne sont pas reportés sur la suivante
+    flaky = Double(chunk_size=10, sink=SharedListSink("doubled"), max_retries=2, wait=0)
+    flaky.crash_at = 3
+    with pytest.raises(ValueError):
+        flaky.run({"size": 5})
+    assert flaky.cur_retry > 0
+    flaky.crash_at = None
+    flaky.run({"size": 5})
+    assert flaky.cur_retry == 0 and flaky.attempts == []
+    
+    class AsyncDouble(Double):
+        def prep(self, shared):
+            async def rows():
+                for i in range(shared["size"]):
+                    yield i
+            return rows()
+        
+        def post(self, shared, prep_res, exec_res):
+            shared["summary"] = exec_res
+            return "default"
+    
+    path = tmp_path / "out.jsonl"
+    shared = {"size": 10}
+    asyncio.run(AsyncDouble(chunk_size=4, sink=JSONLinesSink(str(path))).run_async(shared))
+    assert [json.loads(line) for line in path.read_text().splitlines()] == [i * 2 for i in range(10)]
+    assert shared["summary"] == {"processed": 10, "chunks": 3, "resumed_from": 0, "total": 10}
+
+
 # =============================================================================
 # TESTS MODELS
 # =============================================================================
@@ -157,6 +423,467 @@ def test_workflow_definition():
     assert len(workflow.edges) == 1
 
 
+# =============================================================================
+# TESTS LLM / AGENTS
+# =============================================================================
+
+def test_base_llm_client_async_fallback():
+    """Test des versions asynchrones par défaut (délégation à un thread)"""
+    import asyncio
+    import time
+    from utils.llm import BaseLLMClient
+    
+    class EchoClient(BaseLLMClient):
+        def call(self, prompt, model=None, temperature=0.7, max_tokens=4096, system_prompt=None):
+            return prompt.upper()
+        
+        def stream(self, prompt, model=None, temperature=0.7, max_tokens=4096, system_prompt=None):
+            yield from prompt.split()
+    
+    async def scenario():
+        client = EchoClient()
+        text = await client.acall("hello")
+        chunks = [chunk async for chunk in client.astream("a b c")]
+        return text, chunks
+    
+    assert asyncio.run(scenario()) == ("HELLO", ["a", "b", "c"])
+    
+    # File bornée: un consommateur qui abandonne arrête le thread producteur
+    produced = []
+    
+    class LongClient(EchoClient):
+        def stream(self, prompt, model=None, temperature=0.7, max_tokens=4096, system_prompt=None):
+            for i in range(10_000):
+                produced.append(i)
+                yield str(i)
+    
+    async def abandon():
+        stream = LongClient().astream("x")
+        first = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        return first
+    
+    assert asyncio.run(abandon()) == ["0", "1", "2"]
+    time.sleep(0.1)
+    assert len(produced) < 200
+
+
+def test_async_clients_share_one_pool_per_loop():
+    """Test du pool httpx partagé par boucle et de sa fermeture"""
+    import asyncio
+    from utils.llm import BaseLLMClient, shared_async_http_client, close_async_clients
+    
+    class RawClient(BaseLLMClient):
+        def call(self, prompt, **kwargs):
+            return prompt
+        
+        def stream(self, prompt, **kwargs):
+            yield prompt
+    
+    async def scenario():
+        client = RawClient()
+        pool = client._async_client()
+        assert pool is shared_async_http_client() is client._async_client()
+        await close_async_clients()
+        assert pool.is_closed
+        assert shared_async_http_client() is not pool
+        await close_async_clients()
+    
+    asyncio.run(scenario())
+
+
+def test_memory_response_cache_lru_and_ttl():
+    """Test du cache mémoire: éviction LRU en octets et expiration"""
+    import time
+    from utils.cache import MemoryResponseCache, make_cache_key
+    
+    key = make_cache_key("openai", "gpt-4o", None, "hello", 0.7, 4096)
+    assert key != make_cache_key("openai", "gpt-4o", None, "hello", 0.2, 4096)
+    
+    cache = MemoryResponseCache(max_bytes=10)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    assert cache.get("a") == "12345"  # "a" devient le plus récent
+    cache.set("c", "12345")
+    assert cache.get("b") is None
+    assert cache.get("a") == "12345"
+    assert cache.stats()["evictions"] == 1
+    
+    cache.set("ttl", "x", ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("ttl") is None
+    assert cache.stats()["hits"] == 2
+    
+    # Compteurs exacts sous lectures concurrentes
+    from concurrent.futures import ThreadPoolExecutor
+    counted = MemoryResponseCache()
+    counted.set("k", "v")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: counted.get("k" if i % 2 else "missing"), range(4000)))
+    assert (counted.stats()["hits"], counted.stats()["misses"]) == (2000, 2000)
+
+
+def test_sqlite_response_cache_shared(tmp_path):
+    """Test du cache SQLite partagé entre instances"""
+    from utils.cache import SQLiteResponseCache
+    
+    path = str(tmp_path / "cache.db")
+    SQLiteResponseCache(path).set("key", "response")
+    
+    other = SQLiteResponseCache(path)
+    assert other.get("key") == "response"
+    assert other.get("missing") is None
+    assert other.stats()["entries"] == 1
+
+
+def test_llm_client_use_cache(monkeypatch):
+    """Test du cache dans LLMClient.call"""
+    from utils.llm import LLMClient, BaseLLMClient
+    from utils.cache import MemoryResponseCache
+    from models import LLMProvider
+    
+    class CountingClient(BaseLLMClient):
+        default_model = "fake"
+        calls = 0
+        
+        def call(self, prompt, model=None, temperature=0.7, max_tokens=4096, system_prompt=None):
+            CountingClient.calls += 1
+            return f"answer to {prompt}"
+        
+        def stream(self, prompt, model=None, temperature=0.7, max_tokens=4096, system_prompt=None):
+            yield self.call(prompt)
+    
+    monkeypatch.setitem(LLMClient._clients, LLMProvider.OLLAMA, CountingClient())
+    client = LLMClient(LLMProvider.OLLAMA, cache=MemoryResponseCache())
+    
+    assert client.call("q", use_cache=True) == "answer to q"
+    assert client.call("q", use_cache=True) == "answer to q"
+    assert client.call("q", temperature=0.1, use_cache=True) == "answer to q"
+    assert client.call("q") == "answer to q"
+    assert CountingClient.calls == 3
+    assert client.cache.stats()["hits"] == 1
+
+
+def test_rate_limiter_buckets_and_feedback():
+    """Test du limiteur de débit (token buckets, en-têtes, 429)"""
+    import asyncio
+    from types import SimpleNamespace
+    from utils.ratelimit import RateLimiter, RateLimit, parse_rate_limit_headers
+    
+    limiter = RateLimiter({"openai": RateLimit(rpm=60, tpm=600)})
+    assert limiter._reserve("openai", "gpt-4o", 500) == 0
+    wait = limiter._reserve("openai", "gpt-4o", 200)  # 100 restants, 10 tokens/s
+    assert 9 < wait <= 10
+    
+    # Consommation réelle inférieure à la réservation: tokens rendus
+    limiter.observe("openai", "gpt-4o", reserved_tokens=500, used_tokens=100)
+    assert limiter._reserve("openai", "gpt-4o", 200) == 0
+    
+    # Limites apprises des en-têtes
+    info = parse_rate_limit_headers({
+        "x-ratelimit-limit-requests": "30",
+        "x-ratelimit-reset-tokens": "6m0s",
+        "anthropic-ratelimit-tokens-remaining": "10",
+    })
+    assert info["requests_limit"] == 30 and info["tokens_reset"] == 360
+    limiter.observe("openai", "gpt-4o", headers={"x-ratelimit-limit-requests": "30"})
+    assert limiter.limits("openai", "gpt-4o").rpm == 30
+    
+    # 429: appels suspendus jusqu'au Retry-After
+    class RateLimited(Exception):
+        status_code = 429
+        response = SimpleNamespace(headers={"retry-after": "0.05"})
+    
+    limiter.observe_error("anthropic", "claude", RateLimited())
+    assert limiter._reserve("anthropic", "claude", 0) > 0
+    assert asyncio.run(limiter.aacquire("anthropic", "claude")) > 0
+    
+    # Remboursement et `remaining` ensemble: une seule correction
+    synced = RateLimiter({"openai": RateLimit(tpm=1000)})
+    synced._reserve("openai", "m", 500)  # niveau 500
+    synced.observe("openai", "m", reserved_tokens=500, used_tokens=800,
+                   headers={"x-ratelimit-remaining-tokens": "300"})
+    assert synced._buckets[("openai", "m")]["tokens"].level == 200  # 500 - 300 de dépassement
+    synced.observe("openai", "m", reserved_tokens=100, used_tokens=50,
+                   headers={"x-ratelimit-remaining-tokens": "900"})
+    assert synced._buckets[("openai", "m")]["tokens"].level == pytest.approx(250, abs=1)
+    
+    # Les streams débitent la sortie produite après coup
+    from utils.llm import LLMClient, BaseLLMClient
+    from models import LLMProvider
+    
+    class Streamer(BaseLLMClient):
+        def call(self, prompt, **kwargs):
+            return prompt
+        
+        def stream(self, prompt, model=None, temperature=0.7, max_tokens=4096, system_prompt=None):
+            yield "x" * 400  # ~100 tokens
+    
+    streamed = RateLimiter({"openai": RateLimit(tpm=1000)})
+    client = LLMClient(LLMProvider.OPENAI, limiter=streamed)
+    previous = LLMClient._clients.get(LLMProvider.OPENAI)
+    LLMClient._clients[LLMProvider.OPENAI] = Streamer()
+    try:
+        assert "".join(client.stream("abcd", model="m")) == "x" * 400
+    finally:
+        if previous is None:
+            LLMClient._clients.pop(LLMProvider.OPENAI, None)
+        else:
+            LLMClient._clients[LLMProvider.OPENAI] = previous
+    assert streamed._buckets[("openai", "m")]["tokens"].level == pytest.approx(899, abs=1)
+
+
+def test_agent_exec_async(monkeypatch):
+    """Test du chemin asynchrone natif des agents"""
+    import asyncio
+    import agents
+    
+    async def fake_acall_llm(prompt, **kwargs):
+        return "```yaml\ntopic: test\nconfidence: high\n```"
+    
+    monkeypatch.setattr(agents, "acall_llm", fake_acall_llm)
+    
+    agent = agents.ResearchAgent()
+    shared = {"query": "test"}
+    action = asyncio.run(agent.run_async(shared))
+    
+    assert action == "write"
+    assert shared["latest_research"]["topic"] == "test"
+
+
+def test_agent_streaming_partial_output(monkeypatch):
+    """Test du mode stream: tokens et sortie partielle publiés pendant la génération"""
+    import asyncio
+    import agents
+    from agents.parsing import IncrementalParser
+    from utils.events import event_sink
+
+    chunks = ["```yaml\ntitle: Le", " titre\nsections:\n  - intro", "\n  - suite\n", "summary: fin\n```"]
+
+    calls = []
+
+    async def fake_astream_llm(prompt, **kwargs):
+        calls.append(kwargs)
+        for chunk in chunks:
+            yield chunk
+
+    monkeypatch.setattr(agents, "astream_llm", fake_astream_llm)
+
+    events = []
+    agent = agents.WriterAgent(config_overrides={"stream": True})
+    shared = {"latest_research": {"topic": "test"}}
+    token = event_sink.set(lambda event_type, **data: events.append((event_type, data)))
+    try:
+        asyncio.run(agent.run_async(shared))
+    finally:
+        event_sink.reset(token)
+
+    assert [data["text"] for event, data in events if event == "token"] == chunks
+    partials = [data["output"] for event, data in events if event == "partial_output"]
+    assert partials[0] == {"title": "Le titre", "sections": None}
+    assert partials[-1]["summary"] == "fin"
+    assert shared["draft"]["sections"] == ["intro", "suite"]
+    assert calls[0]["temperature"] == agent.config.temperature
+
+    # Le relais asynchrone par défaut transmet les paramètres au stream synchrone
+    from utils.llm import BaseLLMClient
+
+    class Provider(BaseLLMClient):
+        def call(self, prompt, **kwargs):
+            return ""
+
+        def stream(self, prompt, model=None, temperature=0.7, max_tokens=4096, system_prompt=None):
+            yield f"{temperature}/{max_tokens}"
+
+    async def collect():
+        return [chunk async for chunk in Provider().astream("p", temperature=0.1, max_tokens=12)]
+
+    assert asyncio.run(collect()) == ["0.1/12"]
+
+    parser = IncrementalParser("json")
+    outputs = [parser.feed(chunk) for chunk in ['{"a": 1, "b": [1', ', 2], "c"', ': "x"}']]
+    assert outputs == [{"a": 1, "b": []}, {"a": 1, "b": [1, 2]}, {"a": 1, "b": [1, 2], "c": "x"}]
+
+
+def test_parallel_batch_node_ordered_partial_failures():
+    """Test des lots asynchrones: ordre, mémoire bornée, retry par item, échecs partiels"""
+    import asyncio
+    from pocketflow import AsyncParallelBatchNode, ItemResult, RetryPolicy
+    
+    class RateLimited(Exception):
+        status_code = 429
+    
+    class Process(AsyncParallelBatchNode):
+        def exec(self, items):
+            return None
+        
+        async def exec_item_async(self, item):
+            self.peak = max(self.peak, item - self.yielded)
+            if item % 7 == 3 and item not in self.failed_once:
+                self.failed_once.add(item)
+                raise RateLimited()
+            if item == 5:
+                raise ValueError("invalid")
+            await asyncio.sleep(0.001 * (item % 3))
+            return item * 2
+    
+    node = Process(
+        max_concurrency=4,
+        item_retry_policy=RetryPolicy(max_retries=2, base_delay=0.001),
+        return_exceptions=True
+    )
+    node.yielded, node.peak, node.failed_once = 0, 0, set()
+    
+    async def consume():
+        indexes = []
+        async for result in node.iter_results(iter(range(2000))):
+            node.yielded += 1
+            indexes.append(result.index)
+        return indexes
+    
+    assert asyncio.run(consume()) == list(range(2000))
+    assert node.peak < 8  # fenêtre = 2 x max_concurrency
+    
+    node.failed_once = set()
+    results = asyncio.run(node._exec_with_retry_async(range(8)))
+    assert all(isinstance(result, ItemResult) for result in results)
+    assert [result.value for result in results if result.ok] == [0, 2, 4, 6, 8, 12, 14]
+    assert results[3].attempts == 2  # 429 retenté
+    assert isinstance(results[5].error, ValueError) and results[5].attempts == 1
+    assert sorted((a["item"], a["retryable"]) for a in node.attempts) == [(3, True), (5, False)]
+    
+    # Avec un sink, les résultats ne sont pas rassemblés; les retries sont publiés
+    from pocketflow import CallbackSink, attempt_observer
+    
+    retries, written = [], []
+    node.sink = CallbackSink(written.extend)
+    node.failed_once = set()
+    token = attempt_observer.set(lambda failed, attempt: retries.append(attempt["item"]))
+    try:
+        summary = asyncio.run(node.exec_async(range(8)))
+    finally:
+        attempt_observer.reset(token)
+    node.sink = None
+    assert summary == {"processed": 8, "failed": 1}
+    assert [result.index for result in written] == list(range(8))
+    assert sorted(retries) == [3, 5]
+    
+    node.return_exceptions = False
+    with pytest.raises(ValueError):
+        asyncio.run(node._exec_with_retry_async([5]))
+
+
+def test_micro_batcher_and_bounded_parallel_batch(monkeypatch):
+    """Test du micro-batching LLM et du traitement parallèle borné"""
+    import asyncio
+    import agents
+    from models import LLMProvider
+    from pocketflow import AsyncParallelBatchNode
+    from utils import batching
+    from utils.batching import LLMBatcher, LocalBatchBackend
+
+    def responder(request):
+        if "boom" in request.prompt:
+            raise ValueError("boom")
+        return "```yaml\ntopic: ok\n```"
+
+    backend = LocalBatchBackend(responder)
+    monkeypatch.setitem(batching.llm_batchers, LLMProvider.OPENAI, LLMBatcher(backend, max_batch_size=4, max_linger=0.01))
+
+    class Classify(AsyncParallelBatchNode):
+        active = peak = 0
+
+        def exec(self, items):
+            return None
+
+        async def exec_item_async(self, query):
+            Classify.active += 1
+            Classify.peak = max(Classify.peak, Classify.active)
+            try:
+                agent = agents.ResearchAgent(config_overrides={"batch": True})
+                shared = {"query": query}
+                try:
+                    await agent.run_async(shared)
+                except ValueError:
+                    return "error"
+                return shared["latest_research"]["topic"]
+            finally:
+                Classify.active -= 1
+
+    node = Classify(max_concurrency=6, max_retries=1)
+    results = asyncio.run(node.exec_async([f"doc {i}" for i in range(9)] + ["boom"]))
+
+    assert results == ["ok"] * 9 + ["error"]
+    assert Classify.peak == 6
+    assert sum(backend.batches) == 10 and max(backend.batches) == 4
+
+    # Mode realtime: borne partagée par les lots simultanés, cache sur demande
+    from utils.batching import BatchRequest, RealtimeBatchBackend
+
+    class Client:
+        active = peak = 0
+        use_cache = []
+
+        async def acall(self, prompt, use_cache=False, **kwargs):
+            Client.use_cache.append(use_cache)
+            Client.active += 1
+            Client.peak = max(Client.peak, Client.active)
+            await asyncio.sleep(0.005)
+            Client.active -= 1
+            return prompt
+
+    realtime = RealtimeBatchBackend(Client(), max_concurrency=2)
+
+    async def two_batches():
+        return await asyncio.gather(
+            realtime.run([BatchRequest(f"a{i}", use_cache=True) for i in range(3)]),
+            realtime.run([BatchRequest(f"b{i}") for i in range(3)])
+        )
+
+    assert asyncio.run(two_batches()) == [["a0", "a1", "a2"], ["b0", "b1", "b2"]]
+    assert Client.peak == 2 and sorted(Client.use_cache) == [False] * 3 + [True] * 3
+
+
+def test_event_bus_replay_and_live():
+    """Test du bus d'événements: historique puis direct jusqu'à la fin"""
+    import asyncio
+    from utils.events import EventBus, EXECUTION_FINISHED
+    
+    bus = EventBus()
+    bus.publish("exec-1", "node_started", node_id="a")
+    
+    async def scenario():
+        received = []
+        
+        async def consume():
+            async for event in bus.subscribe("exec-1"):
+                received.append(event["type"])
+        
+        consumer = asyncio.ensure_future(consume())
+        await asyncio.sleep(0)
+        bus.publish("exec-1", "node_finished", node_id="a")
+        bus.publish("exec-1", EXECUTION_FINISHED, status="completed")
+        await asyncio.wait_for(consumer, timeout=1)
+        return received
+    
+    assert asyncio.run(scenario()) == ["node_started", "node_finished", EXECUTION_FINISHED]
+    assert bus.is_closed("exec-1")
+    
+    # Exécution d'un autre processus: aucun événement, fin lue par `check`
+    checks = []
+    
+    async def check():
+        checks.append(1)
+        return {"type": EXECUTION_FINISHED, "status": "completed"} if len(checks) > 2 else None
+    
+    async def remote():
+        return [event async for event in bus.subscribe("exec-2", check=check, poll_interval=0.01)]
+    
+    assert asyncio.run(remote()) == [{"type": EXECUTION_FINISHED, "status": "completed"}]
+    assert len(checks) == 3
+
+
 # =============================================================================
 # TESTS TOOLS
 # =============================================================================
@@ -224,6 +951,808 @@ def test_workflow_engine():
     assert "reviewer" in engine.agent_registry
 
 
+def test_workflow_engine_plan_dag():
+    """Test de l'analyse DAG des workflows"""
+    from workflows import WorkflowEngine, create_content_pipeline
+    from models import WorkflowDefinition, WorkflowNode, WorkflowEdge, NodeType
+    
+    engine = WorkflowEngine()
+    a, b, c = (WorkflowNode(type=NodeType.TOOL, tool_name="calculator") for _ in range(3))
+    
+    diamond = WorkflowDefinition(
+        name="DAG",
+        nodes=[a, b, c],
+        edges=[
+            WorkflowEdge(source=a.id, target=c.id),
+            WorkflowEdge(source=b.id, target=c.id, condition="default"),
+        ]
+    )
+    dependencies = engine.plan_dag(diamond)
+    assert dependencies[str(c.id)] == {str(a.id), str(b.id)}
+    assert dependencies[str(a.id)] == set()
+    
+    # Edges conditionnels et cycles: fallback séquentiel
+    assert engine.plan_dag(create_content_pipeline()) is None
+    cyclic = WorkflowDefinition(
+        name="Cycle",
+        nodes=[a, b],
+        edges=[
+            WorkflowEdge(source=a.id, target=b.id),
+            WorkflowEdge(source=b.id, target=a.id),
+        ]
+    )
+    assert engine.plan_dag(cyclic) is None
+    
+    # Seul le sous-graphe conditionnel reste séquentiel
+    d, e = (WorkflowNode(type=NodeType.TOOL, tool_name="calculator") for _ in range(2))
+    mixed = WorkflowDefinition(
+        name="Mixte",
+        nodes=[a, b, c, d],
+        edges=[
+            WorkflowEdge(source=a.id, target=b.id),
+            WorkflowEdge(source=b.id, target=a.id, condition="retry"),
+            WorkflowEdge(source=b.id, target=d.id),
+            WorkflowEdge(source=c.id, target=d.id),
+        ]
+    )
+    assert engine.plan_dag(mixed) == {
+        str(a.id): set(), str(c.id): set(), str(d.id): {str(a.id), str(c.id)}
+    }
+    assert engine.sequential_groups(mixed) == {str(a.id): [str(a.id), str(b.id)]}
+    
+    # Regroupement créant un cycle entre unités (a -> e -> b, a ~> b): fusionné
+    merged = WorkflowDefinition(
+        name="Fusion",
+        nodes=[a, b, c, e],
+        edges=[
+            WorkflowEdge(source=a.id, target=b.id, condition="retry"),
+            WorkflowEdge(source=a.id, target=e.id),
+            WorkflowEdge(source=e.id, target=b.id),
+        ]
+    )
+    assert engine.plan_dag(merged) == {str(a.id): set(), str(c.id): set()}
+    assert sorted(engine.sequential_groups(merged)[str(a.id)]) == sorted([str(a.id), str(b.id), str(e.id)])
+
+
+def test_workflow_engine_parallel_execution():
+    """Test de l'exécution DAG parallèle"""
+    import asyncio
+    from workflows import WorkflowEngine
+    from models import WorkflowDefinition, WorkflowNode, WorkflowEdge, NodeType, ExecutionStatus
+    
+    engine = WorkflowEngine()
+    workflow = WorkflowDefinition(
+        name="Parallel tools",
+        nodes=[
+            WorkflowNode(type=NodeType.TOOL, tool_name="calculator"),
+            WorkflowNode(type=NodeType.TOOL, tool_name="web_search"),
+        ]
+    )
+    
+    execution = asyncio.run(engine.run_async(
+        workflow,
+        {"calculator_args": {"expression": "6 * 7"}, "web_search_args": {"query": "x"}},
+        parallel=True,
+        max_concurrency=2
+    ))
+    
+    assert execution.status == ExecutionStatus.COMPLETED
+    assert execution.output_data["calculator_result"]["result"] == 42
+    assert execution.output_data["web_search_result"]["query"] == "x"
+    
+    # Sous-graphe conditionnel exécuté comme une seule unité du DAG
+    calc, search, last = (
+        WorkflowNode(type=NodeType.TOOL, tool_name=name)
+        for name in ("calculator", "web_search", "calculator")
+    )
+    start = WorkflowNode(type=NodeType.TOOL, tool_name="web_search")
+    mixed = WorkflowDefinition(
+        name="Mixte",
+        nodes=[start, calc, search, last],
+        edges=[
+            WorkflowEdge(source=start.id, target=calc.id),
+            WorkflowEdge(source=calc.id, target=start.id, condition="retry"),
+            WorkflowEdge(source=calc.id, target=last.id),
+            WorkflowEdge(source=search.id, target=last.id),
+        ]
+    )
+    execution = asyncio.run(engine.run_async(
+        mixed,
+        {"calculator_args": {"expression": "6 * 7"}, "web_search_args": {"query": "x"}},
+        parallel=True
+    ))
+    assert execution.status == ExecutionStatus.COMPLETED
+    assert execution.output_data["calculator_result"]["result"] == 42
+    assert len(execution.steps) == 4
+
+
+def test_versioned_state_snapshots_and_incremental_checkpoints():
+    """Test de l'état copy-on-write: snapshots, versions, conflits, checkpoints incrémentaux"""
+    from pocketflow import VersionedState, fork_shared, branch_writes, merge_writes
+    from storage import SQLiteCheckpointStore
+    from storage.checkpoints import ExecutionCheckpoint
+    
+    big = list(range(100_000))
+    state = VersionedState({"corpus": big, "notes": []})
+    snapshot = state.snapshot()
+    state["notes"] = state["notes"] + ["a"]
+    assert snapshot["notes"] == [] and state["notes"] == ["a"]
+    assert state["corpus"] is snapshot["corpus"] is big  # valeurs partagées
+    assert state.changes_since(snapshot.version) == ({"notes": ["a"]}, [])
+    
+    # Deux branches écrivent la même clé: conflit signalé, listes concaténées
+    base = fork_shared(state)
+    left, right = fork_shared(base), fork_shared(base)
+    left["notes"] = left["notes"] + ["left"]
+    left["summary"] = "L"
+    right["notes"] = right["notes"] + ["right"]
+    right["summary"] = "R"
+    conflicts = merge_writes(state, base, [branch_writes(base, left), branch_writes(base, right)])
+    assert conflicts == ["summary"]
+    assert state["notes"] == ["a", "left", "right"] and state["summary"] == "R"
+    
+    # Modification en place dans une branche: copiée à la lecture, puis fusionnée
+    base = fork_shared(state)
+    branch = fork_shared(base)
+    branch["notes"].append("inplace")
+    assert state["notes"] == ["a", "left", "right"] and base["notes"] == ["a", "left", "right"]
+    assert branch_writes(base, branch) == {"notes": ["a", "left", "right", "inplace"]}
+    assert merge_writes(state, base, [branch_writes(base, branch)]) == []
+    assert state["notes"][-1] == "inplace"
+    
+    # Checkpoint complet puis incrémental: seules les clés écrites sont réécrites
+    store = SQLiteCheckpointStore(":memory:")
+    store.save(ExecutionCheckpoint("e1", "w1", state.to_dict(), node_id="n1"))
+    since = state.version
+    state["summary"] = "final"
+    del state["notes"]
+    values, deleted = state.changes_since(since)
+    assert values == {"summary": "final"} and deleted == ["notes"]
+    store.save(ExecutionCheckpoint("e1", "w1", values, node_id="n2", partial=True, deleted=deleted))
+    loaded = store.load("e1")
+    assert loaded.node_id == "n2"
+    assert loaded.shared == {"corpus": big, "summary": "final"}
+
+
+def test_fan_out_reports_merge_conflicts():
+    """Test du signalement des clés écrites par plusieurs branches d'un FanOut"""
+    import asyncio
+    from pocketflow import Node, Flow, FanOut, VersionedState
+    
+    class Write(Node):
+        def __init__(self, value):
+            super().__init__()
+            self.value = value
+        
+        def exec(self, prep_res):
+            return None
+        
+        def post(self, shared, prep_res, exec_res):
+            shared["summary"] = self.value
+            shared["tags"].append(self.value)
+            return "default"
+    
+    events = []
+    fan_out = FanOut([Write("L"), Write("R")])
+    shared = VersionedState({"tags": []})
+    flow = Flow(start=fan_out, listener=lambda event, node, data: events.append((event, data)))
+    asyncio.run(flow.run_async(shared))
+    assert fan_out.conflicts == ["summary"]
+    assert ("merge_conflict", {"keys": ["summary"]}) in events
+    assert sorted(shared["tags"]) == ["L", "R"]
+
+
+def test_workflow_engine_checkpoint_and_resume():
+    """Test de la reprise d'une exécution depuis son dernier checkpoint"""
+    import asyncio
+    from datetime import date
+    from pocketflow import Node
+    from storage import SQLiteCheckpointStore
+    from workflows import WorkflowEngine
+    from models import WorkflowDefinition, WorkflowNode, WorkflowEdge, NodeType, ExecutionStatus
+    
+    calls = {"research": 0, "write": 0}
+    
+    class Research(Node):
+        def __init__(self, config_overrides=None):
+            super().__init__(max_retries=0)
+        
+        def exec(self, prep_res):
+            calls["research"] += 1
+            return "notes"
+        
+        def post(self, shared, prep_res, exec_res):
+            shared["notes"] = exec_res
+            return "default"
+    
+    class Write(Research):
+        def prep(self, shared):
+            return shared["notes"]
+        
+        def exec(self, notes):
+            calls["write"] += 1
+            if calls["write"] == 1:
+                raise RuntimeError("process tué")
+            return f"article from {notes}"
+        
+        def post(self, shared, prep_res, exec_res):
+            shared["article"] = exec_res
+            return "default"
+    
+    store = SQLiteCheckpointStore(":memory:")
+    engine = WorkflowEngine(checkpoint_store=store)
+    engine.register_agent("research_step", Research)
+    engine.register_agent("write_step", Write)
+    research = WorkflowNode(type=NodeType.AGENT, agent_type="research_step")
+    write = WorkflowNode(type=NodeType.AGENT, agent_type="write_step")
+    workflow = WorkflowDefinition(
+        name="Resumable",
+        nodes=[research, write],
+        edges=[WorkflowEdge(source=research.id, target=write.id)]
+    )
+    
+    execution = asyncio.run(engine.run_async(workflow, {"query": "x"}))
+    assert execution.status == ExecutionStatus.FAILED
+    checkpoint = store.load(str(execution.id))
+    assert checkpoint.node_id == str(write.id) and checkpoint.shared["notes"] == "notes"
+    assert checkpoint.counters == {"steps": 1, "edges": {f"{research.id}:default": 1}, "tokens": 0}
+    
+    execution = asyncio.run(engine.resume(workflow, execution))
+    assert execution.status == ExecutionStatus.COMPLETED and execution.error is None
+    assert execution.step_count == 2  # Compteurs repris du checkpoint
+    assert execution.output_data["article"] == "article from notes"
+    assert calls == {"research": 1, "write": 2}  # Étape terminée non rejouée
+    assert store.load(str(execution.id)) is None
+    with pytest.raises(ValueError):
+        asyncio.run(engine.resume(workflow, execution))
+    
+    # Une date (frontmatter YAML) est enregistrée et relue telle quelle
+    class Dated(Research):
+        def post(self, shared, prep_res, exec_res):
+            shared["notes"] = {"published": date(2024, 5, 1)}
+            return "default"
+    
+    calls["write"] = 0
+    engine.register_agent("research_step", Dated)
+    execution = asyncio.run(engine.run_async(workflow, {"query": "x"}))
+    assert execution.status == ExecutionStatus.FAILED and execution.checkpoint_error is None
+    assert store.load(str(execution.id)).shared["notes"] == {"published": date(2024, 5, 1)}
+    execution = asyncio.run(engine.resume(workflow, execution))
+    assert execution.status == ExecutionStatus.COMPLETED
+    
+    # Un état non sérialisable rend l'exécution non reprenable sans la faire échouer
+    class Opaque(Research):
+        def post(self, shared, prep_res, exec_res):
+            shared["notes"] = object()
+            return "default"
+    
+    engine.register_agent("research_step", Opaque)
+    execution = asyncio.run(engine.run_async(workflow, {"query": "x"}))
+    assert execution.status == ExecutionStatus.COMPLETED
+    assert "'notes'" in execution.checkpoint_error and store.load(str(execution.id)) is None
+
+
+def test_checkpoint_stores_round_trip_known_types(tmp_path):
+    """Test de l'encodage des dates, ensembles et modèles dans les checkpoints"""
+    from datetime import date, datetime
+    from storage import ExecutionCheckpoint, SQLiteCheckpointStore, FileCheckpointStore
+    from models import WorkflowLimits
+    
+    shared = {
+        "published": date(2024, 5, 1),
+        "updated": datetime(2024, 5, 2, 9, 30),
+        "tags": {"python"},
+        "limits": WorkflowLimits(max_steps=3)
+    }
+    for store in (SQLiteCheckpointStore(":memory:"), FileCheckpointStore(str(tmp_path))):
+        store.save(ExecutionCheckpoint(execution_id="e1", workflow_id="w1", step=1, shared=shared))
+        assert store.load("e1").shared == shared
+
+
+def test_workflow_engine_loop_guards_and_budgets():
+    """Test des garde-fous: passages par edge, repli, budget de tokens"""
+    from pocketflow import Node
+    from utils.llm import record_usage
+    from workflows import WorkflowEngine
+    from models import (
+        WorkflowDefinition, WorkflowNode, WorkflowEdge, WorkflowLimits, NodeType, ExecutionStatus
+    )
+    
+    class Research(Node):
+        def __init__(self, config_overrides=None):
+            super().__init__(max_retries=0)
+        
+        def exec(self, prep_res):
+            record_usage(100)
+            return None
+        
+        def post(self, shared, prep_res, exec_res):
+            shared["rounds"] = shared.get("rounds", 0) + 1
+            return "research"  # confidence: low, indéfiniment
+    
+    class Write(Research):
+        def post(self, shared, prep_res, exec_res):
+            shared["written"] = True
+            return "default"
+    
+    engine = WorkflowEngine()
+    engine.register_agent("loop_research", Research)
+    engine.register_agent("loop_write", Write)
+    research = WorkflowNode(type=NodeType.AGENT, agent_type="loop_research")
+    write = WorkflowNode(type=NodeType.AGENT, agent_type="loop_write")
+    workflow = WorkflowDefinition(
+        name="Loop",
+        nodes=[research, write],
+        edges=[
+            WorkflowEdge(source=research.id, target=research.id, condition="research", max_iterations=3),
+            WorkflowEdge(source=research.id, target=write.id, condition="write"),
+        ],
+        limits=WorkflowLimits(fallback_action="write")
+    )
+    
+    execution = engine.run(workflow, {})
+    assert execution.status == ExecutionStatus.COMPLETED
+    assert execution.output_data["rounds"] == 4 and execution.output_data["written"]
+    assert execution.limit_reached == "max_edge_iterations"
+    assert execution.step_count == 5 and execution.token_count == 500
+    assert execution.edge_counts == {f"{research.id}:research": 3, f"{research.id}:write": 1}
+    
+    workflow.limits = WorkflowLimits(max_tokens=250)
+    engine.clear_compiled()
+    execution = engine.run(workflow, {})
+    assert execution.status == ExecutionStatus.FAILED
+    assert execution.limit_reached == "max_tokens" and execution.step_count == 3
+    
+    # DAG: avec un repli, la limite arrête les lancements sans faire échouer
+    import asyncio
+    
+    chain = WorkflowDefinition(
+        name="Chain",
+        nodes=[research, write],
+        edges=[WorkflowEdge(source=research.id, target=write.id)],
+        limits=WorkflowLimits(max_steps=1, fallback_action="write")
+    )
+    execution = asyncio.run(engine.run_async(chain, {}, parallel=True))
+    assert execution.status == ExecutionStatus.COMPLETED
+    assert execution.limit_reached == "max_steps" and execution.step_count == 1
+    assert "written" not in execution.output_data
+    
+    # DAG: la deadline avec un repli annule les nodes en cours sans échec
+    from pocketflow import AsyncNode
+    
+    class Hang(AsyncNode):
+        def __init__(self, config_overrides=None):
+            super().__init__(max_retries=0)
+        
+        def exec(self, prep_res):
+            return None
+        
+        async def exec_async(self, prep_res):
+            await asyncio.sleep(5)
+        
+        async def post_async(self, shared, prep_res, exec_res):
+            shared["hung"] = True
+            return "default"
+    
+    engine.register_agent("loop_hang", Hang)
+    hang = WorkflowNode(type=NodeType.AGENT, agent_type="loop_hang")
+    stalled = WorkflowDefinition(
+        name="Stalled",
+        nodes=[research, hang, write],
+        edges=[WorkflowEdge(source=research.id, target=hang.id), WorkflowEdge(source=hang.id, target=write.id)],
+        limits=WorkflowLimits(timeout_seconds=0.1, fallback_action="write")
+    )
+    execution = asyncio.run(engine.run_async(stalled, {}, parallel=True))
+    assert execution.status == ExecutionStatus.COMPLETED and execution.limit_reached == "deadline"
+    assert execution.output_data["rounds"] == 1
+    assert "hung" not in execution.output_data and "written" not in execution.output_data
+    
+    stalled.limits = WorkflowLimits(timeout_seconds=0.1)
+    engine.clear_compiled()
+    execution = asyncio.run(engine.run_async(stalled, {}, parallel=True))
+    assert execution.status == ExecutionStatus.FAILED and execution.limit_reached == "deadline"
+    
+    # Deadline: un node synchrone n'est pas abandonné dans son thread
+    import time
+    from pocketflow import BudgetExceeded, Flow, FlowLimits
+    
+    class Slow(Node):
+        def exec(self, prep_res):
+            time.sleep(0.1)
+        
+        def post(self, shared, prep_res, exec_res):
+            shared["slow_done"] = True
+            return "default"
+    
+    slow = Slow()
+    slow >> Slow()
+    
+    async def run_slow():
+        shared = {}
+        try:
+            await Flow(slow, limits=FlowLimits(deadline=0.02)).run_async(shared)
+        except BudgetExceeded as e:
+            return e.reason, dict(shared)  # Lu dès l'erreur: le thread est terminé
+    
+    assert asyncio.run(run_slow()) == ("deadline", {"slow_done": True})
+
+
+def test_workflow_engine_records_steps():
+    """Test des étapes: phases, retries, tokens par node et agrégat p50/p95"""
+    import asyncio
+    from pocketflow import Node, RetryPolicy
+    from utils.llm import record_usage
+    from workflows import WorkflowEngine
+    from workflows.stats import summarize_steps
+    from models import WorkflowDefinition, WorkflowNode, WorkflowEdge, NodeType, ExecutionStatus
+    
+    class Flaky(Node):
+        def __init__(self, config_overrides=None):
+            super().__init__(retry_policy=RetryPolicy(max_retries=2, base_delay=0, retry_on=lambda e: True))
+            self.failures = 1
+        
+        def exec(self, prep_res):
+            record_usage(30, prompt_tokens=20, completion_tokens=10, latency_ms=5.0)
+            if self.failures:
+                self.failures -= 1
+                raise ValueError("transitoire")
+            return "ok"
+    
+    class Plain(Node):
+        def __init__(self, config_overrides=None):
+            super().__init__(max_retries=0)
+        
+        def exec(self, prep_res):
+            return None
+    
+    engine = WorkflowEngine()
+    engine.register_agent("steps_flaky", Flaky)
+    engine.register_agent("steps_plain", Plain)
+    flaky = WorkflowNode(type=NodeType.AGENT, agent_type="steps_flaky")
+    plain = WorkflowNode(type=NodeType.AGENT, agent_type="steps_plain")
+    workflow = WorkflowDefinition(
+        name="Steps",
+        nodes=[flaky, plain],
+        edges=[WorkflowEdge(source=flaky.id, target=plain.id)]
+    )
+    
+    executions = [
+        engine.run(workflow, {}),
+        asyncio.run(engine.run_async(workflow, {}, parallel=True)),
+    ]
+    for execution in executions:
+        assert execution.status == ExecutionStatus.COMPLETED
+        first, second = execution.steps
+        assert (first.node_id, second.node_id) == (flaky.id, plain.id)
+        assert first.status == ExecutionStatus.COMPLETED and first.retries == 1
+        assert first.exec_ms is not None and first.prep_ms is not None and first.post_ms is not None
+        assert (first.llm_calls, first.prompt_tokens, first.completion_tokens) == (2, 40, 20)
+        assert first.llm_latency_ms == 10.0
+        assert second.llm_calls == 0 and second.action == "default"
+        assert execution.token_count == 60
+    
+    stats = summarize_steps(executions)
+    assert stats[str(flaky.id)]["runs"] == 2 and stats[str(flaky.id)]["retries"] == 2
+    assert stats[str(flaky.id)]["llm_latency_ms"] == {"p50": 10.0, "p95": 10.0}
+    assert stats[str(plain.id)]["llm_calls"] == 0
+
+
+def test_workflow_engine_compiled_cache():
+    """Test du cache de flows compilés"""
+    from workflows import WorkflowEngine, create_content_pipeline
+
+    engine = WorkflowEngine(compiled_cache_size=2)
+    workflow = create_content_pipeline()
+
+    compiled = engine.compile(workflow)
+    assert engine.compile(workflow) is compiled
+    assert (engine.compile_hits, engine.compile_misses) == (1, 1)
+
+    # Chaque exécution a ses propres nodes (retries, successeurs)
+    first, second = compiled.instantiate(), compiled.instantiate()
+    node_id = compiled.start_id
+    assert first[node_id] is not second[node_id]
+    assert first[node_id].config is second[node_id].config
+    first[node_id].cur_retry = 2
+    assert second[node_id].cur_retry == 0
+    assert first[node_id].successors["write"] is first[str(workflow.nodes[1].id)]
+
+    # Nouvelle version: recompilation; invalidation de toutes les versions
+    workflow.version = "1.1.0"
+    assert engine.compile(workflow) is not compiled
+    assert engine.invalidate(workflow.id) == 2
+    assert engine.invalidate(workflow.id) == 0
+
+    # Éviction LRU
+    for _ in range(3):
+        engine.compile(create_content_pipeline())
+    assert len(engine._compiled) == 2
+
+
+def test_admission_controller_limits():
+    """Test du contrôle d'admission (429 file pleine, 503 attente trop longue)"""
+    import asyncio
+    from utils.admission import AdmissionController, AdmissionRejected
+    
+    async def scenario():
+        admission = AdmissionController(max_running=1, max_queued=1, queue_timeout=0.05)
+        await admission.acquire()
+        
+        waiter = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        assert admission.queued == 1
+        
+        with pytest.raises(AdmissionRejected) as full:
+            await admission.acquire()
+        assert full.value.status_code == 429
+        
+        with pytest.raises(AdmissionRejected) as timeout:
+            await waiter
+        assert timeout.value.status_code == 503
+        
+        admission.release()
+        async with admission.slot():
+            assert admission.running == 1
+        assert admission.stats()["rejected"] == 2
+    
+    asyncio.run(scenario())
+
+
+def test_local_execution_queue_priorities_and_fairness():
+    """Test de la file d'exécution (priorités strictes, round-robin par tenant)"""
+    from workflows.scheduler import ExecutionJob, LocalExecutionQueue, QueueFull
+    from models import Execution, ExecutionPriority, WorkflowDefinition
+    
+    workflow = WorkflowDefinition(name="Queued")
+    
+    def job(tenant, priority=ExecutionPriority.NORMAL):
+        return ExecutionJob(Execution(workflow_id=workflow.id), workflow, tenant_id=tenant, priority=priority)
+    
+    queue = LocalExecutionQueue(max_size=6)
+    for tenant in ["a", "a", "a", "b"]:
+        queue.put_nowait(job(tenant))
+    queue.put_nowait(job("c", ExecutionPriority.LOW))
+    queue.put_nowait(job("d", ExecutionPriority.HIGH))
+    with pytest.raises(QueueFull):
+        queue.put_nowait(job("e"))
+    
+    order = [queue.get_nowait().tenant_id for _ in range(6)]
+    assert order == ["d", "a", "b", "a", "a", "c"]
+    assert queue.get_nowait() is None
+    
+    restored = ExecutionJob.from_json(job("x", ExecutionPriority.HIGH).to_json())
+    assert (restored.tenant_id, restored.priority) == ("x", ExecutionPriority.HIGH)
+
+
+def test_execution_scheduler_worker_pool():
+    """Test du pool de workers (concurrence bornée et métriques)"""
+    import asyncio
+    from workflows.scheduler import ExecutionJob, ExecutionScheduler
+    from models import Execution, WorkflowDefinition
+    
+    workflow = WorkflowDefinition(name="Queued")
+    active, peak, done = [0], [0], []
+    
+    async def runner(job):
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        await asyncio.sleep(0.01)
+        active[0] -= 1
+        done.append(job.execution.id)
+    
+    async def scenario():
+        scheduler = ExecutionScheduler(runner, workers=2)
+        for _ in range(6):
+            await scheduler.submit(ExecutionJob(Execution(workflow_id=workflow.id), workflow))
+        while len(done) < 6:
+            await asyncio.sleep(0.01)
+        stats = await scheduler.stats()
+        await scheduler.stop()
+        return stats
+    
+    stats = asyncio.run(scenario())
+    assert peak[0] == 2
+    assert stats["completed"] == 6
+    assert stats["queue_depth"] == 0
+    assert stats["wait_time_ms"]["samples"] == 6
+
+
+
+def test_execution_scheduler_stop_and_recover():
+    """Test des exécutions interrompues: rendues à une file durable, sinon en échec"""
+    import asyncio
+    from workflows.scheduler import ExecutionJob, ExecutionScheduler, LocalExecutionQueue
+    from storage import create_execution_repository
+    from models import Execution, ExecutionStatus, WorkflowDefinition
+    
+    workflow = WorkflowDefinition(name="Queued")
+    
+    class DurableQueue(LocalExecutionQueue):
+        durable = True
+        
+        async def release(self, job):
+            self.put_nowait(job)
+            return True
+        
+        async def drain(self):
+            return []
+    
+    async def runner(job):
+        await asyncio.sleep(10)
+    
+    async def interrupted(queue):
+        repository = create_execution_repository("sqlite://")
+        scheduler = ExecutionScheduler(runner, queue=queue, workers=1, repository=repository)
+        jobs = [ExecutionJob(Execution(workflow_id=workflow.id), workflow) for _ in range(2)]
+        for job in jobs:
+            await repository.save(job.execution)
+            await scheduler.submit(job)
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        return [(await repository.get(str(job.execution.id))).status for job in jobs], len(queue)
+    
+    # File mémoire: job en cours et job en attente perdus, donc en échec
+    assert asyncio.run(interrupted(LocalExecutionQueue())) == (
+        [ExecutionStatus.FAILED, ExecutionStatus.FAILED], 0
+    )
+    # File durable: le job en cours est rendu et reste en attente
+    assert asyncio.run(interrupted(DurableQueue())) == (
+        [ExecutionStatus.PENDING, ExecutionStatus.PENDING], 2
+    )
+    
+    # Redémarrage avec la file mémoire: seules les exécutions non terminées de l'instance sont en échec
+    async def restart():
+        repository = create_execution_repository("sqlite://")
+        orphan = Execution(workflow_id=workflow.id, status=ExecutionStatus.RUNNING, owner="api-1")
+        done = Execution(workflow_id=workflow.id, status=ExecutionStatus.COMPLETED, owner="api-1")
+        other = Execution(workflow_id=workflow.id, status=ExecutionStatus.RUNNING, owner="api-2")
+        for execution in (orphan, done, other, Execution(workflow_id=workflow.id, owner="api-1")):
+            await repository.save(execution)
+        assert await ExecutionScheduler(runner, repository=repository, instance_id=None).recover() == 0
+        recovered = await ExecutionScheduler(runner, repository=repository, instance_id="api-1").recover()
+        statuses = [(await repository.get(str(e.id))).status for e in (orphan, done, other)]
+        return recovered, statuses
+    
+    assert asyncio.run(restart()) == (
+        2, [ExecutionStatus.FAILED, ExecutionStatus.COMPLETED, ExecutionStatus.RUNNING]
+    )
+
+
+# =============================================================================
+# TESTS STORAGE
+# =============================================================================
+
+def test_sqlite_execution_repository(tmp_path):
+    """Test du dépôt SQLite des exécutions"""
+    import asyncio
+    from uuid import uuid4
+    from storage import create_execution_repository
+    from models import Execution, ExecutionStatus
+    
+    workflow_a, workflow_b = uuid4(), uuid4()
+    
+    async def scenario():
+        repository = create_execution_repository(f"sqlite:///{tmp_path / 'executions.db'}")
+        first = Execution(workflow_id=workflow_a, status=ExecutionStatus.COMPLETED,
+                          output_data={"answer": 42})
+        await repository.save(first)
+        await repository.save(Execution(workflow_id=workflow_a, status=ExecutionStatus.RUNNING))
+        await repository.save(Execution(workflow_id=workflow_b, status=ExecutionStatus.COMPLETED))
+        
+        first.status = ExecutionStatus.FAILED
+        await repository.save(first)
+        
+        loaded = await repository.get(str(first.id))
+        by_workflow = await repository.list(workflow_id=str(workflow_a))
+        failed = await repository.list(status=ExecutionStatus.FAILED)
+        deleted = await repository.delete(str(first.id))
+        return loaded, by_workflow, failed, deleted, await repository.get(str(first.id))
+    
+    loaded, by_workflow, failed, deleted, missing = asyncio.run(scenario())
+    
+    assert loaded.output_data == {"answer": 42}
+    assert loaded.status == ExecutionStatus.FAILED
+    assert len(by_workflow) == 2
+    assert [e.id for e in failed] == [loaded.id]
+    assert deleted is True
+    assert missing is None
+
+
+def test_indexed_store_keyset_pagination():
+    """Test des index secondaires et de la pagination keyset"""
+    from storage import IndexedStore
+    
+    store = IndexedStore(indexes={"tag": lambda item: item["tags"]})
+    for i in range(10):
+        store[f"id{i}"] = {"n": i, "tags": ["even"] if i % 2 == 0 else ["odd"]}
+    
+    page, cursor = store.page(limit=2, tag="even")
+    assert [item["n"] for item in page] == [0, 2]
+    
+    store["id3"]["tags"].append("even")
+    store.reindex("id3")
+    del store["id4"]
+    
+    page, cursor = store.page(limit=2, cursor=cursor, tag="even")
+    assert [item["n"] for item in page] == [3, 6]
+    page, cursor = store.page(limit=2, cursor=cursor, tag="even")
+    assert [item["n"] for item in page] == [8]
+    assert cursor is None
+    assert store.count(tag="even") == 5
+    assert store.count(tag="missing") == 0
+    
+    # Curseurs forgés (type ou nombre de valeurs): ValueError, donc 400 côté API
+    from storage import encode_cursor
+    for forged in (encode_cursor(None), encode_cursor({"a": 1}), encode_cursor(1, 2), "%%%"):
+        with pytest.raises(ValueError):
+            store.page(limit=2, cursor=forged)
+    with pytest.raises(ValueError):
+        store.page(limit=0)
+
+
+def test_builder_list_agents_cursor():
+    """Test de la pagination par curseur des builder tools"""
+    from tools.builder_tools import create_agent, list_agents, agents_storage
+    
+    agents_storage.clear()
+    for i in range(5):
+        create_agent(f"Agent {i}", agent_type="writer" if i < 3 else "coder", tags=["demo"])
+    
+    first = list_agents(agent_type="writer", tag="demo", limit=2)
+    assert first["total"] == 3
+    assert first["count"] == 2
+    
+    second = list_agents(agent_type="writer", tag="demo", limit=2, cursor=first["next_cursor"])
+    assert [a["name"] for a in second["agents"]] == ["Agent 2"]
+    assert second["next_cursor"] is None
+    agents_storage.clear()
+
+
+def test_execution_repository_list_page():
+    """Test de la pagination keyset des exécutions"""
+    import asyncio
+    from uuid import uuid4
+    from storage import create_execution_repository
+    from models import Execution
+    
+    workflow_id = uuid4()
+    
+    async def scenario():
+        repository = create_execution_repository("sqlite://")
+        for _ in range(5):
+            await repository.save(Execution(workflow_id=workflow_id))
+        seen, cursor = [], None
+        while True:
+            page, cursor = await repository.list_page(
+                workflow_id=str(workflow_id), limit=2, cursor=cursor
+            )
+            seen.extend(e.id for e in page)
+            if cursor is None:
+                return seen, await repository.latest(workflow_id=str(workflow_id), limit=2)
+    
+    seen, latest = asyncio.run(scenario())
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+    assert [e.id for e in latest] == seen[:-3:-1]  # Les plus récentes d'abord
+    
+    # Curseurs forgés: 400 et non 500
+    from fastapi.testclient import TestClient
+    from api.main import app
+    from storage import encode_cursor
+    
+    client = TestClient(app)
+    for forged in (encode_cursor(1, {"x": 1}), encode_cursor("pas-une-date", "id"), encode_cursor([1])):
+        assert client.get("/api/v1/executions", params={"cursor": forged}).status_code == 400
+        assert client.get("/api/v1/workflows", params={"cursor": forged}).status_code == 400
+    
+    # Taille de page hors bornes: 422 et non 500
+    for limit in (0, -1, 10_000):
+        assert client.get("/api/v1/executions", params={"limit": limit}).status_code == 422
+        assert client.get("/api/v1/agents", params={"limit": limit}).status_code == 422
+        history = client.get("/api/v1/executions/e1/history/research_history", params={"limit": limit})
+        assert history.status_code == 422
+
+
 # =============================================================================
 # TESTS API
 # =============================================================================
@@ -241,6 +1770,284 @@ async def test_api_health():
     assert response.json()["status"] == "healthy"
 
 
+def test_agent_prompt_budget_trims_oldest_history():
+    """Test du budget de prompt: historique élagué du plus ancien, rapport des réductions"""
+    from agents import ResearchAgent
+    from agents.prompting import PromptBuilder, context_window, count_tokens
+    from utils.events import event_sink
+    
+    assert context_window("gpt-4o-mini") == 128_000 and context_window("gpt-4") == 8_192
+    
+    agent = ResearchAgent(config_overrides={"max_prompt_tokens": 400})
+    prep_res = {
+        "query": "impact des LLM",
+        "history": [{"round": i, "findings": "x" * 200} for i in range(30)],
+        "constraints": {},
+    }
+    events = []
+    token = event_sink.set(lambda event_type, **data: events.append((event_type, data)))
+    try:
+        prompt = agent.build_prompt(prep_res)
+    finally:
+        event_sink.reset(token)
+    
+    report = agent.prompt_report
+    assert report.budget == 400 - agent.prompt_prefix.tokens  # préfixe système envoyé à part
+    assert count_tokens(prompt) + agent.prompt_prefix.tokens <= 400 and report.tokens <= report.budget
+    assert "impact des LLM" in prompt and "round: 29" in prompt  # input et éléments récents gardés
+    assert "round: 0\n" not in prompt and "éléments plus anciens omis" in prompt
+    assert report.dropped[0]["section"] == "history" and report.dropped[0]["items_dropped"] > 0
+    assert events[0][0] == "prompt_trimmed"
+    
+    # Dans le budget: rien n'est retiré
+    agent.build_prompt({"query": "court", "history": [{"round": 1}]})
+    assert not agent.prompt_report.trimmed
+    
+    # Seuls les historiques déclarés sont élagables: les autres listes restent dans l'input
+    agent.build_prompt({"query": "q", "history": [], "sources": ["a" * 2000]})
+    assert all(entry["section"] != "sources" for entry in agent.prompt_report.dropped)
+    
+    # La réponse réservée est le max_tokens de l'appel
+    small = ResearchAgent(config_overrides={"model_name": "gpt-4", "max_tokens": 1000})
+    small.build_prompt({"query": "q"})
+    assert small.prompt_report.budget == 8_192 - 1000 - small.prompt_prefix.tokens
+    
+    # Dernier recours: l'input requis est tronqué, jamais le système
+    builder = PromptBuilder(budget=50)
+    builder.add("system", "Tu es un agent.", "System", required=True, truncatable=False)
+    builder.add("input", "mot " * 500, "Input", required=True)
+    prompt, report = builder.build()
+    assert prompt.startswith("# System\nTu es un agent.") and report.tokens <= 50
+    assert report.dropped == [{"section": "input", "chars_truncated": report.dropped[0]["chars_truncated"]}]
+
+
+def test_agent_static_prefix_sent_as_cacheable_system_prompt(monkeypatch):
+    """Test du préfixe statique: compilé une fois, partagé, envoyé comme prompt système"""
+    from agents import ResearchAgent
+    from agents.prompting import prefix_registry
+    from types import SimpleNamespace
+    from utils.llm import AnthropicClient, _anthropic_usage
+    import agents
+    
+    first, second = ResearchAgent(), ResearchAgent()
+    assert first.prompt_prefix is second.prompt_prefix  # registre: même empreinte, même objet
+    prefix = first.prompt_prefix
+    assert prefix.text.startswith("# System\nVous êtes un assistant de recherche")
+    assert "Répondez en YAML valide." in prefix.text and len(prefix.hash) == 16
+    
+    calls = []
+    monkeypatch.setattr(agents, "call_llm", lambda prompt, **kwargs: calls.append((prompt, kwargs)) or "ok: 1")
+    assert first.exec({"query": "q", "constraints": {}}) == {"ok": 1}
+    prompt, kwargs = calls[0]
+    assert kwargs["system_prompt"] == prefix.text
+    assert "# System" not in prompt and prompt.startswith("# Input\nquery: q")
+    
+    # Un outil modifie le préfixe de cet agent seulement
+    misses = prefix_registry.stats()["misses"]
+    first.register_tool("search", lambda q: q)
+    assert "- search" in first.prompt_prefix.text and first.prompt_prefix.hash != prefix.hash
+    assert second.prompt_prefix is prefix and prefix_registry.stats()["misses"] == misses + 1
+    
+    # Anthropic: prompt système en bloc cache_control
+    assert AnthropicClient._system("stable") == [
+        {"type": "text", "text": "stable", "cache_control": {"type": "ephemeral"}}
+    ]
+    
+    # Tokens lus et écrits en cache comptés dans le prompt (input_tokens les exclut)
+    usage = SimpleNamespace(
+        input_tokens=10, output_tokens=5, cache_read_input_tokens=900, cache_creation_input_tokens=100
+    )
+    assert _anthropic_usage(usage) == (1015, 1010, 5, 900)
+
+
+def test_agent_output_parsing_paths(monkeypatch):
+    """Test du parsing des sorties: loader C, réparation, schéma pydantic, mode JSON natif"""
+    import asyncio
+    import yaml
+    import agents
+    from agents import AgentBuilder, ReviewerAgent, WriterAgent
+    from agents.parsing import YAML_LOADER
+    from utils.metrics import AGENT_OUTPUT_PARSE
+    
+    if yaml.__with_libyaml__:
+        assert YAML_LOADER is yaml.CSafeLoader
+    
+    writer = WriterAgent()
+    raw = "Voici le texte:\n```yaml\ntitle: 2024\ncontent: |\n  Intro: a\nneeds_review: true\n```\nBonne lecture"
+    assert writer.parse_output(raw) == {"title": "2024", "content": "Intro: a\n", "needs_review": True}
+    
+    # Réparation: valeur non quotée contenant `: `
+    repaired = AGENT_OUTPUT_PARSE.labels("yaml", "repaired")
+    before = repaired.value
+    assert writer.parse_output("title: Note: важно\nsections:\n  - intro")["title"] == "Note: важно"
+    assert repaired.value == before + 1
+    
+    # Schéma non respecté: repli avec les erreurs de validation
+    review = ReviewerAgent().parse_output("approved: peut-être\nscore: 7")
+    assert review["parse_error"] and review["validation_errors"][0]["loc"] == ("approved",)
+    
+    # AgentBuilder: mode JSON natif avec le schéma, puis réparation si le provider l'ignore
+    calls = []
+    responses = iter([
+        '{"tool": "list_agents", "parameters": {}}',
+        'Action:\n```json\n{"tool": "get_agent", "parameters": {"agent_id": "a1",},}\n```',
+    ])
+    monkeypatch.setattr(agents, "call_llm", lambda prompt, **kwargs: calls.append(kwargs) or next(responses))
+    builder = AgentBuilder()
+    assert builder.exec({"request": "liste"}) == {"tool": "list_agents", "parameters": {}}
+    assert builder.exec({"request": "détail"}) == {"tool": "get_agent", "parameters": {"agent_id": "a1"}}
+    response_format = calls[0]["response_format"]
+    assert response_format["name"] == "BuilderAction" and "tool" in response_format["schema"]["required"]
+    assert writer.response_format() is None  # YAML: pas de mode natif
+    
+    # Streaming et lots transmettent aussi le mode natif
+    streamed, batched = [], []
+    monkeypatch.setattr(
+        agents, "stream_llm", lambda prompt, **kwargs: streamed.append(kwargs) or iter(['{"tool": ', '"list_agents"}'])
+    )
+    builder = AgentBuilder(config_overrides={"stream": True})
+    assert builder.exec({"request": "liste"})["tool"] == "list_agents"
+    assert streamed[0]["response_format"]["name"] == "BuilderAction"
+    
+    class FakeBatcher:
+        async def acall(self, prompt, **kwargs):
+            batched.append(kwargs)
+            return '{"tool": "list_agents"}'
+    
+    monkeypatch.setattr(agents, "get_llm_batcher", lambda provider: FakeBatcher())
+    builder = AgentBuilder(config_overrides={"batch": True})
+    assert asyncio.run(builder.exec_async({"request": "liste"}))["tool"] == "list_agents"
+    assert batched[0]["response_format"]["name"] == "BuilderAction"
+    assert batched[0]["use_cache"] is False  # cache_responses: opt-in, lots compris
+
+
+def test_agent_history_retention_and_paging(tmp_path, monkeypatch):
+    """Test des politiques de rétention et de la pagination de l'historique déversé"""
+    import asyncio
+    import pytest
+    from fastapi.testclient import TestClient
+    from pydantic import ValidationError
+    from agents import ResearchAgent
+    from agents.history import RingBuffer, SpillToDisk, SummarizeCompact, history_stream
+    from api.main import app, execution_repository
+    from models import AgentConfig, Execution
+    from pocketflow import merge_writes
+    from storage import history as history_storage
+    
+    monkeypatch.setattr(history_storage, "_history_store", history_storage.SQLiteHistoryStore(str(tmp_path / "history.db")))
+    with pytest.raises(ValidationError):
+        AgentConfig(name="a", system_prompt="s", history_retention="ring:0")
+    assert AgentConfig(name="a", system_prompt="s", history_retention="Spill:5").history_retention == "Spill:5"
+    
+    assert RingBuffer(2).append([1, 2], 3, "k") == [2, 3]
+    
+    # Deux branches parallèles bornent le même historique: aucun ajout perdu
+    ring = RingBuffer(3)
+    base = ring.append([1], 2, "k")
+    left, right = ring.append(base, "L", "k"), ring.append(base, "R", "k")
+    shared = {"k": base}
+    merge_writes(shared, {"k": base}, [{"k": left}, {"k": right}])
+    assert shared["k"] == [2, "L", "R"]
+    
+    # Les éléments anciens déversés par les deux branches ne sont pas dupliqués
+    store = history_storage.SQLiteHistoryStore(":memory:")
+    spill = SpillToDisk(2, store=store)
+    base = [0, 1]
+    left, right = spill.append(base, "L", "k"), spill.append(base, "R", "k")
+    shared = {"k": base}
+    merge_writes(shared, {"k": base}, [{"k": left}, {"k": right}])
+    assert shared["k"] == ["L", "R"]
+    assert [item for _, item in store.page("default/k")] == [0, 1]
+    assert store.delete_execution("default") == 2 and store.purge(0) == 0
+    policy = SummarizeCompact(max_items=4, keep_recent=2)
+    history = []
+    for i in range(7):
+        history = policy.append(history, f"résultat {i}", "k")
+    assert len(history) <= 4 and history[-1] == "résultat 6"
+    assert history[0]["compacted"] + len(history) - 1 == 7
+    assert "résultat 0" in history[0]["summary"]
+    
+    execution = Execution(workflow_id=uuid4())
+    agent = ResearchAgent(config_overrides={"history_retention": "spill:2"})
+    shared = {}
+    token = history_stream.set(str(execution.id))
+    try:
+        for i in range(5):
+            agent.append_history(shared, "research_history", {"round": i})
+    finally:
+        history_stream.reset(token)
+    assert shared["research_history"] == [{"round": 3}, {"round": 4}]
+    
+    execution.output_data = shared
+    asyncio.run(execution_repository.save(execution))
+    client = TestClient(app)
+    url = f"/api/v1/executions/{execution.id}/history/research_history"
+    rounds, cursor = [], None
+    while True:
+        page = client.get(url, params={"limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+        assert page["spilled"] == 3
+        rounds += [entry["item"]["round"] for entry in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert rounds == [0, 1, 2, 3, 4]
+
+
+def test_api_metrics(monkeypatch):
+    """Test du endpoint /metrics (routes HTTP, outils, file d'exécution)"""
+    from fastapi.testclient import TestClient
+    from api.main import app
+    from tools import tool_registry
+    from utils.metrics import BoundedLabel, MetricsRegistry, LLM_REQUEST_DURATION
+    
+    registry = MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "Démo", ("route",), buckets=(0.1, 1.0))
+    latency.labels("/a").observe(0.05)
+    latency.labels("/a").observe(0.5)
+    text = registry.render()
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{route="/a"} 2' in text
+    
+    label = BoundedLabel(2)
+    assert [label(value) for value in ("a", "b", "c", "a")] == ["a", "b", "other", "a"]
+    
+    # Un stream interrompu est compté en erreur
+    from models import LLMProvider
+    from utils.llm import BaseLLMClient, LLMClient
+    
+    class Broken(BaseLLMClient):
+        def call(self, prompt, **kwargs):
+            return prompt
+        
+        def stream(self, prompt, model=None, temperature=0.7, max_tokens=4096, system_prompt=None):
+            yield "x"
+            raise ConnectionError("coupé")
+    
+    monkeypatch.setitem(LLMClient._clients, LLMProvider.OPENAI, Broken())
+    errors = LLM_REQUEST_DURATION.labels("openai", "default", "error")
+    before = sum(errors.counts)
+    with pytest.raises(ConnectionError):
+        list(LLMClient(LLMProvider.OPENAI, limiter=None).stream("p"))
+    assert sum(errors.counts) == before + 1
+    
+    client = TestClient(app)
+    client.get("/health")
+    client.get("/api/v1/workflows/inconnu")
+    tool_registry.execute("calculator", expression="2 + 2")
+    response = client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in text
+    assert 'route="/api/v1/workflows/{workflow_id}",status="404"' in text
+    assert 'tool_call_duration_seconds_count{tool="calculator",status="ok"}' in text
+    assert 'execution_queue_depth{priority="normal"}' in text
+    assert "workflow_active_executions 0" in text
+    assert "# TYPE llm_cache_hits_total counter" in text
+
+
 @pytest.mark.asyncio
 async def test_api_list_agent_types():
     """Test de la liste des types d'agents"""
@@ -302,5 +2109,61 @@ async def test_api_execute_tool():
     assert data["result"]["result"] == 7
 
 
+def test_api_execution_events_stream():
+    """Test du stream SSE des événements d'exécution"""
+    from fastapi.testclient import TestClient
+    from api.main import app, workflows_db
+    from models import WorkflowDefinition, WorkflowNode, NodeType
+    
+    workflow = WorkflowDefinition(
+        name="Calc",
+        nodes=[WorkflowNode(type=NodeType.TOOL, tool_name="calculator")]
+    )
+    workflows_db[str(workflow.id)] = workflow
+    
+    client = TestClient(app)
+    response = client.post(
+        f"/api/v1/workflows/{workflow.id}/execute",
+        json={"input_data": {"calculator_args": {"expression": "1 + 1"}}, "async_mode": False}
+    )
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    execution_id = response.json()["execution_id"]
+    
+    response = client.get(f"/api/v1/executions/{execution_id}/events")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "event: node_finished" in response.text
+    assert "event: execution_finished" in response.text
+    
+    # WebSocket: même flux d'événements
+    with client.websocket_connect(f"/api/v1/executions/{execution_id}/ws") as websocket:
+        types = []
+        while not types or types[-1] != "execution_finished":
+            types.append(websocket.receive_json()["type"])
+    assert "node_finished" in types
+
+
+def test_api_execution_events_from_other_process():
+    """Test des streams d'une exécution terminée hors de ce processus (fin lue dans le dépôt)"""
+    import asyncio
+    from uuid import uuid4
+    from fastapi.testclient import TestClient
+    from api.main import app, execution_repository
+    from models import Execution, ExecutionStatus
+    
+    execution = Execution(workflow_id=uuid4(), status=ExecutionStatus.COMPLETED)
+    asyncio.run(execution_repository.save(execution))
+    
+    client = TestClient(app)
+    response = client.get(f"/api/v1/executions/{execution.id}/events")
+    assert "event: execution_finished" in response.text
+    assert '"status": "completed"' in response.text
+    
+    with client.websocket_connect(f"/api/v1/executions/{execution.id}/ws") as websocket:
+        event = websocket.receive_json()
+    assert (event["type"], event["status"]) == ("execution_finished", "completed")
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -11,8 +11,10 @@ Serveur MCP et outils standards:
 
 import os
 import ast
+import time
 from typing import Dict, Any, Optional, Callable, List
 from pathlib import Path
+from utils.metrics import TOOL_CALL_DURATION
 from .builder_tools import register_builder_tools
 
 
@@ -51,10 +53,17 @@ class ToolRegistry:
         return self._tools.get(name)
     
     def execute(self, name: str, **kwargs) -> Any:
-        """Exécute un outil"""
+        """Exécute un outil (durée publiée dans tool_call_duration_seconds)"""
         if name not in self._implementations:
             raise ValueError(f"Outil inconnu: {name}")
-        return self._implementations[name](**kwargs)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = self._implementations[name](**kwargs)
+            status = "ok"
+            return result
+        finally:
+            TOOL_CALL_DURATION.labels(name, status).observe(time.perf_counter() - started)
     
     def list_tools(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
         """Liste les outils disponibles"""
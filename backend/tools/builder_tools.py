@@ -19,13 +19,19 @@ from datetime import datetime
 from uuid import uuid4
 import json
 
+from storage.pagination import IndexedStore
+
 
 # =============================================================================
 # IN-MEMORY STORAGE (à remplacer par PostgreSQL en production)
 # =============================================================================
 
-agents_storage: Dict[str, Dict[str, Any]] = {}
-workflows_storage: Dict[str, Dict[str, Any]] = {}
+# Index secondaires (type → ids, tag → ids) pour filtrer sans parcours complet
+agents_storage: IndexedStore[Dict[str, Any]] = IndexedStore(indexes={
+    "type": lambda agent: [agent["type"]],
+    "tag": lambda agent: agent["tags"],
+})
+workflows_storage: IndexedStore[Dict[str, Any]] = IndexedStore()
 
 
 # =============================================================================
@@ -127,6 +133,7 @@ def update_agent(
             agent["tags"] = tags
         
         agent["updated_at"] = datetime.utcnow().isoformat()
+        agents_storage.reindex(agent_id)
         
         return {
             "success": True,
@@ -181,7 +188,8 @@ def list_agents(
     agent_type: Optional[str] = None,
     tag: Optional[str] = None,
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Liste les agents disponibles
@@ -190,31 +198,28 @@ def list_agents(
         agent_type: Filtrer par type d'agent (optionnel)
         tag: Filtrer par tag (optionnel)
         limit: Nombre maximum d'agents à retourner
-        offset: Décalage pour la pagination
+        offset: Décalage pour la pagination (préférer cursor)
+        cursor: Curseur de la page suivante (next_cursor d'un appel précédent)
     
     Returns:
-        Dictionnaire avec la liste des agents
+        Dictionnaire avec la liste des agents et le curseur suivant
     """
     try:
-        agents = list(agents_storage.values())
-        
-        if agent_type:
-            agents = [a for a in agents if a["type"] == agent_type]
-        
-        if tag:
-            agents = [a for a in agents if tag in a["tags"]]
-        
-        total = len(agents)
-        agents = agents[offset:offset + limit]
+        filters = {"type": agent_type, "tag": tag}
+        agents, next_cursor = agents_storage.page(
+            limit=offset + limit, cursor=cursor, **filters
+        )
+        agents = agents[offset:]
         
         return {
             "success": True,
             "status": "listed",
             "agents": agents,
-            "total": total,
+            "total": agents_storage.count(**filters),
             "count": len(agents),
             "offset": offset,
             "limit": limit,
+            "next_cursor": next_cursor,
             "message": f"{len(agents)} agent(s) trouvé(s)"
         }
     except Exception as e:
@@ -419,31 +424,33 @@ def delete_workflow(workflow_id: str) -> Dict[str, Any]:
 
 def list_workflows(
     limit: int = 100,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Liste les workflows disponibles
     
     Args:
         limit: Nombre maximum de workflows à retourner
-        offset: Décalage pour la pagination
+        offset: Décalage pour la pagination (préférer cursor)
+        cursor: Curseur de la page suivante (next_cursor d'un appel précédent)
     
     Returns:
-        Dictionnaire avec la liste des workflows
+        Dictionnaire avec la liste des workflows et le curseur suivant
     """
     try:
-        workflows = list(workflows_storage.values())
-        total = len(workflows)
-        workflows = workflows[offset:offset + limit]
+        workflows, next_cursor = workflows_storage.page(limit=offset + limit, cursor=cursor)
+        workflows = workflows[offset:]
         
         return {
             "success": True,
             "status": "listed",
             "workflows": workflows,
-            "total": total,
+            "total": len(workflows_storage),
             "count": len(workflows),
             "offset": offset,
             "limit": limit,
+            "next_cursor": next_cursor,
             "message": f"{len(workflows)} workflow(s) trouvé(s)"
         }
     except Exception as e:
@@ -562,12 +569,14 @@ def register_builder_tools(tool_registry):
             "agent_type": "string",
             "tag": "string",
             "limit": "integer",
-            "offset": "integer"
+            "offset": "integer",
+            "cursor": "string"
         },
         output_schema={
             "success": "boolean",
             "agents": "array",
-            "total": "integer"
+            "total": "integer",
+            "next_cursor": "string"
         }
     )
     
@@ -648,12 +657,14 @@ def register_builder_tools(tool_registry):
         category="builder",
         input_schema={
             "limit": "integer",
-            "offset": "integer"
+            "offset": "integer",
+            "cursor": "string"
         },
         output_schema={
             "success": "boolean",
             "workflows": "array",
-            "total": "integer"
+            "total": "integer",
+            "next_cursor": "string"
         }
     )
     
@@ -6,12 +6,70 @@ from .llm import (
     LLMClient,
     call_llm,
     stream_llm,
+    acall_llm,
+    astream_llm,
     llm_client,
+    response_cache,
+    rate_limiter,
+)
+from .cache import (
+    ResponseCache,
+    MemoryResponseCache,
+    SQLiteResponseCache,
+    RedisResponseCache,
+    create_response_cache,
+)
+from .ratelimit import (
+    RateLimit,
+    RateLimiter,
+    RedisRateLimiter,
+    create_rate_limiter,
+)
+from .batching import (
+    MicroBatcher,
+    BatchBackend,
+    LocalBatchBackend,
+    LLMBatcher,
+    create_batch_backend,
+    get_llm_batcher,
+)
+from .admission import (
+    AdmissionRejected,
+    AdmissionController,
+    create_admission_controller,
+)
+from .metrics import (
+    MetricsRegistry,
+    metrics,
 )
 
 __all__ = [
     "LLMClient",
     "call_llm", 
     "stream_llm",
+    "acall_llm",
+    "astream_llm",
     "llm_client",
+    "response_cache",
+    "rate_limiter",
+    "ResponseCache",
+    "MemoryResponseCache",
+    "SQLiteResponseCache",
+    "RedisResponseCache",
+    "create_response_cache",
+    "RateLimit",
+    "RateLimiter",
+    "RedisRateLimiter",
+    "create_rate_limiter",
+    "MicroBatcher",
+    "BatchBackend",
+    "LocalBatchBackend",
+    "LLMBatcher",
+    "create_batch_backend",
+    "get_llm_batcher",
+    "AdmissionRejected",
+    "AdmissionController",
+    "create_admission_controller",
+    "MetricsRegistry",
+    "metrics",
 ]
@@ -0,0 +1,116 @@
+"""
+Contrôle d'admission pour Nümtema Agents Studio
+
+Limite le nombre d'opérations longues exécutées simultanément (ex: les
+exécutions synchrones de l'API, dont le client attend le résultat) et la
+profondeur de la file d'attente: au-delà, les demandes sont refusées
+immédiatement plutôt que d'affamer les autres clients.
+"""
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, Optional
+
+
+class AdmissionRejected(Exception):
+    """Demande refusée: `status_code` 429 (file pleine) ou 503 (attente trop longue)"""
+
+    def __init__(self, message: str, status_code: int, retry_after: float):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Au plus `max_running` opérations simultanées et `max_queued` en attente.
+
+    Une demande qui ne trouve pas de place attend au plus `queue_timeout`
+    secondes. À utiliser depuis une seule boucle d'événements.
+    """
+
+    def __init__(
+        self,
+        max_running: int = 8,
+        max_queued: int = 32,
+        queue_timeout: float = 30.0,
+        retry_after: float = 5.0
+    ):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.running = 0
+        self.queued = 0
+        self.rejected = 0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Créé à la première utilisation, dans la boucle de l'application
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_running)
+        return self._semaphore
+
+    async def acquire(self) -> None:
+        """Réserve une place; lève AdmissionRejected si saturé"""
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.queued >= self.max_queued:
+            self.rejected += 1
+            raise AdmissionRejected(
+                "Trop de requêtes en attente, réessayez plus tard",
+                status_code=429,
+                retry_after=self.retry_after
+            )
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise AdmissionRejected(
+                f"Aucune place libérée en {self.queue_timeout:g}s, service saturé",
+                status_code=503,
+                retry_after=self.retry_after
+            )
+        finally:
+            self.queued -= 1
+        self.running += 1
+
+    def release(self) -> None:
+        """Libère une place réservée par `acquire`"""
+        self.running -= 1
+        self._get_semaphore().release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+        }
+
+
+def create_admission_controller(prefix: str) -> AdmissionController:
+    """Crée un contrôleur configuré par les variables `<prefix>_MAX_CONCURRENCY`,
+    `<prefix>_MAX_QUEUE` et `<prefix>_QUEUE_TIMEOUT`"""
+    return AdmissionController(
+        max_running=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", "8")),
+        max_queued=int(os.getenv(f"{prefix}_MAX_QUEUE", "32")),
+        queue_timeout=float(os.getenv(f"{prefix}_QUEUE_TIMEOUT", "30")),
+    )
+
+
+__all__ = [
+    "AdmissionRejected",
+    "AdmissionController",
+    "create_admission_controller",
+]
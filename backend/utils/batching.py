@@ -0,0 +1,432 @@
+"""
+Batching des appels LLM
+
+- MicroBatcher: regroupe les requêtes concurrentes en lots (taille maximale,
+  temps d'attente maximal) avant de les confier à un handler.
+- Backends de lot:
+    - RealtimeBatchBackend: appels unitaires classiques, concurrence bornée
+      (passe par le rate limiter et le cache de LLMClient)
+    - OpenAIBatchBackend / AnthropicBatchBackend: API batch hors ligne des
+      providers (coût réduit, latence de plusieurs minutes à 24h)
+    - LocalBatchBackend: substitut local pour les tests et le développement
+- LLMBatcher: `await batcher.acall(prompt, ...)` comme `acall_llm`, les appels
+  simultanés étant envoyés au backend par lots.
+
+Configuration (env):
+    LLM_BATCH_MODE=realtime|offline|local
+    LLM_BATCH_MAX_SIZE, LLM_BATCH_MAX_LINGER (secondes)
+    LLM_BATCH_CONCURRENCY (mode realtime), LLM_BATCH_POLL_INTERVAL (mode offline)
+"""
+
+import asyncio
+import json
+import os
+import weakref
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from models import LLMProvider
+from .llm import AnthropicClient, LLMClient, OpenAIClient
+
+
+LLM_BATCH_MODE = os.getenv("LLM_BATCH_MODE", "realtime")
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "32"))
+LLM_BATCH_MAX_LINGER = float(os.getenv("LLM_BATCH_MAX_LINGER", "0.05"))
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "8"))
+LLM_BATCH_POLL_INTERVAL = float(os.getenv("LLM_BATCH_POLL_INTERVAL", "30"))
+
+
+class BatchItemError(Exception):
+    """Échec d'une requête individuelle dans un lot"""
+
+
+class BatchRequest:
+    """Requête LLM en attente dans un lot"""
+
+    __slots__ = ("prompt", "model", "temperature", "max_tokens", "system_prompt", "response_format", "use_cache")
+
+    def __init__(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None,
+        use_cache: bool = False
+    ):
+        self.prompt = prompt
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.system_prompt = system_prompt
+        self.response_format = response_format
+        # Cache de réponses de LLMClient (backend realtime), sur demande comme pour acall_llm
+        self.use_cache = use_cache
+
+
+# =============================================================================
+# MICRO-BATCHING
+# =============================================================================
+
+class _BatchState:
+    """Lot en cours de constitution pour une boucle d'événements"""
+
+    def __init__(self):
+        self.pending: List[tuple] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks: set = set()
+
+
+class MicroBatcher:
+    """Regroupe les soumissions concurrentes en lots.
+
+    Un lot part dès qu'il atteint `max_batch_size` éléments, ou `max_linger`
+    secondes après sa première soumission. `handler(items)` retourne un
+    résultat par item; un résultat de type exception n'échoue que son item.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = LLM_BATCH_MAX_SIZE,
+        max_linger: float = LLM_BATCH_MAX_LINGER
+    ):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_linger = max_linger
+        self.batches = 0
+        self.items = 0
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _BatchState]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _state(self, loop: asyncio.AbstractEventLoop) -> _BatchState:
+        state = self._states.get(loop)
+        if state is None:
+            state = _BatchState()
+            self._states[loop] = state
+        return state
+
+    async def submit(self, item: Any) -> Any:
+        """Ajoute un item au lot courant et attend son résultat"""
+        loop = asyncio.get_running_loop()
+        state = self._state(loop)
+        future = loop.create_future()
+        state.pending.append((item, future))
+
+        if len(state.pending) >= self.max_batch_size:
+            self._flush(loop, state)
+        elif state.timer is None:
+            state.timer = loop.call_later(self.max_linger, self._flush, loop, state)
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop, state: _BatchState) -> None:
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        batch, state.pending = state.pending, []
+        if not batch:
+            return
+        task = loop.create_task(self._dispatch(batch))
+        state.tasks.add(task)
+        task.add_done_callback(state.tasks.discard)
+
+    async def _dispatch(self, batch: List[tuple]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise BatchItemError(
+                    f"{len(results)} résultats reçus pour un lot de {len(batch)} requêtes"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # Appelant annulé
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_linger": self.max_linger,
+        }
+
+
+# =============================================================================
+# BACKENDS
+# =============================================================================
+
+class BatchBackend(ABC):
+    """Exécute un lot de requêtes; retourne un texte (ou une exception) par requête"""
+
+    @abstractmethod
+    async def run(self, requests: List[BatchRequest]) -> List[Any]:
+        pass
+
+
+class RealtimeBatchBackend(BatchBackend):
+    """Appels unitaires en parallèle, au plus `max_concurrency` à la fois.
+
+    La borne est globale au backend (un sémaphore par boucle d'événements),
+    pas propre à chaque lot: des lots simultanés se la partagent. Les
+    réponses passent par le cache de LLMClient si la requête le demande
+    (`use_cache`).
+    """
+
+    def __init__(self, client: LLMClient, max_concurrency: int = LLM_BATCH_CONCURRENCY):
+        self.client = client
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def run(self, requests: List[BatchRequest]) -> List[Any]:
+        semaphore = self._semaphore()
+
+        async def call(request: BatchRequest) -> str:
+            async with semaphore:
+                return await self.client.acall(
+                    request.prompt,
+                    model=request.model,
+                    temperature=request.temperature,
+                    max_tokens=request.max_tokens,
+                    system_prompt=request.system_prompt,
+                    use_cache=request.use_cache,
+                    response_format=request.response_format
+                )
+
+        return await asyncio.gather(*(call(request) for request in requests), return_exceptions=True)
+
+
+class LocalBatchBackend(BatchBackend):
+    """Substitut local d'une API batch: `responder(request)` produit chaque réponse.
+
+    Les tailles des lots reçus sont conservées dans `batches`.
+    """
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[BatchRequest], str]] = None,
+        latency: float = 0.0
+    ):
+        self.responder = responder or (lambda request: request.prompt)
+        self.latency = latency
+        self.batches: List[int] = []
+
+    async def run(self, requests: List[BatchRequest]) -> List[Any]:
+        self.batches.append(len(requests))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        results: List[Any] = []
+        for request in requests:
+            try:
+                results.append(self.responder(request))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """API Batch d'OpenAI (fichier JSONL, fenêtre de complétion de 24h)"""
+
+    TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(self, poll_interval: float = LLM_BATCH_POLL_INTERVAL, completion_window: str = "24h"):
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    async def run(self, requests: List[BatchRequest]) -> List[Any]:
+        provider_client = LLMClient(LLMProvider.OPENAI).client
+        client = provider_client._async_client()
+
+        lines = []
+        for index, request in enumerate(requests):
+            lines.append(json.dumps({
+                "custom_id": str(index),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": request.model or provider_client.default_model,
+                    "messages": OpenAIClient._messages(request.prompt, request.system_prompt),
+                    "temperature": request.temperature,
+                    "max_tokens": request.max_tokens,
+                    **OpenAIClient._response_format(request.response_format),
+                },
+            }))
+        input_file = await client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode("utf-8")),
+            purpose="batch"
+        )
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=self.completion_window
+        )
+        while batch.status not in self.TERMINAL_STATUSES:
+            await asyncio.sleep(self.poll_interval)
+            batch = await client.batches.retrieve(batch.id)
+
+        results: List[Any] = [
+            BatchItemError(f"Lot OpenAI {batch.id} terminé ({batch.status}) sans réponse")
+            for _ in requests
+        ]
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await client.files.content(file_id)
+            for line in content.text.splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    results[int(entry["custom_id"])] = self._entry_result(entry)
+        return results
+
+    @staticmethod
+    def _entry_result(entry: Dict) -> Any:
+        response = entry.get("response") or {}
+        if entry.get("error") or response.get("status_code", 200) != 200:
+            return BatchItemError(str(entry.get("error") or response.get("body")))
+        return response["body"]["choices"][0]["message"]["content"]
+
+
+class AnthropicBatchBackend(BatchBackend):
+    """API Message Batches d'Anthropic"""
+
+    def __init__(self, poll_interval: float = LLM_BATCH_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+
+    async def run(self, requests: List[BatchRequest]) -> List[Any]:
+        provider_client = LLMClient(LLMProvider.ANTHROPIC).client
+        client = provider_client._async_client()
+
+        batch_requests = []
+        for index, request in enumerate(requests):
+            # Pas de mode JSON natif: la consigne de format du prompt s'applique
+            params = {
+                "model": request.model or provider_client.default_model,
+                "max_tokens": request.max_tokens,
+                "temperature": request.temperature,
+                "messages": [{"role": "user", "content": request.prompt}],
+            }
+            if request.system_prompt:
+                params["system"] = AnthropicClient._system(request.system_prompt)
+            batch_requests.append({"custom_id": str(index), "params": params})
+
+        batch = await client.messages.batches.create(requests=batch_requests)
+        while batch.processing_status != "ended":
+            await asyncio.sleep(self.poll_interval)
+            batch = await client.messages.batches.retrieve(batch.id)
+
+        results: List[Any] = [
+            BatchItemError(f"Lot Anthropic {batch.id} terminé sans réponse") for _ in requests
+        ]
+        async for entry in await client.messages.batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                results[int(entry.custom_id)] = entry.result.message.content[0].text
+            else:
+                results[int(entry.custom_id)] = BatchItemError(
+                    f"Requête {entry.custom_id}: {entry.result.type}"
+                )
+        return results
+
+
+# =============================================================================
+# BATCHER LLM
+# =============================================================================
+
+class LLMBatcher:
+    """Interface `acall` dont les appels simultanés partent par lots"""
+
+    def __init__(
+        self,
+        backend: BatchBackend,
+        max_batch_size: int = LLM_BATCH_MAX_SIZE,
+        max_linger: float = LLM_BATCH_MAX_LINGER
+    ):
+        self.backend = backend
+        self._batcher = MicroBatcher(backend.run, max_batch_size, max_linger)
+
+    async def acall(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None,
+        use_cache: bool = False
+    ) -> str:
+        return await self._batcher.submit(
+            BatchRequest(prompt, model, temperature, max_tokens, system_prompt, response_format, use_cache)
+        )
+
+    async def amap(self, prompts: List[str], **kwargs) -> List[str]:
+        """Soumet plusieurs prompts d'un coup (résultats dans l'ordre)"""
+        return await asyncio.gather(*(self.acall(prompt, **kwargs) for prompt in prompts))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._batcher.stats()
+
+
+def create_batch_backend(provider: LLMProvider, mode: Optional[str] = None) -> BatchBackend:
+    """Crée le backend de lot configuré (LLM_BATCH_MODE)"""
+    mode = mode or LLM_BATCH_MODE
+    if mode == "local":
+        return LocalBatchBackend()
+    if mode == "offline":
+        if provider == LLMProvider.OPENAI:
+            return OpenAIBatchBackend()
+        if provider == LLMProvider.ANTHROPIC:
+            return AnthropicBatchBackend()
+        raise ValueError(f"Pas d'API batch hors ligne pour le provider: {provider.value}")
+    if mode == "realtime":
+        return RealtimeBatchBackend(LLMClient(provider))
+    raise ValueError(f"Mode de batching inconnu: {mode}")
+
+
+# Batchers partagés, un par provider
+llm_batchers: Dict[LLMProvider, LLMBatcher] = {}
+
+
+def get_llm_batcher(provider: LLMProvider = LLMProvider.OPENAI) -> LLMBatcher:
+    """Retourne (en le créant au besoin) le batcher partagé d'un provider"""
+    batcher = llm_batchers.get(provider)
+    if batcher is None:
+        batcher = LLMBatcher(create_batch_backend(provider))
+        llm_batchers[provider] = batcher
+    return batcher
+
+
+__all__ = [
+    "BatchItemError",
+    "BatchRequest",
+    "MicroBatcher",
+    "BatchBackend",
+    "RealtimeBatchBackend",
+    "LocalBatchBackend",
+    "OpenAIBatchBackend",
+    "AnthropicBatchBackend",
+    "LLMBatcher",
+    "create_batch_backend",
+    "get_llm_batcher",
+    "llm_batchers",
+]
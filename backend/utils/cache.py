@@ -0,0 +1,337 @@
+"""
+Cache de réponses LLM pour Nümtema Agents Studio
+
+Cache adressé par contenu: la clé est un hash SHA-256 de
+(provider, model, system_prompt, prompt, temperature, max_tokens[, response_format]).
+
+Backends disponibles:
+- memory: LRU en mémoire borné en octets
+- sqlite: fichier partagé entre workers (mode WAL)
+- redis: partagé entre machines (REDIS_URL)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+
+def make_cache_key(
+    provider: str,
+    model: Optional[str],
+    system_prompt: Optional[str],
+    prompt: str,
+    temperature: float,
+    max_tokens: int,
+    response_format: Optional[Dict[str, Any]] = None
+) -> str:
+    """Calcule la clé de cache d'un appel LLM"""
+    parts = [provider, model, system_prompt, prompt, temperature, max_tokens]
+    if response_format:
+        parts.append(response_format)  # Sans mode JSON, les clés existantes restent valides
+    payload = json.dumps(parts, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Interface de base pour les caches de réponses"""
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # get() est appelé depuis la boucle et depuis des threads (aget, batchs)
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    def get(self, key: str) -> Optional[str]:
+        """Récupère une réponse (None si absente ou expirée)"""
+        value = self._get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """Stocke une réponse (ttl en secondes, défaut: ttl du cache)"""
+        self._set(key, value, ttl if ttl is not None else self.ttl)
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs hit/miss"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "backend": type(self).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+
+class MemoryResponseCache(ResponseCache):
+    """Cache LRU en mémoire borné par la taille totale des réponses"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = None):
+        super().__init__(ttl)
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[str, Optional[float], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.size_bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= previous[2]
+            self._entries[key] = (value, expires_at, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size_bytes -= entry[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    async def aget(self, key: str) -> Optional[str]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self.set(key, value, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats.update({
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            })
+        return stats
+
+
+class SQLiteResponseCache(ResponseCache):
+    """Cache sur disque (SQLite en mode WAL) partagé entre les workers d'une machine"""
+
+    def __init__(
+        self,
+        path: str = "data/llm_cache.db",
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        super().__init__(ttl)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Une connexion par thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key: str) -> Optional[str]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return value
+
+    def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, size, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value.encode("utf-8")), now + ttl if ttl else None, now)
+        )
+        conn.execute(
+            "DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        )
+        if self.max_bytes is not None:
+            self._evict(conn)
+        conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de max_bytes"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM llm_cache ORDER BY accessed_at"
+        ):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+
+    def delete(self, key: str) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        conn.commit()
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        entries, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+        stats.update({"entries": entries, "size_bytes": size, "max_bytes": self.max_bytes})
+        return stats
+
+
+class RedisResponseCache(ResponseCache):
+    """Cache Redis (TTL natif; l'éviction LRU dépend de maxmemory-policy)"""
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        ttl: Optional[float] = None,
+        prefix: str = "numtema:llm:"
+    ):
+        super().__init__(ttl)
+        import redis
+        self.client = redis.Redis.from_url(
+            url or os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            decode_responses=True
+        )
+        self.prefix = prefix
+
+    def _get(self, key: str) -> Optional[str]:
+        return self.client.get(self.prefix + key)
+
+    def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        self.client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_response_cache(backend: Optional[str] = None) -> Optional[ResponseCache]:
+    """Crée le cache configuré par LLM_CACHE_BACKEND (memory, sqlite, redis, none)"""
+    backend = (backend or os.getenv("LLM_CACHE_BACKEND", "memory")).lower()
+    ttl = float(os.getenv("LLM_CACHE_TTL", "86400")) or None
+    max_bytes = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return MemoryResponseCache(max_bytes=max_bytes, ttl=ttl)
+    if backend == "sqlite":
+        return SQLiteResponseCache(
+            path=os.getenv("LLM_CACHE_PATH", "data/llm_cache.db"),
+            max_bytes=max_bytes,
+            ttl=ttl
+        )
+    if backend == "redis":
+        return RedisResponseCache(ttl=ttl)
+    raise ValueError(f"Backend de cache inconnu: {backend}")
+
+
+__all__ = [
+    "make_cache_key",
+    "ResponseCache",
+    "MemoryResponseCache",
+    "SQLiteResponseCache",
+    "RedisResponseCache",
+    "create_response_cache",
+]
@@ -0,0 +1,332 @@
+"""
+Bus d'événements d'exécution pour Nümtema Agents Studio
+
+Pub/sub utilisé par le moteur de workflows pour publier la progression des
+exécutions, et par l'API pour les streamer (SSE / WebSocket). Les derniers
+événements de chaque exécution sont conservés pour qu'un abonné tardif
+reçoive l'historique.
+- memory: par processus (API et workers dans le même processus)
+- redis: partagé entre l'API et les workers séparés (REDIS_URL)
+
+Un abonné peut fournir `check`, appelé quand aucun événement n'arrive:
+l'API y relit le dépôt d'exécutions pour ne pas attendre indéfiniment une
+exécution terminée dont les événements ne lui parviennent pas.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+
+# Types d'événements
+EXECUTION_STARTED = "execution_started"
+EXECUTION_FINISHED = "execution_finished"
+NODE_STARTED = "node_started"
+NODE_FINISHED = "node_finished"
+NODE_FAILED = "node_failed"
+NODE_RETRY = "node_retry"
+LIMIT_REACHED = "limit_reached"
+TRANSITION = "transition"
+TOKEN = "token"
+PARTIAL_OUTPUT = "partial_output"
+PROMPT_TRIMMED = "prompt_trimmed"
+MERGE_CONFLICT = "merge_conflict"
+
+TERMINAL_EVENTS = {EXECUTION_FINISHED}
+
+# Silence (secondes) après lequel un abonné appelle son `check`
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "2"))
+
+# Durée de conservation de l'historique d'une exécution dans Redis
+EVENTS_HISTORY_TTL = int(os.getenv("EVENTS_HISTORY_TTL", "86400"))
+
+EventCheck = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class EventBus:
+    """Bus d'événements par exécution, utilisable depuis n'importe quel thread"""
+
+    def __init__(
+        self,
+        history_size: int = 1000,
+        max_executions: int = 1000,
+        queue_size: int = 1000
+    ):
+        self.history_size = history_size
+        self.max_executions = max_executions
+        self.queue_size = queue_size
+        self._history: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        self._closed: set = set()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, execution_id: str, event_type: str, **data) -> Dict[str, Any]:
+        """Publie un événement pour une exécution"""
+        event = {
+            "type": event_type,
+            "execution_id": execution_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            **data
+        }
+        with self._lock:
+            history = self._history.get(execution_id)
+            if history is None:
+                history = self._history[execution_id] = deque(maxlen=self.history_size)
+                while len(self._history) > self.max_executions:
+                    evicted, _ = self._history.popitem(last=False)
+                    self._closed.discard(evicted)
+            history.append(event)
+            if event_type in TERMINAL_EVENTS:
+                self._closed.add(execution_id)
+            subscribers = list(self._subscribers.get(execution_id, []))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                pass  # Boucle fermée: l'abonné a disparu
+        return event
+
+    def _offer(self, queue: asyncio.Queue, event: Dict[str, Any]) -> None:
+        """Ajoute un événement; un abonné trop lent perd les plus anciens"""
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def history(self, execution_id: str) -> List[Dict[str, Any]]:
+        """Événements conservés pour une exécution"""
+        with self._lock:
+            return list(self._history.get(execution_id, []))
+
+    def is_closed(self, execution_id: str) -> bool:
+        return execution_id in self._closed
+
+    async def subscribe(
+        self,
+        execution_id: str,
+        check: Optional[EventCheck] = None,
+        poll_interval: float = EVENTS_POLL_INTERVAL
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Itère sur l'historique puis les événements en direct jusqu'à la fin de l'exécution.
+
+        Sans historique, puis après chaque silence de `poll_interval`,
+        `check()` peut retourner l'événement final à émettre.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            backlog = list(self._history.get(execution_id, []))
+            closed = execution_id in self._closed
+            if not closed:
+                self._subscribers.setdefault(execution_id, []).append((loop, queue))
+
+        try:
+            for event in backlog:
+                yield event
+            if closed:
+                return
+            final = await check() if check is not None and not backlog else None
+            while final is None:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), poll_interval if check is not None else None
+                    )
+                except asyncio.TimeoutError:
+                    final = await check()
+                    continue
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+            yield final
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(execution_id, [])
+                if (loop, queue) in subscribers:
+                    subscribers.remove((loop, queue))
+                if not subscribers:
+                    self._subscribers.pop(execution_id, None)
+
+
+# Ajoute l'événement à l'historique borné et le diffuse, préfixé d'un numéro
+# de séquence qui permet aux abonnés d'écarter les doublons historique/direct
+_REDIS_PUBLISH = """
+local seq = redis.call('INCR', KEYS[2])
+local payload = seq .. '|' .. ARGV[1]
+redis.call('RPUSH', KEYS[1], payload)
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+redis.call('PUBLISH', KEYS[3], payload)
+return seq
+"""
+
+
+def _decode_event(payload: str) -> Tuple[int, Dict[str, Any]]:
+    seq, data = payload.split("|", 1)
+    return int(seq), json.loads(data)
+
+
+class RedisEventBus(EventBus):
+    """Bus partagé via Redis: historique en liste, direct en pub/sub.
+
+    `publish` ne bloque pas l'appelant (boucle d'événements ou thread d'un
+    node): les événements sont écrits par un thread dédié, en pipeline.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        history_size: int = 1000,
+        prefix: str = "numtema:events",
+        ttl: int = EVENTS_HISTORY_TTL
+    ):
+        super().__init__(history_size=history_size)
+        import redis
+        self.url = url or os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        self.client = redis.Redis.from_url(self.url, decode_responses=True)
+        self.prefix = prefix
+        self.ttl = ttl
+        self._publish = self.client.register_script(_REDIS_PUBLISH)
+        self._pending: "queue.SimpleQueue[Tuple[str, str]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+    def _keys(self, execution_id: str) -> List[str]:
+        base = f"{self.prefix}:{execution_id}"
+        return [f"{base}:history", f"{base}:seq", f"{base}:live"]
+
+    def publish(self, execution_id: str, event_type: str, **data) -> Dict[str, Any]:
+        event = {
+            "type": event_type,
+            "execution_id": execution_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            **data
+        }
+        self._pending.put((execution_id, json.dumps(event, default=str)))
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, daemon=True)
+                self._writer.start()
+        return event
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._pending.get()]
+            while not self._pending.empty() and len(batch) < 256:
+                batch.append(self._pending.get_nowait())
+            pipe = self.client.pipeline(transaction=False)
+            for execution_id, payload in batch:
+                self._publish(
+                    keys=self._keys(execution_id),
+                    args=[payload, self.history_size, self.ttl],
+                    client=pipe
+                )
+            try:
+                pipe.execute()
+            except Exception:
+                time.sleep(1)  # Redis indisponible: ces événements sont perdus
+
+    def history(self, execution_id: str) -> List[Dict[str, Any]]:
+        payloads = self.client.lrange(self._keys(execution_id)[0], 0, -1)
+        return [_decode_event(payload)[1] for payload in payloads]
+
+    def is_closed(self, execution_id: str) -> bool:
+        history = self.history(execution_id)
+        return bool(history) and history[-1]["type"] in TERMINAL_EVENTS
+
+    async def subscribe(
+        self,
+        execution_id: str,
+        check: Optional[EventCheck] = None,
+        poll_interval: float = EVENTS_POLL_INTERVAL
+    ) -> AsyncIterator[Dict[str, Any]]:
+        import redis.asyncio as aioredis
+        history_key, _, live_key = self._keys(execution_id)
+        client = aioredis.Redis.from_url(self.url, decode_responses=True)
+        pubsub = client.pubsub()
+        try:
+            # Abonnement avant la lecture de l'historique: rien n'est manqué
+            await pubsub.subscribe(live_key)
+            last = 0
+            backlog = await client.lrange(history_key, 0, -1)
+            for payload in backlog:
+                last, event = _decode_event(payload)
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+            final = await check() if check is not None and not backlog else None
+            checked_at = time.monotonic()
+            while final is None:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=poll_interval
+                )
+                if message is None:
+                    if check is not None and time.monotonic() - checked_at >= poll_interval:
+                        final = await check()
+                        checked_at = time.monotonic()
+                    continue
+                seq, event = _decode_event(message["data"])
+                if seq <= last:
+                    continue
+                last = seq
+                checked_at = time.monotonic()
+                yield event
+                if event["type"] in TERMINAL_EVENTS:
+                    return
+            yield final
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+def create_event_bus(backend: Optional[str] = None) -> EventBus:
+    """Crée le bus configuré par EVENT_BUS_BACKEND (memory, redis)"""
+    backend = (backend or os.getenv("EVENT_BUS_BACKEND", "memory")).lower()
+    if backend == "memory":
+        return EventBus()
+    if backend == "redis":
+        return RedisEventBus()
+    raise ValueError(f"Backend de bus d'événements inconnu: {backend}")
+
+
+# Bus global
+event_bus = create_event_bus()
+
+
+# Émetteur de l'exécution en cours: `sink(event_type, **data)`, positionné par
+# le moteur de workflows (hérité par les tâches asyncio et asyncio.to_thread)
+event_sink: ContextVar[Optional[Callable[..., Any]]] = ContextVar("event_sink", default=None)
+
+
+def emit_event(event_type: str, **data) -> None:
+    """Publie un événement pour l'exécution en cours (sans effet hors exécution)"""
+    sink = event_sink.get()
+    if sink is not None:
+        sink(event_type, **data)
+
+
+__all__ = [
+    "EventBus",
+    "RedisEventBus",
+    "create_event_bus",
+    "event_bus",
+    "event_sink",
+    "emit_event",
+    "EXECUTION_STARTED",
+    "EXECUTION_FINISHED",
+    "NODE_STARTED",
+    "NODE_FINISHED",
+    "NODE_FAILED",
+    "NODE_RETRY",
+    "LIMIT_REACHED",
+    "TRANSITION",
+    "TOKEN",
+    "PARTIAL_OUTPUT",
+    "MERGE_CONFLICT",
+]
@@ -5,16 +5,198 @@ Abstraction simple pour interagir avec différents fournisseurs LLM
 sans dépendance à des frameworks lourds.
 """
 
+import asyncio
+import concurrent.futures
 import os
-from typing import Optional, Generator, Dict, Any, List
-from functools import lru_cache
+import threading
+import time
+import weakref
+from contextvars import ContextVar
+from typing import Optional, Generator, AsyncGenerator, Dict, Any, List, Mapping, Tuple
 from abc import ABC, abstractmethod
 
 from models import LLMProvider
+from .cache import ResponseCache, make_cache_key, create_response_cache
+from .ratelimit import RateLimiter, create_rate_limiter, estimate_tokens
+from .metrics import metrics, model_label, LLM_REQUEST_DURATION, LLM_TOKENS
+
+
+# Pool de connexions HTTP partagé par les clients asynchrones
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+# Chunks d'un stream synchrone relayé par astream gardés en attente du consommateur
+LLM_STREAM_BUFFER = int(os.getenv("LLM_STREAM_BUFFER", "64"))
+
+# Marque le prompt système comme préfixe cacheable (cache_control Anthropic)
+ANTHROPIC_PROMPT_CACHING = os.getenv("ANTHROPIC_PROMPT_CACHING", "true").lower() in ("1", "true", "yes")
+
+
+# Informations de la réponse en cours (en-têtes, tokens consommés), remplies
+# par les providers qui les exposent et lues par LLMClient
+_response_info: ContextVar[Optional[Dict[str, Any]]] = ContextVar("llm_response_info", default=None)
+
+
+def report_response(
+    headers: Optional[Mapping[str, str]] = None,
+    total_tokens: Optional[int] = None,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+    cached_tokens: Optional[int] = None
+) -> None:
+    """Transmet à LLMClient les en-têtes et la consommation d'une réponse.
+
+    `cached_tokens`: tokens d'entrée servis par le cache de préfixe du provider.
+    """
+    info = _response_info.get()
+    if info is None:
+        return
+    if headers is not None:
+        info["headers"] = headers
+    if total_tokens is not None:
+        info["total_tokens"] = total_tokens
+    if prompt_tokens is not None:
+        info["prompt_tokens"] = prompt_tokens
+    if completion_tokens is not None:
+        info["completion_tokens"] = completion_tokens
+    if cached_tokens is not None:
+        info["cached_tokens"] = cached_tokens
+
+
+class TokenUsage:
+    """Tokens consommés par les appels LLM d'une exécution (tous threads confondus).
+
+    Un compteur d'étape (`parent` = compteur de l'exécution) reporte aussi
+    chaque appel sur son parent.
+    """
+    
+    __slots__ = ("total", "calls", "prompt_tokens", "completion_tokens", "latency_ms", "parent", "_lock")
+    
+    def __init__(self, parent: Optional["TokenUsage"] = None):
+        self.total = 0
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latency_ms = 0.0
+        self.parent = parent
+        self._lock = threading.Lock()
+    
+    def add(
+        self,
+        tokens: int,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency_ms: float = 0.0
+    ) -> None:
+        with self._lock:
+            self.total += tokens
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.latency_ms += latency_ms
+        if self.parent is not None:
+            self.parent.add(tokens, prompt_tokens, completion_tokens, latency_ms)
+
+
+# Compteur de l'exécution en cours, positionné par le moteur de workflows
+token_usage: ContextVar[Optional[TokenUsage]] = ContextVar("llm_token_usage", default=None)
+
+
+def record_usage(
+    tokens: int,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    latency_ms: float = 0.0
+) -> None:
+    """Ajoute un appel (tokens, latence du provider) au compteur en cours"""
+    usage = token_usage.get()
+    if usage is not None:
+        usage.add(tokens, prompt_tokens, completion_tokens, latency_ms)
+
+
+def create_async_http_client():
+    """Crée un httpx.AsyncClient keep-alive avec un pool de connexions borné"""
+    import httpx
+    return httpx.AsyncClient(
+        timeout=LLM_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS
+        )
+    )
+
+
+# Pool httpx de chaque boucle d'événements, partagé par tous les providers
+_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+_http_clients_lock = threading.Lock()
+
+
+def shared_async_http_client():
+    """Pool httpx de la boucle courante (les connexions sont liées à leur boucle)"""
+    loop = asyncio.get_running_loop()
+    with _http_clients_lock:
+        client = _http_clients.get(loop)
+        if client is None:
+            client = _http_clients[loop] = create_async_http_client()
+    return client
+
+
+async def close_async_clients() -> None:
+    """Ferme le pool httpx de la boucle courante et oublie les clients qui l'utilisent.
+
+    À appeler avant la fin de la boucle (arrêt de l'API, d'un worker):
+    sinon les connexions keep-alive restent ouvertes jusqu'au ramasse-miettes.
+    """
+    loop = asyncio.get_running_loop()
+    with _http_clients_lock:
+        client = _http_clients.pop(loop, None)
+    for provider_client in list(LLMClient._clients.values()):
+        getattr(provider_client, "_async_clients", {}).pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def json_response_format(schema: Optional[Dict[str, Any]] = None, name: str = "output") -> Dict[str, Any]:
+    """Demande de sortie JSON native (schéma JSON optionnel), traduite par chaque provider.
+
+    OpenAI: response_format json_schema / json_object; Google: mime type
+    JSON; Ollama: `format`. Les providers sans mode JSON l'ignorent.
+    """
+    return {"type": "json", "schema": schema, "name": name}
+
+
+def _format_kwargs(response_format: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # Seulement si demandé: les clients sans mode JSON gardent leur signature
+    return {"response_format": response_format} if response_format else {}
 
 
 class BaseLLMClient(ABC):
-    """Interface de base pour les clients LLM"""
+    """Interface de base pour les clients LLM.
+
+    `call`/`stream` sont synchrones; `acall`/`astream` sont leurs équivalents
+    asynchrones. Par défaut ils délèguent la version synchrone à un thread,
+    les providers les surchargent avec leur SDK asynchrone.
+    """
+    
+    def _async_client(self):
+        """Client asynchrone du provider, un par boucle d'événements.
+
+        Les connexions d'un pool httpx sont liées à la boucle qui les a
+        ouvertes: chaque boucle a son pool, partagé par tous les providers
+        (voir `shared_async_http_client` et `close_async_clients`).
+        """
+        if not hasattr(self, "_async_clients"):
+            self._async_clients = weakref.WeakKeyDictionary()
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = self._create_async_client()
+        return client
+    
+    def _create_async_client(self):
+        """Client asynchrone brut: le pool httpx partagé de la boucle"""
+        return shared_async_http_client()
     
     @abstractmethod
     def call(
@@ -23,7 +205,8 @@ class BaseLLMClient(ABC):
         model: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 4096,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> str:
         pass
     
@@ -32,37 +215,176 @@ class BaseLLMClient(ABC):
         self,
         prompt: str,
         model: Optional[str] = None,
-        system_prompt: Optional[str] = None
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> Generator[str, None, None]:
         pass
+    
+    async def acall(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        return await asyncio.to_thread(
+            self.call,
+            prompt,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            system_prompt=system_prompt,
+            **_format_kwargs(response_format)
+        )
+    
+    async def astream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[str, None]:
+        """Relaie le stream synchrone depuis un thread sans bloquer la boucle.
+
+        La file est bornée (LLM_STREAM_BUFFER): le thread attend quand le
+        consommateur prend du retard, et s'arrête s'il abandonne le stream.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=LLM_STREAM_BUFFER)
+        stopped = threading.Event()
+        done = object()
+        
+        def put(item) -> None:
+            if stopped.is_set() or loop.is_closed():
+                return
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=1)
+                except concurrent.futures.TimeoutError:
+                    if stopped.is_set() or loop.is_closed():
+                        future.cancel()
+                        return
+        
+        def produce():
+            try:
+                for chunk in self.stream(
+                    prompt,
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    system_prompt=system_prompt,
+                    **_format_kwargs(response_format)
+                ):
+                    if stopped.is_set():
+                        break
+                    put(chunk)
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+        
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+            while not queue.empty():  # Libère un put en attente
+                queue.get_nowait()
+
+
+def _openai_cached_tokens(usage) -> Optional[int]:
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None)
+
+
+def _anthropic_usage(usage) -> Tuple[int, int, int, Optional[int]]:
+    """(total, prompt, completion, cached): `input_tokens` exclut les tokens lus et écrits en cache"""
+    cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+    cache_creation = getattr(usage, "cache_creation_input_tokens", None) or 0
+    prompt_tokens = usage.input_tokens + cache_read + cache_creation
+    return (
+        prompt_tokens + usage.output_tokens,
+        prompt_tokens,
+        usage.output_tokens,
+        getattr(usage, "cache_read_input_tokens", None)
+    )
 
 
 class OpenAIClient(BaseLLMClient):
-    """Client OpenAI"""
+    """Client OpenAI.
+
+    Le cache de préfixe d'OpenAI est automatique: le prompt système
+    (statique) est toujours placé en premier message.
+    """
     
     def __init__(self):
         from openai import OpenAI
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.default_model = "gpt-4o"
     
+    def _create_async_client(self):
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=shared_async_http_client()
+        )
+    
+    @staticmethod
+    def _response_format(response_format: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not response_format:
+            return {}
+        if response_format.get("schema"):
+            return {"response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": response_format["name"], "schema": response_format["schema"]}
+            }}
+        return {"response_format": {"type": "json_object"}}
+    
+    @staticmethod
+    def _messages(prompt: str, system_prompt: Optional[str]) -> List[Dict[str, str]]:
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
     def call(
         self,
         prompt: str,
         model: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 4096,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> str:
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
-        
-        response = self.client.chat.completions.create(
+        raw = self.client.chat.completions.with_raw_response.create(
             model=model or self.default_model,
-            messages=messages,
+            messages=self._messages(prompt, system_prompt),
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            **self._response_format(response_format)
+        )
+        response = raw.parse()
+        usage = response.usage
+        report_response(
+            raw.headers,
+            usage.total_tokens if usage else None,
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else None,
+            _openai_cached_tokens(usage)
         )
         return response.choices[0].message.content
     
@@ -70,68 +392,191 @@ class OpenAIClient(BaseLLMClient):
         self,
         prompt: str,
         model: Optional[str] = None,
-        system_prompt: Optional[str] = None
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> Generator[str, None, None]:
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
-        
         stream = self.client.chat.completions.create(
             model=model or self.default_model,
-            messages=messages,
-            stream=True
+            messages=self._messages(prompt, system_prompt),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **self._response_format(response_format)
         )
         for chunk in stream:
-            if chunk.choices[0].delta.content:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    async def acall(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        raw = await self._async_client().chat.completions.with_raw_response.create(
+            model=model or self.default_model,
+            messages=self._messages(prompt, system_prompt),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **self._response_format(response_format)
+        )
+        response = raw.parse()
+        usage = response.usage
+        report_response(
+            raw.headers,
+            usage.total_tokens if usage else None,
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else None,
+            _openai_cached_tokens(usage)
+        )
+        return response.choices[0].message.content
+    
+    async def astream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[str, None]:
+        stream = await self._async_client().chat.completions.create(
+            model=model or self.default_model,
+            messages=self._messages(prompt, system_prompt),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **self._response_format(response_format)
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
                 yield chunk.choices[0].delta.content
 
 
 class AnthropicClient(BaseLLMClient):
-    """Client Anthropic"""
+    """Client Anthropic.
+
+    Le prompt système est envoyé comme bloc marqué `cache_control`: les
+    appels suivants avec le même préfixe le relisent depuis le cache.
+    """
     
     def __init__(self):
         from anthropic import Anthropic
         self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
         self.default_model = "claude-sonnet-4-20250514"
     
+    def _create_async_client(self):
+        from anthropic import AsyncAnthropic
+        return AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            http_client=shared_async_http_client()
+        )
+    
+    @staticmethod
+    def _system(system_prompt: str) -> Any:
+        """Prompt système, en bloc cacheable si ANTHROPIC_PROMPT_CACHING"""
+        if not ANTHROPIC_PROMPT_CACHING:
+            return system_prompt
+        return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+    
     def call(
         self,
         prompt: str,
         model: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 4096,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> str:
+        # Pas de mode JSON natif: la consigne de format du prompt s'applique
         kwargs = {
             "model": model or self.default_model,
             "max_tokens": max_tokens,
+            "temperature": temperature,
             "messages": [{"role": "user", "content": prompt}]
         }
         if system_prompt:
-            kwargs["system"] = system_prompt
+            kwargs["system"] = self._system(system_prompt)
         
-        response = self.client.messages.create(**kwargs)
+        raw = self.client.messages.with_raw_response.create(**kwargs)
+        response = raw.parse()
+        report_response(raw.headers, *_anthropic_usage(response.usage))
         return response.content[0].text
     
     def stream(
         self,
         prompt: str,
         model: Optional[str] = None,
-        system_prompt: Optional[str] = None
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> Generator[str, None, None]:
+        # Pas de mode JSON natif: la consigne de format du prompt s'applique
         kwargs = {
             "model": model or self.default_model,
-            "max_tokens": 4096,
-            "messages": [{"role": "user", "content": prompt}],
-            "stream": True
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": prompt}]
         }
         if system_prompt:
-            kwargs["system"] = system_prompt
+            kwargs["system"] = self._system(system_prompt)
         
         with self.client.messages.stream(**kwargs) as stream:
             for text in stream.text_stream:
                 yield text
+    
+    async def acall(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        # Pas de mode JSON natif: la consigne de format du prompt s'applique
+        kwargs = {
+            "model": model or self.default_model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        if system_prompt:
+            kwargs["system"] = self._system(system_prompt)
+        
+        raw = await self._async_client().messages.with_raw_response.create(**kwargs)
+        response = raw.parse()
+        report_response(raw.headers, *_anthropic_usage(response.usage))
+        return response.content[0].text
+    
+    async def astream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[str, None]:
+        # Pas de mode JSON natif: la consigne de format du prompt s'applique
+        kwargs = {
+            "model": model or self.default_model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        if system_prompt:
+            kwargs["system"] = self._system(system_prompt)
+        
+        async with self._async_client().messages.stream(**kwargs) as stream:
+            async for text in stream.text_stream:
+                yield text
 
 
 class GoogleClient(BaseLLMClient):
@@ -148,19 +593,23 @@ class GoogleClient(BaseLLMClient):
         model: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 4096,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> str:
         full_prompt = prompt
         if system_prompt:
             full_prompt = f"{system_prompt}\n\n{prompt}"
         
+        config = {
+            "temperature": temperature,
+            "max_output_tokens": max_tokens
+        }
+        if response_format:
+            config["response_mime_type"] = "application/json"
         response = self.client.models.generate_content(
             model=model or self.default_model,
             contents=full_prompt,
-            config={
-                "temperature": temperature,
-                "max_output_tokens": max_tokens
-            }
+            config=config
         )
         return response.text
     
@@ -168,15 +617,72 @@ class GoogleClient(BaseLLMClient):
         self,
         prompt: str,
         model: Optional[str] = None,
-        system_prompt: Optional[str] = None
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> Generator[str, None, None]:
         full_prompt = prompt
         if system_prompt:
             full_prompt = f"{system_prompt}\n\n{prompt}"
         
+        config = {"temperature": temperature, "max_output_tokens": max_tokens}
+        if response_format:
+            config["response_mime_type"] = "application/json"
         for chunk in self.client.models.generate_content_stream(
             model=model or self.default_model,
-            contents=full_prompt
+            contents=full_prompt,
+            config=config
+        ):
+            if chunk.text:
+                yield chunk.text
+    
+    async def acall(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        full_prompt = prompt
+        if system_prompt:
+            full_prompt = f"{system_prompt}\n\n{prompt}"
+        
+        config = {
+            "temperature": temperature,
+            "max_output_tokens": max_tokens
+        }
+        if response_format:
+            config["response_mime_type"] = "application/json"
+        response = await self.client.aio.models.generate_content(
+            model=model or self.default_model,
+            contents=full_prompt,
+            config=config
+        )
+        return response.text
+    
+    async def astream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[str, None]:
+        full_prompt = prompt
+        if system_prompt:
+            full_prompt = f"{system_prompt}\n\n{prompt}"
+        
+        config = {"temperature": temperature, "max_output_tokens": max_tokens}
+        if response_format:
+            config["response_mime_type"] = "application/json"
+        async for chunk in await self.client.aio.models.generate_content_stream(
+            model=model or self.default_model,
+            contents=full_prompt,
+            config=config
         ):
             if chunk.text:
                 yield chunk.text
@@ -191,25 +697,41 @@ class OllamaClient(BaseLLMClient):
         self.client = httpx.Client(timeout=120.0)
         self.default_model = "llama3"
     
-    def call(
+    def _payload(
         self,
         prompt: str,
-        model: Optional[str] = None,
-        temperature: float = 0.7,
-        max_tokens: int = 4096,
-        system_prompt: Optional[str] = None
-    ) -> str:
+        model: Optional[str],
+        system_prompt: Optional[str],
+        stream: bool,
+        options: Optional[Dict[str, Any]] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         payload = {
             "model": model or self.default_model,
             "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": temperature,
-                "num_predict": max_tokens
-            }
+            "stream": stream
         }
+        if options:
+            payload["options"] = options
+        if response_format:
+            payload["format"] = response_format.get("schema") or "json"
         if system_prompt:
             payload["system"] = system_prompt
+        return payload
+    
+    def call(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        payload = self._payload(prompt, model, system_prompt, stream=False, options={
+            "temperature": temperature,
+            "num_predict": max_tokens
+        }, response_format=response_format)
         
         response = self.client.post(
             f"{self.base_url}/api/generate",
@@ -222,15 +744,15 @@ class OllamaClient(BaseLLMClient):
         self,
         prompt: str,
         model: Optional[str] = None,
-        system_prompt: Optional[str] = None
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> Generator[str, None, None]:
-        payload = {
-            "model": model or self.default_model,
-            "prompt": prompt,
-            "stream": True
-        }
-        if system_prompt:
-            payload["system"] = system_prompt
+        payload = self._payload(prompt, model, system_prompt, stream=True, options={
+            "temperature": temperature,
+            "num_predict": max_tokens
+        }, response_format=response_format)
         
         with self.client.stream(
             "POST",
@@ -242,6 +764,71 @@ class OllamaClient(BaseLLMClient):
                 data = json.loads(line)
                 if "response" in data:
                     yield data["response"]
+    
+    async def acall(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        payload = self._payload(prompt, model, system_prompt, stream=False, options={
+            "temperature": temperature,
+            "num_predict": max_tokens
+        }, response_format=response_format)
+        
+        response = await self._async_client().post(
+            f"{self.base_url}/api/generate",
+            json=payload
+        )
+        response.raise_for_status()
+        return response.json()["response"]
+    
+    async def astream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[str, None]:
+        import json
+        payload = self._payload(prompt, model, system_prompt, stream=True, options={
+            "temperature": temperature,
+            "num_predict": max_tokens
+        }, response_format=response_format)
+        
+        async with self._async_client().stream(
+            "POST",
+            f"{self.base_url}/api/generate",
+            json=payload
+        ) as response:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if "response" in data:
+                    yield data["response"]
+
+
+# Cache de réponses partagé (LLM_CACHE_BACKEND: memory, sqlite, redis, none)
+response_cache: Optional[ResponseCache] = create_response_cache()
+
+# Limiteur de débit partagé (LLM_RATE_LIMIT_BACKEND: memory, redis, none)
+rate_limiter: Optional[RateLimiter] = create_rate_limiter()
+
+
+def _cache_stats() -> Dict[str, Any]:
+    return response_cache.stats() if response_cache is not None else {"hits": 0, "misses": 0, "hit_ratio": 0.0}
+
+
+# Compteurs du cache lus au scrape
+metrics.collector("llm_cache_hits_total", "Réponses LLM servies par le cache", lambda: _cache_stats()["hits"], "counter")
+metrics.collector("llm_cache_misses_total", "Réponses LLM absentes du cache", lambda: _cache_stats()["misses"], "counter")
+metrics.collector("llm_cache_hit_ratio", "Part des lectures du cache LLM trouvées", lambda: _cache_stats()["hit_ratio"])
 
 
 class LLMClient:
@@ -249,8 +836,15 @@ class LLMClient:
     
     _clients: Dict[LLMProvider, BaseLLMClient] = {}
     
-    def __init__(self, provider: LLMProvider = LLMProvider.OPENAI):
+    def __init__(
+        self,
+        provider: LLMProvider = LLMProvider.OPENAI,
+        cache: Optional[ResponseCache] = None,
+        limiter: Optional[RateLimiter] = None
+    ):
         self.provider = provider
+        self._cache = cache
+        self._limiter = limiter
         self._ensure_client(provider)
     
     def _ensure_client(self, provider: LLMProvider) -> BaseLLMClient:
@@ -271,43 +865,279 @@ class LLMClient:
     def client(self) -> BaseLLMClient:
         return self._ensure_client(self.provider)
     
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        return self._cache if self._cache is not None else response_cache
+    
+    @property
+    def limiter(self) -> Optional[RateLimiter]:
+        return self._limiter if self._limiter is not None else rate_limiter
+    
+    def _model_name(self, model: Optional[str]) -> Optional[str]:
+        return model or getattr(self.client, "default_model", None)
+    
+    @staticmethod
+    def _reservation(prompt: str, system_prompt: Optional[str], max_tokens: int) -> int:
+        """Tokens réservés avant l'appel (entrée estimée + sortie maximale)"""
+        return estimate_tokens(prompt) + estimate_tokens(system_prompt) + max_tokens
+    
+    def _observe(
+        self,
+        model: Optional[str],
+        reserved: int,
+        info: Dict[str, Any],
+        started: float,
+        error: Optional[Exception] = None
+    ) -> None:
+        """Mesure la latence de l'appel et informe le rate limiter"""
+        info["latency_ms"] = (time.perf_counter() - started) * 1000
+        LLM_REQUEST_DURATION.labels(
+            self.provider.value, model_label(model or "default"), "error" if error is not None else "ok"
+        ).observe(info["latency_ms"] / 1000)
+        limiter = self.limiter
+        if limiter is None:
+            return
+        if error is not None:
+            limiter.observe_error(self.provider.value, model, error)
+        else:
+            limiter.observe(
+                self.provider.value,
+                model,
+                reserved,
+                info.get("total_tokens"),
+                info.get("headers")
+            )
+    
+    def _record_usage(
+        self,
+        model: Optional[str],
+        prompt: str,
+        system_prompt: Optional[str],
+        response: Optional[str],
+        info: Dict[str, Any]
+    ) -> None:
+        """Comptabilise un appel (tokens du provider, sinon estimation)"""
+        prompt_tokens = info.get("prompt_tokens")
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(prompt) + estimate_tokens(system_prompt)
+        completion_tokens = info.get("completion_tokens")
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(response)
+        tokens = info.get("total_tokens")
+        if tokens is None:
+            tokens = prompt_tokens + completion_tokens
+        record_usage(tokens, prompt_tokens, completion_tokens, info.get("latency_ms", 0.0))
+        LLM_TOKENS.labels(self.provider.value, model_label(model or "default"), "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(self.provider.value, model_label(model or "default"), "completion").inc(completion_tokens)
+        if info.get("cached_tokens"):
+            LLM_TOKENS.labels(self.provider.value, model_label(model or "default"), "cached").inc(info["cached_tokens"])
+    
+    def _record_stream(
+        self,
+        model: Optional[str],
+        prompt: str,
+        system_prompt: Optional[str],
+        produced: int,
+        started: float,
+        reserved: int
+    ) -> None:
+        """Comptabilise un stream terminé (tokens estimés sur le texte produit).
+
+        Seule l'entrée est réservée avant un stream: la sortie produite est
+        débitée ensuite du bucket tokens/minute du rate limiter.
+        """
+        info: Dict[str, Any] = {
+            "prompt_tokens": estimate_tokens(prompt) + estimate_tokens(system_prompt),
+            "completion_tokens": (produced + 3) // 4,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+        }
+        LLM_REQUEST_DURATION.labels(self.provider.value, model_label(model or "default"), "ok").observe(info["latency_ms"] / 1000)
+        if self.limiter is not None:
+            self.limiter.observe(
+                self.provider.value, model, reserved, info["prompt_tokens"] + info["completion_tokens"]
+            )
+        self._record_usage(model, prompt, system_prompt, None, info)
+    
+    def _cache_key(
+        self,
+        prompt: str,
+        model: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        system_prompt: Optional[str],
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        return make_cache_key(
+            self.provider.value,
+            model or getattr(self.client, "default_model", None),
+            system_prompt,
+            prompt,
+            temperature,
+            max_tokens,
+            response_format
+        )
+    
     def call(
         self,
         prompt: str,
         model: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 4096,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        use_cache: bool = False,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> str:
-        return self.client.call(
-            prompt=prompt,
-            model=model,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            system_prompt=system_prompt
-        )
+        cache = self.cache if use_cache else None
+        if cache is not None:
+            key = self._cache_key(prompt, model, temperature, max_tokens, system_prompt, response_format)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        
+        model_name = self._model_name(model)
+        reserved = self._reservation(prompt, system_prompt, max_tokens)
+        if self.limiter is not None:
+            self.limiter.acquire(self.provider.value, model_name, reserved)
+        
+        info: Dict[str, Any] = {}
+        token = _response_info.set(info)
+        started = time.perf_counter()
+        try:
+            response = self.client.call(
+                prompt=prompt,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                system_prompt=system_prompt,
+                **_format_kwargs(response_format)
+            )
+        except Exception as e:
+            self._observe(model_name, reserved, info, started, error=e)
+            raise
+        finally:
+            _response_info.reset(token)
+        self._observe(model_name, reserved, info, started)
+        self._record_usage(model_name, prompt, system_prompt, response, info)
+        
+        if cache is not None and response is not None:
+            cache.set(key, response)
+        return response
     
     def stream(
         self,
         prompt: str,
         model: Optional[str] = None,
-        system_prompt: Optional[str] = None
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
     ) -> Generator[str, None, None]:
-        yield from self.client.stream(
-            prompt=prompt,
-            model=model,
-            system_prompt=system_prompt
-        )
+        reserved = estimate_tokens(prompt) + estimate_tokens(system_prompt)
+        if self.limiter is not None:
+            self.limiter.acquire(self.provider.value, self._model_name(model), reserved)
+        produced = 0
+        started = time.perf_counter()
+        try:
+            for chunk in self.client.stream(
+                prompt=prompt,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                system_prompt=system_prompt,
+                **_format_kwargs(response_format)
+            ):
+                produced += len(chunk)
+                yield chunk
+        except Exception as e:
+            self._observe(self._model_name(model), reserved, {}, started, error=e)
+            raise
+        self._record_stream(self._model_name(model), prompt, system_prompt, produced, started, reserved)
+    
+    async def acall(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        use_cache: bool = False,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        cache = self.cache if use_cache else None
+        if cache is not None:
+            key = self._cache_key(prompt, model, temperature, max_tokens, system_prompt, response_format)
+            cached = await cache.aget(key)
+            if cached is not None:
+                return cached
+        
+        model_name = self._model_name(model)
+        reserved = self._reservation(prompt, system_prompt, max_tokens)
+        if self.limiter is not None:
+            await self.limiter.aacquire(self.provider.value, model_name, reserved)
+        
+        info: Dict[str, Any] = {}
+        token = _response_info.set(info)
+        started = time.perf_counter()
+        try:
+            response = await self.client.acall(
+                prompt=prompt,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                system_prompt=system_prompt,
+                **_format_kwargs(response_format)
+            )
+        except Exception as e:
+            self._observe(model_name, reserved, info, started, error=e)
+            raise
+        finally:
+            _response_info.reset(token)
+        self._observe(model_name, reserved, info, started)
+        self._record_usage(model_name, prompt, system_prompt, response, info)
+        
+        if cache is not None and response is not None:
+            await cache.aset(key, response)
+        return response
+    
+    async def astream(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 4096,
+        system_prompt: Optional[str] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> AsyncGenerator[str, None]:
+        reserved = estimate_tokens(prompt) + estimate_tokens(system_prompt)
+        if self.limiter is not None:
+            await self.limiter.aacquire(self.provider.value, self._model_name(model), reserved)
+        produced = 0
+        started = time.perf_counter()
+        try:
+            async for chunk in self.client.astream(
+                prompt=prompt,
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                system_prompt=system_prompt,
+                **_format_kwargs(response_format)
+            ):
+                produced += len(chunk)
+                yield chunk
+        except Exception as e:
+            self._observe(self._model_name(model), reserved, {}, started, error=e)
+            raise
+        self._record_stream(self._model_name(model), prompt, system_prompt, produced, started, reserved)
     
-    @lru_cache(maxsize=1000)
     def call_cached(
         self,
         prompt: str,
         model: Optional[str] = None,
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        **kwargs
     ) -> str:
         """Version cachée pour économiser les tokens"""
-        return self.call(prompt, model, system_prompt=system_prompt)
+        return self.call(prompt, model, system_prompt=system_prompt, use_cache=True, **kwargs)
 
 
 # Singleton global
@@ -342,6 +1172,33 @@ def stream_llm(
         yield from llm_client.stream(prompt, model, **kwargs)
 
 
+async def acall_llm(
+    prompt: str,
+    model: Optional[str] = None,
+    provider: Optional[LLMProvider] = None,
+    **kwargs
+) -> str:
+    """Fonction utilitaire globale asynchrone"""
+    if provider and provider != llm_client.provider:
+        client = LLMClient(provider)
+        return await client.acall(prompt, model, **kwargs)
+    return await llm_client.acall(prompt, model, **kwargs)
+
+
+async def astream_llm(
+    prompt: str,
+    model: Optional[str] = None,
+    provider: Optional[LLMProvider] = None,
+    **kwargs
+) -> AsyncGenerator[str, None]:
+    """Fonction utilitaire globale asynchrone avec streaming"""
+    client = llm_client
+    if provider and provider != llm_client.provider:
+        client = LLMClient(provider)
+    async for chunk in client.astream(prompt, model, **kwargs):
+        yield chunk
+
+
 __all__ = [
     "LLMClient",
     "BaseLLMClient",
@@ -351,5 +1208,17 @@ __all__ = [
     "OllamaClient",
     "call_llm",
     "stream_llm",
+    "acall_llm",
+    "astream_llm",
+    "create_async_http_client",
+    "shared_async_http_client",
+    "close_async_clients",
+    "json_response_format",
+    "report_response",
+    "TokenUsage",
+    "token_usage",
+    "record_usage",
+    "response_cache",
+    "rate_limiter",
     "llm_client",
 ]
@@ -0,0 +1,375 @@
+"""
+Métriques Prometheus / OpenMetrics pour Nümtema Agents Studio
+
+Compteurs en mémoire du processus, sans dépendance externe:
+- Counter / Gauge / Histogram, déclinés par combinaison de labels
+  (l'objet d'une combinaison est mis en cache: pas d'allocation par mesure)
+- collecteurs évalués au scrape (profondeur de file, ratios de cache...):
+  aucun coût sur le chemin des requêtes
+
+`metrics.render()` produit le format texte Prometheus 0.0.4, lu aussi par
+les scrapers OpenMetrics.
+
+Les labels restent à cardinalité bornée: pas d'identifiant de workflow,
+et les noms de modèles passent par `model_label` (au plus
+METRICS_MAX_MODEL_LABELS valeurs, les suivantes comptées sous "other").
+"""
+
+import bisect
+import math
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bornes (secondes) adaptées aux requêtes HTTP comme aux appels LLM
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+Samples = Union[float, Dict[LabelValues, float]]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """Base des métriques à labels: un enfant par combinaison de valeurs"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Enfant correspondant aux valeurs de labels (créé au premier usage)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: labels attendus {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(value) for value in values), self._new_child())
+        return child
+
+    def _items(self) -> List[Tuple[LabelValues, object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """Compteur monotone (`_total`)"""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default.inc(amount)
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    """Valeur instantanée (peut baisser)"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1) -> None:
+        self._default.dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "sum", "_bounds", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution par seaux cumulatifs (`_bucket`, `_sum`, `_count`)"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def _samples(self) -> Iterable[str]:
+        names = self.labelnames + ("le",)
+        for values, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(names, values + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class _Collected(_Metric):
+    """Métrique calculée au scrape par une fonction (valeur ou {labels: valeur})"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        collect: Callable[[], Samples],
+        labelnames: Sequence[str] = ()
+    ):
+        self.kind = kind
+        self.collect = collect
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> None:
+        return None
+
+    def _samples(self) -> Iterable[str]:
+        samples = self.collect()
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        for values, value in samples.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+
+
+class BoundedLabel:
+    """Valeurs d'un label limitées aux `max_values` premières vues.
+
+    Les valeurs suivantes sont regroupées sous `other`: une configuration
+    ou une entrée utilisateur ne peut pas créer une série par valeur.
+    """
+
+    def __init__(self, max_values: int, other: str = "other"):
+        self.max_values = max_values
+        self.other = other
+        self._seen: set = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, value: Optional[str]) -> str:
+        value = str(value)
+        if value in self._seen:
+            return value
+        with self._lock:
+            if len(self._seen) < self.max_values:
+                self._seen.add(value)
+                return value
+        return self.other
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Percentile (rang le plus proche) de valeurs déjà triées; 0.0 si vide"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class MetricsRegistry:
+    """Registre des métriques du processus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Métrique déjà enregistrée: {metric.name}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collector(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], Samples],
+        kind: str = "gauge",
+        labelnames: Sequence[str] = ()
+    ) -> None:
+        """Enregistre (ou remplace) une métrique calculée au scrape"""
+        with self._lock:
+            self._metrics[name] = _Collected(name, documentation, kind, collect, labelnames)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Exposition au format texte Prometheus"""
+        with self._lock:
+            registered = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: List[str] = []
+        for metric in registered:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registre global du processus
+metrics = MetricsRegistry()
+
+
+# =============================================================================
+# MÉTRIQUES STANDARD
+# =============================================================================
+
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "http_request_duration_seconds",
+    "Durée des requêtes HTTP par route",
+    ("method", "route", "status")
+)
+
+WORKFLOW_EXECUTIONS = metrics.counter(
+    "workflow_executions_total",
+    "Exécutions de workflows terminées",
+    ("status",)
+)
+WORKFLOW_EXECUTION_DURATION = metrics.histogram(
+    "workflow_execution_duration_seconds",
+    "Durée des exécutions de workflows",
+    ("status",)
+)
+
+# Noms de modèles des labels LLM (les statistiques par workflow sont dans l'API)
+model_label = BoundedLabel(int(os.getenv("METRICS_MAX_MODEL_LABELS", "20")))
+
+LLM_REQUEST_DURATION = metrics.histogram(
+    "llm_request_duration_seconds",
+    "Latence des appels LLM (provider)",
+    ("provider", "model", "status")
+)
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total",
+    "Tokens consommés par les appels LLM",
+    ("provider", "model", "kind")
+)
+
+TOOL_CALL_DURATION = metrics.histogram(
+    "tool_call_duration_seconds",
+    "Durée des appels d'outils",
+    ("tool", "status")
+)
+
+AGENT_OUTPUT_PARSE = metrics.counter(
+    "agent_output_parse_total",
+    "Sorties d'agents parsées, par chemin (native, direct, repaired, invalid, failed)",
+    ("format", "path")
+)
+
+
+__all__ = [
+    "CONTENT_TYPE",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "metrics",
+    "BoundedLabel",
+    "model_label",
+    "percentile",
+    "HTTP_REQUEST_DURATION",
+    "WORKFLOW_EXECUTIONS",
+    "WORKFLOW_EXECUTION_DURATION",
+    "LLM_REQUEST_DURATION",
+    "LLM_TOKENS",
+    "TOOL_CALL_DURATION",
+    "AGENT_OUTPUT_PARSE",
+]
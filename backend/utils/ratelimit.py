@@ -0,0 +1,470 @@
+"""
+Limiteur de débit des appels LLM pour Nümtema Agents Studio
+
+Deux token buckets par (provider, modèle): requêtes/minute et tokens/minute.
+Les appelants attendent une place (`acquire` / `aacquire`) au lieu
+d'envoyer la requête et d'échouer en 429. Les limites viennent de la
+configuration (LLM_RATE_LIMITS) et s'ajustent avec les en-têtes de
+rate-limit renvoyés par les providers (OpenAI, Anthropic, Retry-After).
+
+- RateLimiter: état en mémoire, partagé entre threads et tâches async
+- RedisRateLimiter: état partagé entre workers (script Lua atomique)
+"""
+
+import asyncio
+import json
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+
+class RateLimit:
+    """Limites d'un (provider, modèle); None = pas de limite"""
+
+    __slots__ = ("rpm", "tpm")
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.rpm = rpm or None
+        self.tpm = tpm or None
+
+    def __repr__(self) -> str:
+        return f"RateLimit(rpm={self.rpm}, tpm={self.tpm})"
+
+
+class TokenBucket:
+    """Bucket de `capacity` unités rechargé à `capacity` par minute.
+
+    Le niveau peut devenir négatif (dette) quand la consommation réelle
+    dépasse la réservation: les réservations suivantes attendent d'autant.
+    """
+
+    __slots__ = ("capacity", "level", "updated_at")
+
+    def __init__(self, capacity: float, now: Optional[float] = None):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated_at = time.monotonic() if now is None else now
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / 60.0
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Secondes avant que `amount` unités soient disponibles"""
+        self.refill(now)
+        amount = min(amount, self.capacity)  # Une requête trop grosse passe quand le bucket est plein
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def resize(self, capacity: float) -> None:
+        if capacity != self.capacity:
+            self.level = min(self.level, capacity)
+            self.capacity = capacity
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimation grossière du nombre de tokens d'un texte (~4 caractères/token)"""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+# Durées OpenAI: "1s", "6m0s", "20ms", "1h2m3.5s"
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    parts = _DURATION.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(amount) * _UNITS[unit] for amount, unit in parts)
+
+
+def _parse_reset(value: Optional[str]) -> Optional[float]:
+    """Délai avant réinitialisation: durée OpenAI, secondes, ou date RFC 3339 (Anthropic)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+    except ValueError:
+        return _parse_duration(value)
+
+
+def parse_rate_limit_headers(headers: Mapping[str, str]) -> Dict[str, Any]:
+    """Extrait limites, restes et délais des en-têtes OpenAI / Anthropic"""
+    headers = {key.lower(): value for key, value in headers.items()}
+    info: Dict[str, Any] = {}
+    for kind in ("requests", "tokens"):
+        for prefix, template in (
+            ("x-ratelimit", "{prefix}-{field}-{kind}"),
+            ("anthropic-ratelimit", "{prefix}-{kind}-{field}"),
+        ):
+            for field in ("limit", "remaining", "reset"):
+                value = headers.get(template.format(prefix=prefix, kind=kind, field=field))
+                if value is None:
+                    continue
+                if field == "reset":
+                    info[f"{kind}_reset"] = _parse_reset(value)
+                else:
+                    try:
+                        info[f"{kind}_{field}"] = float(value)
+                    except ValueError:
+                        pass
+    retry_after = _parse_reset(headers.get("retry-after"))
+    if retry_after is not None:
+        info["retry_after"] = retry_after
+    return info
+
+
+class RateLimiter:
+    """Limiteur en mémoire du processus (threads et boucles asyncio)"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, RateLimit]] = None,
+        default: Optional[RateLimit] = None
+    ):
+        # Clés: "provider" ou "provider:model"
+        self.configured = limits or {}
+        self.default = default or RateLimit()
+        self._learned: Dict[Tuple[str, str], RateLimit] = {}
+        self._buckets: Dict[Tuple[str, str], Dict[str, TokenBucket]] = {}
+        self._blocked_until: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    # -- Limites ----------------------------------------------------------------
+
+    def limits(self, provider: str, model: Optional[str]) -> RateLimit:
+        """Limites effectives: configurées, resserrées par celles apprises des en-têtes"""
+        with self._lock:
+            learned = self._learned.get((provider, model or ""))
+        return self._effective(provider, model, learned)
+
+    def _effective(self, provider: str, model: Optional[str], learned: Optional[RateLimit]) -> RateLimit:
+        configured = (
+            self.configured.get(f"{provider}:{model}")
+            or self.configured.get(provider)
+            or self.default
+        )
+        if learned is None:
+            return configured
+        return RateLimit(
+            rpm=_min(configured.rpm, learned.rpm),
+            tpm=_min(configured.tpm, learned.tpm)
+        )
+
+    def _remember(self, key: Tuple[str, str], info: Dict[str, Any]) -> RateLimit:
+        """Enregistre les limites annoncées par le provider (appelé sous le verrou)"""
+        previous = self._learned.get(key) or RateLimit()
+        learned = self._learned[key] = RateLimit(
+            rpm=info.get("requests_limit") or previous.rpm,
+            tpm=info.get("tokens_limit") or previous.tpm
+        )
+        return learned
+
+    def _bucket_state(self, key: Tuple[str, str], limits: RateLimit, now: float) -> Dict[str, TokenBucket]:
+        buckets = self._buckets.setdefault(key, {})
+        for name, capacity in (("requests", limits.rpm), ("tokens", limits.tpm)):
+            if capacity is None:
+                buckets.pop(name, None)
+            elif name in buckets:
+                buckets[name].resize(capacity)
+            else:
+                buckets[name] = TokenBucket(capacity, now)
+        return buckets
+
+    # -- Réservation ------------------------------------------------------------
+
+    def _reserve(self, provider: str, model: str, tokens: float) -> float:
+        """Réserve 1 requête + `tokens` si possible; sinon retourne l'attente nécessaire"""
+        key = (provider, model or "")
+        limits = self.limits(provider, model)
+        with self._lock:
+            now = time.monotonic()
+            blocked = self._blocked_until.get(key, 0.0) - now
+            if blocked > 0:
+                return blocked
+            buckets = self._bucket_state(key, limits, now)
+            if not buckets:
+                return 0.0
+            needs = {"requests": 1.0, "tokens": float(tokens)}
+            wait = max(bucket.wait_time(needs[name], now) for name, bucket in buckets.items())
+            if wait > 0:
+                return wait
+            for name, bucket in buckets.items():
+                bucket.level -= needs[name]
+            return 0.0
+
+    def acquire(self, provider: str, model: Optional[str], tokens: float = 0) -> float:
+        """Attend (en bloquant le thread) une place; retourne le temps attendu"""
+        waited = 0.0
+        while True:
+            wait = self._reserve(provider, model, tokens)
+            if wait <= 0:
+                self._record_wait(waited)
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, provider: str, model: Optional[str], tokens: float = 0) -> float:
+        """Attend (sans bloquer la boucle) une place; retourne le temps attendu"""
+        waited = 0.0
+        while True:
+            wait = self._reserve(provider, model, tokens)
+            if wait <= 0:
+                self._record_wait(waited)
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _record_wait(self, waited: float) -> None:
+        if waited > 0:
+            self.waits += 1
+            self.wait_seconds += waited
+
+    # -- Rétroaction ------------------------------------------------------------
+
+    def _adjust(self, provider: str, model: str, tokens: float) -> None:
+        """Ajoute (ou retire) des tokens au bucket tokens/minute"""
+        with self._lock:
+            bucket = self._buckets.get((provider, model or ""), {}).get("tokens")
+            if bucket is not None:
+                bucket.level = min(bucket.capacity, bucket.level + tokens)
+
+    def _block(self, provider: str, model: str, seconds: float) -> None:
+        key = (provider, model or "")
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._blocked_until[key] = max(self._blocked_until.get(key, 0.0), until)
+
+    def _learn(self, provider: str, model: str, info: Dict[str, Any], refund: float = 0) -> None:
+        """Applique les en-têtes de réponse, puis `refund` (réservé - consommé).
+
+        Le remboursement est appliqué avant l'alignement sur `remaining`: le
+        reste annoncé par le provider inclut déjà la consommation réelle,
+        le bucket n'est donc corrigé qu'une fois.
+        """
+        key = (provider, model or "")
+        with self._lock:
+            limits = self._effective(provider, model, self._remember(key, info))
+            buckets = self._bucket_state(key, limits, time.monotonic())
+            if refund and "tokens" in buckets:
+                bucket = buckets["tokens"]
+                bucket.level = min(bucket.capacity, bucket.level + refund)
+            for name in ("requests", "tokens"):
+                remaining = info.get(f"{name}_remaining")
+                if remaining is not None and name in buckets:
+                    buckets[name].level = min(buckets[name].level, remaining)
+
+    def observe(
+        self,
+        provider: str,
+        model: Optional[str],
+        reserved_tokens: float = 0,
+        used_tokens: Optional[float] = None,
+        headers: Optional[Mapping[str, str]] = None
+    ) -> None:
+        """Corrige la réservation avec la consommation réelle et les en-têtes de réponse"""
+        refund = reserved_tokens - used_tokens if used_tokens is not None else 0
+        info = parse_rate_limit_headers(headers) if headers else {}
+        if info:
+            self._learn(provider, model, info, refund)
+        elif refund:
+            self._adjust(provider, model, refund)
+
+    def observe_error(self, provider: str, model: Optional[str], error: Exception) -> None:
+        """Sur un 429, suspend les appels jusqu'au délai indiqué par le provider"""
+        if getattr(error, "status_code", None) != 429:
+            return
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        info = parse_rate_limit_headers(headers)
+        if info:
+            self._learn(provider, model, info)
+        delay = info.get("retry_after") or max(
+            info.get("requests_reset") or 0.0, info.get("tokens_reset") or 0.0
+        ) or 1.0
+        self._block(provider, model, delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buckets = {
+                f"{provider}:{model}": {name: round(bucket.level, 1) for name, bucket in state.items()}
+                for (provider, model), state in self._buckets.items()
+            }
+        return {
+            "backend": type(self).__name__,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "buckets": buckets,
+        }
+
+
+# Réservation atomique sur deux buckets (requêtes, tokens), horloge du serveur.
+# KEYS: blocage, bucket requêtes, bucket tokens
+# ARGV: capacité requêtes, capacité tokens (0 = illimité), tokens demandés
+_REDIS_RESERVE = """
+local blocked = redis.call('PTTL', KEYS[1])
+if blocked > 0 then
+  return tostring(blocked / 1000)
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local specs = {
+  {KEYS[2], tonumber(ARGV[1]), 1},
+  {KEYS[3], tonumber(ARGV[2]), tonumber(ARGV[3])},
+}
+local wait = 0
+local levels = {}
+for i, spec in ipairs(specs) do
+  local capacity = spec[2]
+  if capacity > 0 then
+    local state = redis.call('HMGET', spec[1], 'level', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    local rate = capacity / 60
+    level = math.min(capacity, level + (now - ts) * rate)
+    levels[i] = level
+    local need = math.min(spec[3], capacity)
+    if level < need then
+      wait = math.max(wait, (need - level) / rate)
+    end
+  end
+end
+if wait > 0 then
+  return tostring(wait)
+end
+for i, spec in ipairs(specs) do
+  if spec[2] > 0 then
+    redis.call('HSET', spec[1], 'level', tostring(levels[i] - spec[3]), 'ts', tostring(now))
+    redis.call('EXPIRE', spec[1], 120)
+  end
+end
+return '0'
+"""
+
+_REDIS_ADJUST = """
+local level = tonumber(redis.call('HGET', KEYS[1], 'level'))
+if level then
+  redis.call('HSET', KEYS[1], 'level', tostring(math.min(tonumber(ARGV[2]), level + tonumber(ARGV[1]))))
+end
+return 1
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """Limiteur partagé entre processus (les niveaux des buckets vivent dans Redis)"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, RateLimit]] = None,
+        default: Optional[RateLimit] = None,
+        url: Optional[str] = None,
+        prefix: str = "numtema:ratelimit:"
+    ):
+        super().__init__(limits, default)
+        import redis
+        self.client = redis.Redis.from_url(
+            url or os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            decode_responses=True
+        )
+        self.prefix = prefix
+        self._reserve_script = self.client.register_script(_REDIS_RESERVE)
+        self._adjust_script = self.client.register_script(_REDIS_ADJUST)
+
+    def _keys(self, provider: str, model: str) -> Tuple[str, str, str]:
+        base = f"{self.prefix}{provider}:{model or ''}"
+        return f"{base}:blocked", f"{base}:requests", f"{base}:tokens"
+
+    def _reserve(self, provider: str, model: str, tokens: float) -> float:
+        limits = self.limits(provider, model)
+        if limits.rpm is None and limits.tpm is None and self.client.pttl(self._keys(provider, model)[0]) <= 0:
+            return 0.0
+        return float(self._reserve_script(
+            keys=list(self._keys(provider, model)),
+            args=[limits.rpm or 0, limits.tpm or 0, tokens]
+        ))
+
+    async def aacquire(self, provider: str, model: Optional[str], tokens: float = 0) -> float:
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self._reserve, provider, model, tokens)
+            if wait <= 0:
+                self._record_wait(waited)
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _adjust(self, provider: str, model: str, tokens: float) -> None:
+        limits = self.limits(provider, model)
+        if limits.tpm is not None:
+            self._adjust_script(keys=[self._keys(provider, model)[2]], args=[tokens, limits.tpm])
+
+    def _block(self, provider: str, model: str, seconds: float) -> None:
+        self.client.set(self._keys(provider, model)[0], "1", px=max(1, int(seconds * 1000)))
+
+    def _learn(self, provider: str, model: str, info: Dict[str, Any], refund: float = 0) -> None:
+        # Les niveaux partagés ne sont pas alignés sur `remaining` (propre à
+        # une clé d'API, pas au cluster): seul le remboursement s'applique
+        with self._lock:
+            self._remember((provider, model or ""), info)
+        if refund:
+            self._adjust(provider, model, refund)
+
+
+def _min(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def create_rate_limiter(backend: Optional[str] = None) -> Optional[RateLimiter]:
+    """Crée le limiteur configuré par LLM_RATE_LIMIT_BACKEND (memory, redis, none).
+
+    LLM_RATE_LIMITS: JSON {"provider" ou "provider:model": {"rpm": .., "tpm": ..}}
+    LLM_RATE_LIMIT_RPM / LLM_RATE_LIMIT_TPM: limites par défaut (0 = aucune)
+    """
+    backend = (backend or os.getenv("LLM_RATE_LIMIT_BACKEND", "memory")).lower()
+    if backend == "none":
+        return None
+    limits = {
+        key: RateLimit(rpm=value.get("rpm"), tpm=value.get("tpm"))
+        for key, value in json.loads(os.getenv("LLM_RATE_LIMITS", "{}")).items()
+    }
+    default = RateLimit(
+        rpm=float(os.getenv("LLM_RATE_LIMIT_RPM", "0")),
+        tpm=float(os.getenv("LLM_RATE_LIMIT_TPM", "0"))
+    )
+    if backend == "memory":
+        return RateLimiter(limits, default)
+    if backend == "redis":
+        return RedisRateLimiter(limits, default)
+    raise ValueError(f"Backend de rate limit inconnu: {backend}")
+
+
+__all__ = [
+    "RateLimit",
+    "TokenBucket",
+    "RateLimiter",
+    "RedisRateLimiter",
+    "estimate_tokens",
+    "parse_rate_limit_headers",
+    "create_rate_limiter",
+]
@@ -3,15 +3,38 @@ Moteur de Workflow pour Nümtema Agents Studio
 
 Responsable de:
 - Construction de flows PocketFlow à partir de définitions
-- Exécution de workflows
+- Cache des flows compilés (par id + version du workflow)
+- Exécution de workflows (séquentielle ou DAG parallèle)
 - Templates de workflows prédéfinis
 """
 
-from typing import Dict, Type, Optional, Any, List
+import asyncio
+import contextlib
+import contextvars
+import functools
+import itertools
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import time
+from typing import Awaitable, ContextManager, Dict, Type, Optional, Any, List, Set, Callable, Tuple
 from uuid import UUID
 from datetime import datetime
 
-from pocketflow import Flow, Node
+from pocketflow import (
+    BudgetExceeded,
+    Flow,
+    FlowLimits,
+    Node,
+    AsyncNode,
+    VersionedState,
+    fork_shared,
+    branch_writes,
+    merge_writes,
+    attempt_observer,
+)
 from models import (
     WorkflowDefinition, 
     WorkflowNode, 
@@ -21,8 +44,26 @@ from models import (
     ExecutionStatus,
     ExecutionStep,
 )
-from agents import BaseAgent, AGENT_REGISTRY, create_agent
+from agents import BaseAgent, AGENT_REGISTRY
+from agents.history import history_stream
 from tools import tool_registry
+from storage.checkpoints import CheckpointStore, ExecutionCheckpoint, create_checkpoint_store, snapshot_values
+from utils.llm import TokenUsage, token_usage
+from utils.metrics import metrics, WORKFLOW_EXECUTIONS, WORKFLOW_EXECUTION_DURATION
+from utils.events import (
+    event_bus,
+    event_sink,
+    EXECUTION_STARTED,
+    EXECUTION_FINISHED,
+    NODE_STARTED,
+    NODE_FINISHED,
+    NODE_FAILED,
+    NODE_RETRY,
+    LIMIT_REACHED,
+    MERGE_CONFLICT,
+)
+
+logger = logging.getLogger(__name__)
 
 
 class ToolNode(Node):
@@ -46,21 +87,215 @@ class ToolNode(Node):
         return "default"
 
 
+# Nombre maximum de nodes exécutés simultanément par exécution (mode DAG)
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("WORKFLOW_MAX_CONCURRENCY", "4"))
+
+# Nombre de workflows compilés gardés en cache
+DEFAULT_COMPILED_CACHE_SIZE = int(os.getenv("WORKFLOW_COMPILED_CACHE_SIZE", "128"))
+
+# Garde-fous par défaut des exécutions (0 = pas de limite), surchargés par
+# WorkflowDefinition.limits et WorkflowEdge.max_iterations
+DEFAULT_MAX_STEPS = int(os.getenv("WORKFLOW_MAX_STEPS", "100"))
+DEFAULT_MAX_EDGE_ITERATIONS = int(os.getenv("WORKFLOW_MAX_EDGE_ITERATIONS", "10"))
+DEFAULT_TIMEOUT = float(os.getenv("WORKFLOW_TIMEOUT", "0"))
+DEFAULT_MAX_TOKENS = int(os.getenv("WORKFLOW_MAX_TOKENS", "0"))
+DEFAULT_LIMIT_FALLBACK = os.getenv("WORKFLOW_LIMIT_FALLBACK") or None
+
+
+def _strongly_connected(successors: Dict[str, Set[str]]) -> List[List[str]]:
+    """Composantes fortement connexes d'un graphe orienté (Tarjan, itératif)"""
+    index: Dict[str, int] = {}
+    lowlink: Dict[str, int] = {}
+    stack: List[str] = []
+    on_stack: Set[str] = set()
+    components: List[List[str]] = []
+    
+    for root in successors:
+        if root in index:
+            continue
+        work = [(root, iter(successors[root]))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            child = next(children, None)
+            if child is not None:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors[child])))
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+                continue
+            work.pop()
+            if work:
+                lowlink[work[-1][0]] = min(lowlink[work[-1][0]], lowlink[node])
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+class CompiledFlow:
+    """Forme compilée (immuable) d'un workflow: topologie + prototypes de nodes.
+
+    Les prototypes (agents avec leur config déjà validée) ne sont jamais
+    exécutés directement: chaque exécution en obtient des copies légères
+    via `instantiate()`, avec leurs propres retries et successeurs.
+    """
+
+    __slots__ = ("key", "prototypes", "edges", "start_id", "dependencies", "groups", "edge_limits")
+
+    def __init__(
+        self,
+        key: Tuple,
+        prototypes: Dict[str, Node],
+        edges: Tuple[Tuple[str, Optional[str], str], ...],
+        start_id: str,
+        dependencies: Optional[Dict[str, Set[str]]] = None,
+        edge_limits: Optional[Dict[Tuple[str, str], int]] = None,
+        groups: Optional[Dict[str, List[str]]] = None
+    ):
+        self.key = key
+        self.prototypes = prototypes
+        self.edges = edges
+        self.start_id = start_id
+        self.dependencies = dependencies
+        # node d'entrée -> membres d'un sous-graphe exécuté séquentiellement dans le DAG
+        self.groups = groups or {}
+        # (source_id, action) -> passages maximaux
+        self.edge_limits = edge_limits or {}
+
+    def instantiate(self) -> Dict[str, Node]:
+        """Crée les nodes d'une exécution, connectés selon la topologie"""
+        nodes = {node_id: node.clone() for node_id, node in self.prototypes.items()}
+        for source_id, condition, target_id in self.edges:
+            if condition:
+                nodes[source_id] - condition >> nodes[target_id]
+            else:
+                nodes[source_id] >> nodes[target_id]
+        return nodes
+
+    def build_flow(
+        self,
+        listener: Optional[Callable[[str, Node, Dict], None]] = None,
+        checkpoint: Optional[Callable[[Optional[Node], Dict], None]] = None
+    ) -> Flow:
+        """Crée un Flow prêt à exécuter"""
+        return Flow(start=self.instantiate()[self.start_id], listener=listener, checkpoint=checkpoint)
+
+
 class WorkflowEngine:
     """Moteur d'exécution de workflows basé sur PocketFlow"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        compiled_cache_size: int = DEFAULT_COMPILED_CACHE_SIZE,
+        checkpoint_store: Optional[CheckpointStore] = None
+    ):
         self.agent_registry: Dict[str, Type[BaseAgent]] = AGENT_REGISTRY.copy()
+        # Exécutions en cours uniquement (les terminées vont dans le dépôt de l'API)
         self.executions: Dict[str, Execution] = {}
+        self.max_concurrency = max_concurrency
+        # Flows compilés: (id, version, updated_at) → CompiledFlow (LRU)
+        self.compiled_cache_size = compiled_cache_size
+        self._compiled: "OrderedDict[Tuple, CompiledFlow]" = OrderedDict()
+        self._compiled_lock = threading.Lock()
+        self.compile_hits = 0
+        self.compile_misses = 0
+        # Checkpoints après chaque node, pour reprendre une exécution interrompue
+        self.checkpoint_store = checkpoint_store
     
     def register_agent(self, name: str, agent_class: Type[BaseAgent]):
         """Enregistre un type d'agent"""
         self.agent_registry[name] = agent_class
+        # Les flows compilés peuvent référencer l'ancienne classe
+        self.clear_compiled()
     
-    def build_flow(self, definition: WorkflowDefinition) -> Flow:
-        """Construit un Flow PocketFlow à partir d'une définition"""
+    # -------------------------------------------------------------------------
+    # Compilation et cache
+    # -------------------------------------------------------------------------
+    
+    def compile(self, definition: WorkflowDefinition) -> CompiledFlow:
+        """Retourne la forme compilée d'un workflow (depuis le cache LRU si possible).
+
+        La clé est (id, version, updated_at): une définition modifiée sur
+        place sans toucher à ces champs doit être invalidée explicitement.
+        """
+        key = (str(definition.id), definition.version, definition.updated_at)
+        with self._compiled_lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                self.compile_hits += 1
+                return compiled
+            self.compile_misses += 1
+        
+        compiled = self._compile(definition, key)
+        
+        with self._compiled_lock:
+            self._compiled[key] = compiled
+            self._compiled.move_to_end(key)
+            while len(self._compiled) > self.compiled_cache_size:
+                self._compiled.popitem(last=False)
+        return compiled
+    
+    def _compile(self, definition: WorkflowDefinition, key: Tuple) -> CompiledFlow:
+        prototypes = self._build_nodes(definition)
+        
+        edges = tuple(
+            (str(edge.source), edge.condition, str(edge.target))
+            for edge in definition.edges
+            if str(edge.source) in prototypes and str(edge.target) in prototypes
+        )
         
-        # 1. Créer les instances de nodes
+        start_id = self._find_start_node(definition, prototypes)
+        if not start_id:
+            raise ValueError("Aucun node de départ trouvé dans le workflow")
+        
+        edge_limits = {
+            (str(edge.source), edge.condition or "default"): edge.max_iterations
+            for edge in definition.edges
+            if edge.max_iterations is not None
+        }
+        
+        plan = self._plan_units(definition)
+        dependencies, groups = plan if plan is not None else (None, None)
+        return CompiledFlow(key, prototypes, edges, start_id, dependencies, edge_limits, groups)
+    
+    def invalidate(self, workflow_id: Any) -> int:
+        """Retire du cache toutes les versions compilées d'un workflow"""
+        workflow_id = str(workflow_id)
+        with self._compiled_lock:
+            stale = [key for key in self._compiled if key[0] == workflow_id]
+            for key in stale:
+                del self._compiled[key]
+        return len(stale)
+    
+    def clear_compiled(self) -> None:
+        """Vide le cache de flows compilés"""
+        with self._compiled_lock:
+            self._compiled.clear()
+    
+    def build_flow(
+        self,
+        definition: WorkflowDefinition,
+        listener: Optional[Callable[[str, Node, Dict], None]] = None
+    ) -> Flow:
+        """Construit un Flow PocketFlow à partir d'une définition"""
+        return self.compile(definition).build_flow(listener)
+    
+    def _build_nodes(self, definition: WorkflowDefinition) -> Dict[str, Node]:
+        """Instancie les nodes d'une définition (sans les connecter)"""
         nodes: Dict[str, Node] = {}
         
         for node_def in definition.nodes:
@@ -71,8 +306,7 @@ class WorkflowEngine:
                 if agent_type and agent_type in self.agent_registry:
                     # Créer l'agent avec la config personnalisée
                     config_overrides = node_def.config.get("config_overrides", {})
-                    nodes[node_id] = create_agent(
-                        agent_type, 
+                    nodes[node_id] = self.agent_registry[agent_type](
                         config_overrides=config_overrides
                     )
             
@@ -80,36 +314,17 @@ class WorkflowEngine:
                 if node_def.tool_name:
                     nodes[node_id] = ToolNode(node_def.tool_name)
         
-        # 2. Connecter les edges
-        for edge in definition.edges:
-            source_id = str(edge.source)
-            target_id = str(edge.target)
-            
-            source = nodes.get(source_id)
-            target = nodes.get(target_id)
-            
-            if source and target:
-                if edge.condition:
-                    # Connexion conditionnelle
-                    source - edge.condition >> target
-                else:
-                    # Connexion par défaut
-                    source >> target
-        
-        # 3. Identifier le node de départ
-        start_node = self._find_start_node(definition, nodes)
-        
-        if not start_node:
-            raise ValueError("Aucun node de départ trouvé dans le workflow")
+        for node_id, node in nodes.items():
+            node.node_id = node_id
         
-        return Flow(start=start_node)
+        return nodes
     
     def _find_start_node(
         self, 
         definition: WorkflowDefinition, 
         nodes: Dict[str, Node]
-    ) -> Optional[Node]:
-        """Trouve le node de départ (sans edge entrant)"""
+    ) -> Optional[str]:
+        """Trouve l'ID du node de départ (sans edge entrant)"""
         
         # Trouver tous les nodes cibles
         target_ids = {str(edge.target) for edge in definition.edges}
@@ -118,85 +333,780 @@ class WorkflowEngine:
         for node_def in definition.nodes:
             node_id = str(node_def.id)
             if node_id not in target_ids and node_id in nodes:
-                return nodes[node_id]
+                return node_id
         
         # Fallback: premier node
         if definition.nodes and str(definition.nodes[0].id) in nodes:
-            return nodes[str(definition.nodes[0].id)]
+            return str(definition.nodes[0].id)
         
         return None
     
+    def plan_dag(self, definition: WorkflowDefinition) -> Optional[Dict[str, Set[str]]]:
+        """Calcule les dépendances entre les unités d'exécution du DAG.
+
+        Les nodes reliés par un edge conditionnel (autre que "default") ou
+        pris dans un cycle forment un sous-graphe séquentiel, identifié par
+        son node d'entrée (voir `sequential_groups`); les autres nodes sont
+        planifiés individuellement. Retourne None si tout le workflow est
+        séquentiel (ou si un sous-graphe a plusieurs entrées).
+        """
+        plan = self._plan_units(definition)
+        return plan[0] if plan is not None else None
+    
+    def sequential_groups(self, definition: WorkflowDefinition) -> Dict[str, List[str]]:
+        """Sous-graphes séquentiels du DAG: node d'entrée -> membres"""
+        plan = self._plan_units(definition)
+        return plan[1] if plan is not None else {}
+    
+    def _plan_units(
+        self,
+        definition: WorkflowDefinition
+    ) -> Optional[Tuple[Dict[str, Set[str]], Dict[str, List[str]]]]:
+        node_ids = [str(node_def.id) for node_def in definition.nodes]
+        known = set(node_ids)
+        edges = [
+            (str(edge.source), str(edge.target), edge.condition not in (None, "default"))
+            for edge in definition.edges
+            if str(edge.source) in known and str(edge.target) in known
+        ]
+        
+        parent = {node_id: node_id for node_id in node_ids}
+        
+        def find(node_id: str) -> str:
+            while parent[node_id] != node_id:
+                parent[node_id] = parent[parent[node_id]]
+                node_id = parent[node_id]
+            return node_id
+        
+        def union(members: List[str]) -> None:
+            root = find(members[0])
+            for member in members[1:]:
+                parent[find(member)] = root
+        
+        for source_id, target_id, conditional in edges:
+            if conditional:
+                union([source_id, target_id])
+        
+        # Les cycles entre unités (y compris ceux créés par les regroupements
+        # précédents) sont fusionnés jusqu'à obtenir un graphe acyclique
+        while True:
+            successors: Dict[str, Set[str]] = {find(node_id): set() for node_id in node_ids}
+            for source_id, target_id, _ in edges:
+                if find(source_id) != find(target_id):
+                    successors[find(source_id)].add(find(target_id))
+            cycles = [scc for scc in _strongly_connected(successors) if len(scc) > 1]
+            if not cycles:
+                break
+            for scc in cycles:
+                union(scc)
+        
+        members: Dict[str, List[str]] = {}
+        for node_id in node_ids:
+            members.setdefault(find(node_id), []).append(node_id)
+        looped = {find(source_id) for source_id, target_id, _ in edges if source_id == target_id}
+        if len(members) == 1 and (len(node_ids) > 1 or looped):
+            return None
+        
+        start_id = self._find_start_node(definition, dict.fromkeys(node_ids))
+        unit_of: Dict[str, str] = {}
+        groups: Dict[str, List[str]] = {}
+        for root, group in members.items():
+            if len(group) == 1 and root not in looped:
+                unit_of[group[0]] = group[0]
+                continue
+            entries = [start_id] if start_id in group else sorted(
+                {target_id for source_id, target_id, _ in edges
+                 if target_id in group and find(source_id) != root},
+                key=node_ids.index
+            )
+            if not entries:  # Sous-graphe sans entrée externe: premier node déclaré
+                entries = group[:1]
+            if len(entries) != 1:
+                return None
+            groups[entries[0]] = group
+            for node_id in group:
+                unit_of[node_id] = entries[0]
+        
+        dependencies: Dict[str, Set[str]] = {unit: set() for unit in dict.fromkeys(unit_of.values())}
+        for source_id, target_id, _ in edges:
+            if unit_of[source_id] != unit_of[target_id]:
+                dependencies[unit_of[target_id]].add(unit_of[source_id])
+        return dependencies, groups
+    
+    async def _run_dag(
+        self,
+        nodes: Dict[str, Node],
+        dependencies: Dict[str, Set[str]],
+        shared: Dict,
+        max_concurrency: int,
+        listener: Optional[Callable[[str, Node, Dict], None]] = None,
+        completed: Optional[Set[str]] = None,
+        checkpoint: Optional[Callable[[Set[str], Dict], Awaitable[None]]] = None,
+        limits: Optional[FlowLimits] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        groups: Optional[Dict[str, List[str]]] = None,
+        step_context: Optional[Callable[[Node], ContextManager]] = None
+    ) -> Dict:
+        """Exécute un DAG en lançant chaque node dès que ses dépendances sont terminées.
+
+        Chaque node travaille sur une copie de `shared` prise au lancement;
+        ses écritures sont fusionnées à la fin. Les nodes async tournent sur
+        la boucle d'événements, les nodes synchrones dans un pool de threads,
+        le tout limité à `max_concurrency` nodes simultanés.
+
+        Les nodes de `completed` (reprise) sont considérés comme terminés;
+        `await checkpoint(completed, shared)` est appelé après chaque node.
+        `limits` (étapes, durée, tokens) est vérifié avant chaque lancement;
+        avec un repli (`limits.fallback`), une limite atteinte arrête
+        seulement le lancement de nouveaux nodes et l'exécution se termine
+        avec l'état courant, sinon elle lève BudgetExceeded. `stats` reçoit
+        le nombre de nodes lancés ("steps", à partir de sa valeur initiale
+        lors d'une reprise). À la deadline, les nodes en cours sont annulés;
+        les threads des nodes synchrones sont attendus avant de rendre la main.
+
+        `groups` (node d'entrée -> membres) désigne les sous-graphes
+        conditionnels ou cycliques: chacun est une seule unité du DAG,
+        exécutée par un `Flow` limité à ses edges internes (une reprise
+        rejoue le sous-graphe depuis son entrée).
+
+        `step_context(node)` entoure l'exécution de chaque node (voir `Flow`).
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        groups = groups or {}
+        
+        # Un sous-graphe ne suit que ses propres edges: les successeurs
+        # externes sont des dépendances du DAG
+        for members in groups.values():
+            inside = {id(nodes[member]) for member in members if member in nodes}
+            for member in members:
+                if member in nodes:
+                    node = nodes[member]
+                    node.successors = {
+                        action: target for action, target in node.successors.items()
+                        if id(target) in inside
+                    }
+        
+        # Les nodes non instanciés (type inconnu) ou déjà terminés sont ignorés
+        completed = set(completed or ())
+        remaining = {
+            node_id: {dep for dep in deps if dep in nodes and dep not in completed}
+            for node_id, deps in dependencies.items()
+            if node_id in nodes and node_id not in completed
+        }
+        dependents: Dict[str, List[str]] = {node_id: [] for node_id in remaining}
+        for node_id, deps in remaining.items():
+            for dep in deps:
+                dependents[dep].append(node_id)
+        
+        def emit(event: str, node: Node, **data):
+            if listener is not None:
+                listener(event, node, data)
+        
+        def step(node: Node) -> ContextManager:
+            return step_context(node) if step_context is not None else contextlib.nullcontext()
+        
+        async def run_group(node: Node, branch: Dict):
+            flow = Flow(start=node, listener=listener, limits=limits, step_context=step_context)
+            try:
+                await flow.run_async(branch)
+            finally:
+                stats["steps"] += max(flow.steps - 1, 0)
+        
+        async def run_node(node_id: str):
+            node = nodes[node_id]
+            # Contexte propre à la tâche: les essais en échec sont relayés au listener
+            attempt_observer.set(lambda failed, attempt: emit(NODE_RETRY, failed, **attempt))
+            async with semaphore:
+                base = shared.snapshot() if isinstance(shared, VersionedState) else fork_shared(shared)
+                branch = fork_shared(base)
+                if node_id in groups:
+                    await run_group(node, branch)
+                    return base, branch
+                emit(NODE_STARTED, node)
+                started = time.perf_counter()
+                try:
+                    with step(node):
+                        if isinstance(node, AsyncNode):
+                            action = await node.run_async(branch)
+                        else:
+                            context = contextvars.copy_context()
+                            action = await loop.run_in_executor(executor, context.run, node.run, branch)
+                except Exception as e:
+                    emit(
+                        NODE_FAILED, node,
+                        error=str(e),
+                        duration_ms=int((time.perf_counter() - started) * 1000),
+                        retries=node.cur_retry,
+                        **getattr(node, "timings", {})
+                    )
+                    raise
+                emit(
+                    NODE_FINISHED, node,
+                    action=action,
+                    duration_ms=int((time.perf_counter() - started) * 1000),
+                    retries=node.cur_retry,
+                    **getattr(node, "timings", {})
+                )
+                return base, branch
+        
+        tasks: Dict[asyncio.Task, str] = {}
+        stats = stats if stats is not None else {}
+        stats.setdefault("steps", 0)
+        started_at = time.monotonic()
+        
+        def exceeded(reason: str) -> BudgetExceeded:
+            stats["limit_reached"] = reason
+            return BudgetExceeded(reason, f"Limite d'exécution atteinte ({reason}) après {stats['steps']} étapes")
+        
+        def schedule(node_id: str):
+            if stats.get("limit_reached"):
+                return  # Repli en cours: plus de nouveau node
+            if limits is not None:
+                reason = limits.exceeded(stats["steps"], time.monotonic() - started_at)
+                if reason is not None:
+                    if limits.fallback is None:
+                        raise exceeded(reason)
+                    stats["limit_reached"] = reason
+                    emit(LIMIT_REACHED, nodes[node_id], reason=reason)
+                    return
+            stats["steps"] += 1
+            tasks[asyncio.ensure_future(run_node(node_id))] = node_id
+        
+        try:
+            for node_id, deps in remaining.items():
+                if not deps:
+                    schedule(node_id)
+            
+            while tasks:
+                timeout = None
+                if limits is not None and limits.deadline is not None:
+                    timeout = max(limits.deadline - (time.monotonic() - started_at), 0)
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if limits.fallback is None:
+                        raise exceeded("deadline")
+                    # Repli: les nodes en cours sont annulés (leurs écritures
+                    # ignorées) et l'exécution se termine avec l'état courant
+                    stats["limit_reached"] = "deadline"
+                    emit(LIMIT_REACHED, nodes[next(iter(tasks.values()))], reason="deadline")
+                    break
+                for task in done:
+                    node_id = tasks.pop(task)
+                    base, branch = task.result()
+                    conflicts = merge_writes(shared, base, [branch_writes(base, branch)])
+                    if conflicts:
+                        logger.warning("DAG %s: clés modifiées en parallèle: %s", node_id, ", ".join(conflicts))
+                        emit(MERGE_CONFLICT, nodes[node_id], keys=conflicts)
+                    completed.add(node_id)
+                    if checkpoint is not None:
+                        await checkpoint(completed, shared)
+                    
+                    for child_id in dependents[node_id]:
+                        remaining[child_id].discard(node_id)
+                        if not remaining[child_id]:
+                            schedule(child_id)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+                # Un thread ne peut pas être interrompu: on attend la fin des nodes synchrones
+                await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+            else:
+                executor.shutdown(wait=False)
+        
+        return shared
+    
+    @staticmethod
+    def _step_usage(
+        usage: TokenUsage,
+        step_usages: Dict[int, TokenUsage]
+    ) -> Callable[[Node], ContextManager]:
+        """`step_context` de Flow: un compteur de tokens par étape, rattaché à `usage`.
+
+        Le compteur de chaque node en cours est aussi rangé dans `step_usages`
+        (par id du node) pour le listener de l'exécution.
+        """
+        @contextlib.contextmanager
+        def step_context(node: Node):
+            step_usage = step_usages[id(node)] = TokenUsage(parent=usage)
+            token = token_usage.set(step_usage)
+            try:
+                yield step_usage
+            finally:
+                token_usage.reset(token)
+        
+        return step_context
+    
+    def _execution_listener(
+        self,
+        execution: Execution,
+        step_usages: Optional[Dict[int, TokenUsage]] = None
+    ) -> Callable[[str, Node, Dict], None]:
+        """Listener de Flow qui publie les étapes sur le bus d'événements.
+
+        Chaque node exécuté ajoute un ExecutionStep à `execution.steps`; les
+        tokens de l'étape sont lus dans `step_usages` (voir `_step_usage`).
+        """
+        execution_id = str(execution.id)
+        step_usages = step_usages if step_usages is not None else {}
+        running: Dict[int, ExecutionStep] = {}
+        
+        def record(event: str, node: Node, data: Dict) -> None:
+            node_id = getattr(node, "node_id", None)
+            if node_id is None:
+                return
+            if event == NODE_STARTED:
+                step = ExecutionStep(
+                    node_id=node_id,
+                    node_name=getattr(node, "name", type(node).__name__),
+                    status=ExecutionStatus.RUNNING,
+                    started_at=datetime.utcnow()
+                )
+                running[id(node)] = step
+                execution.steps.append(step)
+                return
+            if id(node) not in running:
+                return
+            step = running.pop(id(node))
+            step_usage = step_usages.pop(id(node), None) or TokenUsage()
+            step.status = ExecutionStatus.COMPLETED if event == NODE_FINISHED else ExecutionStatus.FAILED
+            step.completed_at = datetime.utcnow()
+            step.duration_ms = data.get("duration_ms")
+            step.action = data.get("action")
+            step.error = data.get("error")
+            step.retries = data.get("retries", 0)
+            step.prep_ms = data.get("prep_ms")
+            step.exec_ms = data.get("exec_ms")
+            step.post_ms = data.get("post_ms")
+            step.llm_calls = step_usage.calls
+            step.prompt_tokens = step_usage.prompt_tokens
+            step.completion_tokens = step_usage.completion_tokens
+            step.llm_latency_ms = round(step_usage.latency_ms, 3)
+        
+        def listener(event: str, node: Node, data: Dict) -> None:
+            if event in (NODE_STARTED, NODE_FINISHED, NODE_FAILED):
+                record(event, node, data)
+            elif event == MERGE_CONFLICT:
+                execution.merge_conflicts.extend(
+                    key for key in data.get("keys", ()) if key not in execution.merge_conflicts
+                )
+            payload = dict(data)
+            if "target" in payload:
+                target = payload.pop("target")
+                payload["target_node_id"] = getattr(target, "node_id", None)
+            event_bus.publish(
+                execution_id,
+                event,
+                node_id=getattr(node, "node_id", None),
+                node_name=getattr(node, "name", type(node).__name__),
+                **payload
+            )
+        
+        return listener
+    
+    def _flow_limits(
+        self,
+        definition: WorkflowDefinition,
+        compiled: CompiledFlow,
+        nodes: Dict[str, Node],
+        usage: TokenUsage
+    ) -> FlowLimits:
+        """Garde-fous d'une exécution: limites du workflow, sinon défauts du moteur"""
+        limits = definition.limits
+        
+        def pick(value, default):
+            if value is not None:
+                return value
+            return default or None
+        
+        return FlowLimits(
+            max_steps=pick(limits.max_steps, DEFAULT_MAX_STEPS),
+            max_edge_visits=pick(limits.max_edge_iterations, DEFAULT_MAX_EDGE_ITERATIONS),
+            edge_limits={
+                (nodes[source_id], action): limit
+                for (source_id, action), limit in compiled.edge_limits.items()
+                if source_id in nodes
+            },
+            deadline=pick(limits.timeout_seconds, DEFAULT_TIMEOUT),
+            max_tokens=pick(limits.max_tokens, DEFAULT_MAX_TOKENS),
+            token_counter=lambda: usage.total,
+            fallback=pick(limits.fallback_action, DEFAULT_LIMIT_FALLBACK)
+        )
+    
+    @staticmethod
+    def _counters(stats: Dict[str, Any], usage: TokenUsage) -> Dict[str, Any]:
+        """Compteurs des garde-fous enregistrés dans les checkpoints"""
+        return {"steps": stats.get("steps", 0), "edges": dict(stats.get("edges", {})), "tokens": usage.total}
+    
+    @staticmethod
+    def _record_counts(execution: Execution, stats: Dict[str, Any], usage: TokenUsage) -> None:
+        """Reporte les compteurs des garde-fous sur l'exécution"""
+        execution.step_count = stats.get("steps", 0)
+        execution.edge_counts = stats.get("edges", {})
+        execution.token_count = usage.total
+        execution.limit_reached = stats.get("limit_reached")
+    
+    def _checkpoint(
+        self,
+        execution: Execution,
+        shared: Dict,
+        step: int,
+        node_id: Optional[str] = None,
+        completed: Optional[Set[str]] = None,
+        since: Optional[int] = None,
+        counters: Optional[Dict[str, Any]] = None
+    ) -> Tuple[ExecutionCheckpoint, Optional[int]]:
+        """Checkpoint de l'état courant et version de l'état qu'il contient.
+
+        Avec `since` (version du checkpoint précédent) et un VersionedState,
+        seules les clés écrites depuis sont copiées. Les valeurs sont copiées
+        en JSON (`snapshot_values`): l'écriture peut se faire dans un autre
+        thread pendant que l'exécution continue.
+        """
+        partial = since is not None and isinstance(shared, VersionedState)
+        deleted = None
+        if partial:
+            values, deleted = shared.changes_since(since)
+        else:
+            values = dict(shared)
+        checkpoint = ExecutionCheckpoint(
+            str(execution.id),
+            str(execution.workflow_id),
+            snapshot_values(values),
+            node_id=node_id,
+            completed=sorted(completed) if completed is not None else None,
+            parallel=completed is not None,
+            step=step,
+            partial=partial,
+            deleted=deleted,
+            counters=counters
+        )
+        return checkpoint, getattr(shared, "version", None)
+    
+    def _checkpoint_failed(self, execution: Execution, error: ValueError) -> None:
+        """Abandonne les checkpoints d'une exécution dont l'état n'est pas sérialisable.
+
+        L'exécution continue mais n'est plus reprenable: le dernier
+        checkpoint, devenu incohérent avec l'état, est supprimé.
+        """
+        logger.warning("Exécution %s non reprenable: %s", execution.id, error)
+        execution.checkpoint_error = str(error)
+        self.checkpoint_store.delete(str(execution.id))
+    
+    def _flow_checkpoint(
+        self,
+        execution: Execution,
+        step: int = 0,
+        asynchronous: bool = False,
+        counters: Optional[Callable[[], Dict[str, Any]]] = None
+    ) -> Optional[Callable[[Optional[Node], Dict], Any]]:
+        """Hook de Flow qui enregistre le prochain node et l'état partagé.
+
+        Avec `asynchronous`, le hook est une coroutine qui écrit le
+        checkpoint dans un thread pour ne pas bloquer la boucle.
+        `counters()` donne les compteurs des garde-fous à enregistrer.
+        Un état non sérialisable arrête les checkpoints (`_checkpoint_failed`)
+        sans faire échouer l'exécution.
+        """
+        if self.checkpoint_store is None:
+            return None
+        steps = itertools.count(step + 1)
+        since = None  # Premier checkpoint complet, puis incrémentaux
+        
+        def checkpoint(successor: Optional[Node], shared: Dict) -> None:
+            nonlocal since
+            # Fin du flow: effacé par _finish_execution
+            if successor is None or execution.checkpoint_error is not None:
+                return
+            try:
+                record, since = self._checkpoint(
+                    execution, shared, next(steps), node_id=successor.node_id, since=since,
+                    counters=counters() if counters is not None else None
+                )
+            except ValueError as e:
+                self._checkpoint_failed(execution, e)
+                return
+            self.checkpoint_store.save(record)
+        
+        async def acheckpoint(successor: Optional[Node], shared: Dict) -> None:
+            nonlocal since
+            if successor is None or execution.checkpoint_error is not None:
+                return
+            try:
+                record, since = self._checkpoint(
+                    execution, shared, next(steps), node_id=successor.node_id, since=since,
+                    counters=counters() if counters is not None else None
+                )
+            except ValueError as e:
+                await asyncio.to_thread(self._checkpoint_failed, execution, e)
+                return
+            await asyncio.to_thread(self.checkpoint_store.save, record)
+        
+        return acheckpoint if asynchronous else checkpoint
+    
+    def _dag_checkpoint(
+        self,
+        execution: Execution,
+        step: int = 0,
+        counters: Optional[Callable[[], Dict[str, Any]]] = None
+    ) -> Optional[Callable[[Set[str], Dict], Any]]:
+        """Hook de DAG qui enregistre les nodes terminés et l'état partagé (écriture dans un thread)"""
+        if self.checkpoint_store is None:
+            return None
+        steps = itertools.count(step + 1)
+        since = None
+        
+        async def checkpoint(completed: Set[str], shared: Dict) -> None:
+            nonlocal since
+            if execution.checkpoint_error is not None:
+                return
+            try:
+                record, since = self._checkpoint(
+                    execution, shared, next(steps), completed=completed, since=since,
+                    counters=counters() if counters is not None else None
+                )
+            except ValueError as e:
+                await asyncio.to_thread(self._checkpoint_failed, execution, e)
+                return
+            await asyncio.to_thread(self.checkpoint_store.save, record)
+        
+        return checkpoint
+    
+    def _start_execution(
+        self,
+        definition: WorkflowDefinition,
+        input_data: Dict,
+        user_id: Optional[UUID],
+        execution: Optional[Execution]
+    ) -> Execution:
+        """Crée (ou reprend) l'objet Execution et publie son démarrage"""
+        if execution is None:
+            execution = Execution(
+                workflow_id=definition.id,
+                input_data=input_data,
+                user_id=user_id
+            )
+        execution.status = ExecutionStatus.RUNNING
+        execution.error = None
+        execution.checkpoint_error = None
+        execution.completed_at = None
+        self.executions[str(execution.id)] = execution
+        event_bus.publish(
+            str(execution.id),
+            EXECUTION_STARTED,
+            workflow_id=str(definition.id)
+        )
+        return execution
+    
+    def _finish_execution(
+        self,
+        execution: Execution,
+        result: Optional[Dict] = None,
+        error: Optional[Exception] = None
+    ) -> Execution:
+        """Enregistre le résultat de l'exécution et publie sa fin"""
+        if error is None:
+            execution.status = ExecutionStatus.COMPLETED
+            execution.output_data = dict(result)
+            if self.checkpoint_store is not None:
+                self.checkpoint_store.delete(str(execution.id))
+        else:
+            execution.status = ExecutionStatus.FAILED
+            execution.error = str(error)
+        execution.completed_at = datetime.utcnow()
+        self.executions.pop(str(execution.id), None)
+        
+        duration = (execution.completed_at - execution.started_at).total_seconds()
+        WORKFLOW_EXECUTIONS.labels(execution.status.value).inc()
+        WORKFLOW_EXECUTION_DURATION.labels(execution.status.value).observe(duration)
+        event_bus.publish(
+            str(execution.id),
+            EXECUTION_FINISHED,
+            status=execution.status.value,
+            error=execution.error,
+            duration_ms=int(duration * 1000)
+        )
+        return execution
+    
     def run(
         self, 
         definition: WorkflowDefinition, 
         input_data: Dict,
-        user_id: Optional[UUID] = None
+        user_id: Optional[UUID] = None,
+        execution: Optional[Execution] = None
     ) -> Execution:
-        """Exécute un workflow de manière synchrone"""
+        """Exécute un workflow de manière synchrone.
+
+        L'exécution est toujours séquentielle: le mode DAG (`parallel`)
+        n'est disponible que via `run_async`.
+        """
         
         # Créer l'exécution
-        execution = Execution(
-            workflow_id=definition.id,
-            input_data=input_data,
-            status=ExecutionStatus.RUNNING,
-            user_id=user_id
-        )
-        self.executions[str(execution.id)] = execution
+        execution = self._start_execution(definition, input_data, user_id, execution)
+        sink_token = event_sink.set(functools.partial(event_bus.publish, str(execution.id)))
+        usage = TokenUsage()
+        step_usages: Dict[int, TokenUsage] = {}
+        usage_token = token_usage.set(usage)
+        stream_token = history_stream.set(str(execution.id))
+        flow = None
+        result, error = None, None
         
         try:
             # Construire et exécuter le flow
-            flow = self.build_flow(definition)
-            shared = input_data.copy()
+            compiled = self.compile(definition)
+            nodes = compiled.instantiate()
+            flow = Flow(
+                start=nodes[compiled.start_id],
+                listener=self._execution_listener(execution, step_usages),
+                step_context=self._step_usage(usage, step_usages),
+                checkpoint=self._flow_checkpoint(
+                    execution, counters=lambda: self._counters(flow.stats(), usage)
+                ),
+                limits=self._flow_limits(definition, compiled, nodes, usage)
+            )
+            shared = VersionedState(input_data)
             
             result = flow.run(shared)
             
-            # Mettre à jour l'exécution
-            execution.status = ExecutionStatus.COMPLETED
-            execution.output_data = result
-            execution.completed_at = datetime.utcnow()
-            
         except Exception as e:
-            execution.status = ExecutionStatus.FAILED
-            execution.error = str(e)
-            execution.completed_at = datetime.utcnow()
+            error = e
+        finally:
+            event_sink.reset(sink_token)
+            token_usage.reset(usage_token)
+            history_stream.reset(stream_token)
         
-        return execution
+        self._record_counts(execution, flow.stats() if flow is not None else {}, usage)
+        return self._finish_execution(execution, result, error)
     
     async def run_async(
         self, 
         definition: WorkflowDefinition, 
         input_data: Dict,
-        user_id: Optional[UUID] = None
+        user_id: Optional[UUID] = None,
+        parallel: bool = False,
+        max_concurrency: Optional[int] = None,
+        execution: Optional[Execution] = None,
+        checkpoint: Optional[ExecutionCheckpoint] = None
     ) -> Execution:
-        """Exécute un workflow de manière asynchrone"""
+        """Exécute un workflow de manière asynchrone.
+
+        Avec `parallel=True`, le workflow est exécuté comme un DAG (nodes
+        indépendants en parallèle, au plus `max_concurrency` à la fois); les
+        sous-graphes conditionnels ou cycliques y restent séquentiels, et un
+        workflow entièrement conditionnel garde l'exécution séquentielle.
+        Un `execution` existant (créé par l'API) peut être fourni pour que
+        les événements publiés portent son identifiant. Avec `checkpoint`,
+        l'exécution repart de l'état enregistré (voir `resume`).
+        """
         
-        execution = Execution(
-            workflow_id=definition.id,
-            input_data=input_data,
-            status=ExecutionStatus.RUNNING,
-            user_id=user_id
-        )
-        self.executions[str(execution.id)] = execution
+        execution = self._start_execution(definition, input_data, user_id, execution)
+        sink_token = event_sink.set(functools.partial(event_bus.publish, str(execution.id)))
+        usage = TokenUsage()
+        step_usages: Dict[int, TokenUsage] = {}
+        listener = self._execution_listener(execution, step_usages)
+        step_context = self._step_usage(usage, step_usages)
+        usage_token = token_usage.set(usage)
+        stream_token = history_stream.set(str(execution.id))
+        step = checkpoint.step if checkpoint is not None else 0
+        counters = checkpoint.counters if checkpoint is not None else {}
+        usage.total = counters.get("tokens", 0)  # Budget de tokens cumulé sur les reprises
+        flow = None
+        stats: Dict[str, Any] = {"steps": counters.get("steps", 0)}
+        result, error = None, None
         
         try:
-            flow = self.build_flow(definition)
-            shared = input_data.copy()
-            
-            result = await flow.run_async(shared)
+            shared = VersionedState(checkpoint.shared if checkpoint is not None else input_data)
+            compiled = self.compile(definition)
+            dependencies = compiled.dependencies if parallel else None
+            nodes = compiled.instantiate()
+            limits = self._flow_limits(definition, compiled, nodes, usage)
             
-            execution.status = ExecutionStatus.COMPLETED
-            execution.output_data = result
-            execution.completed_at = datetime.utcnow()
+            if dependencies is not None:
+                result = await self._run_dag(
+                    nodes,
+                    dependencies,
+                    shared,
+                    max_concurrency or self.max_concurrency,
+                    listener,
+                    completed=set(checkpoint.completed) if checkpoint is not None else None,
+                    checkpoint=self._dag_checkpoint(
+                        execution, step, counters=lambda: self._counters(stats, usage)
+                    ),
+                    limits=limits,
+                    stats=stats,
+                    groups=compiled.groups,
+                    step_context=step_context
+                )
+            else:
+                start = nodes[compiled.start_id]
+                if checkpoint is not None:
+                    if checkpoint.node_id not in nodes:
+                        raise ValueError(f"Node {checkpoint.node_id} absent du workflow: reprise impossible")
+                    start = nodes[checkpoint.node_id]
+                flow = Flow(
+                    start=start,
+                    listener=listener,
+                    checkpoint=self._flow_checkpoint(
+                        execution, step, asynchronous=True,
+                        counters=lambda: self._counters(flow.stats(), usage)
+                    ),
+                    limits=limits,
+                    counters=counters,
+                    step_context=step_context
+                )
+                result = await flow.run_async(shared)
             
         except Exception as e:
-            execution.status = ExecutionStatus.FAILED
-            execution.error = str(e)
-            execution.completed_at = datetime.utcnow()
+            error = e
+        finally:
+            event_sink.reset(sink_token)
+            token_usage.reset(usage_token)
+            history_stream.reset(stream_token)
         
-        return execution
+        self._record_counts(execution, flow.stats() if flow is not None else stats, usage)
+        return self._finish_execution(execution, result, error)
+    
+    async def resume(
+        self,
+        definition: WorkflowDefinition,
+        execution: Execution,
+        max_concurrency: Optional[int] = None,
+        restart: bool = False
+    ) -> Execution:
+        """Reprend une exécution interrompue depuis son dernier checkpoint.
+
+        Les nodes déjà terminés ne sont pas rejoués. Sans checkpoint, lève
+        ValueError, ou avec `restart=True` réexécute depuis le début.
+        """
+        execution_id = str(execution.id)
+        checkpoint = self.checkpoint_store.load(execution_id) if self.checkpoint_store else None
+        if checkpoint is None:
+            if not restart:
+                raise ValueError(f"Aucun checkpoint pour l'exécution {execution_id}")
+            return await self.run_async(
+                definition,
+                execution.input_data,
+                user_id=execution.user_id,
+                max_concurrency=max_concurrency,
+                execution=execution
+            )
+        return await self.run_async(
+            definition,
+            execution.input_data,
+            user_id=execution.user_id,
+            parallel=checkpoint.parallel,
+            max_concurrency=max_concurrency,
+            execution=execution,
+            checkpoint=checkpoint
+        )
     
     def get_execution(self, execution_id: str) -> Optional[Execution]:
-        """Récupère une exécution par son ID"""
+        """Récupère une exécution en cours par son ID"""
         return self.executions.get(execution_id)
 
 
@@ -349,12 +1259,18 @@ def create_workflow_from_template(template_name: str) -> WorkflowDefinition:
     return WORKFLOW_TEMPLATES[template_name]()
 
 
-# Instance globale du moteur
-workflow_engine = WorkflowEngine()
+# Instance globale du moteur (checkpoints configurés par EXECUTION_CHECKPOINTS)
+workflow_engine = WorkflowEngine(checkpoint_store=create_checkpoint_store())
+metrics.collector(
+    "workflow_active_executions",
+    "Exécutions de workflows en cours",
+    lambda: len(workflow_engine.executions)
+)
 
 
 __all__ = [
     "WorkflowEngine",
+    "CompiledFlow",
     "ToolNode",
     "workflow_engine",
     "create_content_pipeline",
@@ -0,0 +1,654 @@
+"""
+Ordonnanceur d'exécutions pour Nümtema Agents Studio
+
+Remplace les BackgroundTasks de FastAPI (sans limite ni file) pour les
+exécutions asynchrones:
+- File bornée (QueueFull au-delà de `max_size`)
+- Niveaux de priorité (high > normal > low, strict)
+- Équité entre tenants: round-robin au sein d'une même priorité
+- Pool de workers asyncio dans le processus, et/ou workers séparés
+  alimentés par Redis (`python -m workflows.worker`)
+- Métriques: profondeur de file, temps d'attente, exécutions en cours
+
+Durabilité: la file Redis garde chaque job retiré dans une liste "en
+cours" propre au consommateur jusqu'à son acquittement; les jobs d'un
+consommateur disparu (bail expiré) sont remis en file et repris depuis
+leur checkpoint. La file mémoire ne survit pas au processus: à l'arrêt,
+ses exécutions non terminées sont marquées en échec (reprenables via l'API
+si elles ont un checkpoint). Au redémarrage, seules celles de la même
+instance (EXECUTION_INSTANCE_ID, stable d'un redémarrage à l'autre et
+propre à chaque processus API) le sont: le dépôt est partagé entre
+workers, dont les exécutions en cours ne doivent pas être touchées.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from models import Execution, ExecutionPriority, ExecutionStatus, WorkflowDefinition
+from storage import ExecutionRepository
+from utils.metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+
+# Ordre de service des priorités
+PRIORITIES = [ExecutionPriority.HIGH, ExecutionPriority.NORMAL, ExecutionPriority.LOW]
+
+DEFAULT_TENANT = "default"
+
+# Identité stable de ce processus API (file mémoire); sans elle, pas de
+# nettoyage des exécutions orphelines au démarrage
+EXECUTION_INSTANCE_ID = os.getenv("EXECUTION_INSTANCE_ID") or None
+
+
+class QueueFull(Exception):
+    """La file d'exécution a atteint sa taille maximale"""
+
+
+class ExecutionJob:
+    """Exécution en attente dans la file"""
+
+    __slots__ = (
+        "execution", "workflow", "parallel", "max_concurrency",
+        "tenant_id", "priority", "enqueued_at", "resume", "receipt",
+    )
+
+    def __init__(
+        self,
+        execution: Execution,
+        workflow: WorkflowDefinition,
+        parallel: bool = False,
+        max_concurrency: Optional[int] = None,
+        tenant_id: Optional[str] = None,
+        priority: ExecutionPriority = ExecutionPriority.NORMAL,
+        enqueued_at: Optional[float] = None,
+        resume: bool = False
+    ):
+        self.execution = execution
+        self.workflow = workflow
+        self.parallel = parallel
+        self.max_concurrency = max_concurrency
+        self.tenant_id = tenant_id or DEFAULT_TENANT
+        self.priority = ExecutionPriority(priority)
+        self.enqueued_at = enqueued_at if enqueued_at is not None else time.time()
+        # Reprise depuis le dernier checkpoint au lieu d'une exécution complète
+        self.resume = resume
+        # Payload tel que retiré de la file (acquittement Redis)
+        self.receipt: Optional[str] = None
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "execution": self.execution.model_dump(mode="json"),
+            "workflow": self.workflow.model_dump(mode="json"),
+            "parallel": self.parallel,
+            "max_concurrency": self.max_concurrency,
+            "tenant_id": self.tenant_id,
+            "priority": self.priority.value,
+            "enqueued_at": self.enqueued_at,
+            "resume": self.resume,
+        })
+
+    @classmethod
+    def from_json(cls, data: str) -> "ExecutionJob":
+        payload = json.loads(data)
+        job = cls(
+            execution=Execution.model_validate(payload["execution"]),
+            workflow=WorkflowDefinition.model_validate(payload["workflow"]),
+            parallel=payload["parallel"],
+            max_concurrency=payload["max_concurrency"],
+            tenant_id=payload["tenant_id"],
+            priority=payload["priority"],
+            enqueued_at=payload["enqueued_at"],
+            resume=payload.get("resume", False),
+        )
+        job.receipt = data
+        return job
+
+
+# =============================================================================
+# FILES
+# =============================================================================
+
+class ExecutionQueue(ABC):
+    """Interface d'une file d'exécutions (priorités + round-robin par tenant).
+
+    Un job retiré par `get` doit être acquitté (`ack`) une fois traité, ou
+    rendu (`release`) s'il est interrompu.
+    """
+
+    # Les jobs survivent-ils à l'arrêt du processus?
+    durable = False
+
+    @abstractmethod
+    async def put(self, job: ExecutionJob) -> None:
+        """Ajoute une exécution; lève QueueFull si la file est pleine"""
+
+    @abstractmethod
+    async def get(self) -> ExecutionJob:
+        """Attend et retire la prochaine exécution à traiter"""
+
+    @abstractmethod
+    async def depth(self) -> Dict[str, int]:
+        """Nombre d'exécutions en attente par priorité"""
+
+    async def ack(self, job: ExecutionJob) -> None:
+        """Confirme le traitement d'un job retiré par `get`"""
+
+    async def release(self, job: ExecutionJob) -> bool:
+        """Remet en tête de file un job interrompu; False si la file ne le peut pas"""
+        return False
+
+    async def recover(self) -> int:
+        """Remet en file les jobs des consommateurs disparus; retourne leur nombre"""
+        return 0
+
+    async def drain(self) -> List[ExecutionJob]:
+        """Retire les jobs en attente qui seraient perdus à l'arrêt du processus"""
+        return []
+
+    async def close(self) -> None:
+        """Libère les ressources du consommateur"""
+
+
+class LocalExecutionQueue(ExecutionQueue):
+    """File en mémoire du processus"""
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        # priorité → tenant → exécutions (l'ordre des tenants sert au round-robin)
+        self._queues: Dict[ExecutionPriority, "OrderedDict[str, Deque[ExecutionJob]]"] = {
+            priority: OrderedDict() for priority in PRIORITIES
+        }
+        self._size = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._condition_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _get_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        return self._condition
+
+    def put_nowait(self, job: ExecutionJob) -> None:
+        if self._size >= self.max_size:
+            raise QueueFull(f"File d'exécution pleine ({self.max_size})")
+        self._queues[job.priority].setdefault(job.tenant_id, deque()).append(job)
+        self._size += 1
+
+    def get_nowait(self) -> Optional[ExecutionJob]:
+        for priority in PRIORITIES:
+            tenants = self._queues[priority]
+            if not tenants:
+                continue
+            tenant_id, jobs = next(iter(tenants.items()))
+            job = jobs.popleft()
+            if jobs:
+                tenants.move_to_end(tenant_id)  # Au tour du tenant suivant
+            else:
+                del tenants[tenant_id]
+            self._size -= 1
+            return job
+        return None
+
+    async def put(self, job: ExecutionJob) -> None:
+        condition = self._get_condition()
+        async with condition:
+            self.put_nowait(job)
+            condition.notify()
+
+    async def get(self) -> ExecutionJob:
+        condition = self._get_condition()
+        async with condition:
+            while True:
+                job = self.get_nowait()
+                if job is not None:
+                    return job
+                await condition.wait()
+
+    async def depth(self) -> Dict[str, int]:
+        return {
+            priority.value: sum(len(jobs) for jobs in self._queues[priority].values())
+            for priority in PRIORITIES
+        }
+
+    async def drain(self) -> List[ExecutionJob]:
+        jobs = []
+        while (job := self.get_nowait()) is not None:
+            jobs.append(job)
+        return jobs
+
+
+# Ajout atomique: refuse si la file est pleine, inscrit le tenant dans la
+# rotation de sa priorité quand sa file devient non vide
+_REDIS_PUT = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') >= tonumber(ARGV[2]) then
+  return 0
+end
+redis.call('INCR', KEYS[1])
+if redis.call('RPUSH', KEYS[2], ARGV[1]) == 1 then
+  redis.call('RPUSH', KEYS[3], ARGV[3])
+end
+return 1
+"""
+
+# Retrait atomique: priorités dans l'ordre, tenants en rotation; le job est
+# déplacé dans la liste "en cours" du consommateur (KEYS[1]) jusqu'à son
+# acquittement, et signalé s'il avait été remis en file après une interruption
+_REDIS_GET = """
+local prefix = ARGV[1]
+for i = 2, #ARGV do
+  local rotation = prefix .. ':tenants:' .. ARGV[i]
+  local count = redis.call('LLEN', rotation)
+  for _ = 1, count do
+    local tenant = redis.call('LPOP', rotation)
+    local queue = prefix .. ':queue:' .. ARGV[i] .. ':' .. tenant
+    local job = redis.call('LPOP', queue)
+    if job then
+      if redis.call('LLEN', queue) > 0 then
+        redis.call('RPUSH', rotation, tenant)
+      end
+      redis.call('DECR', prefix .. ':size')
+      redis.call('RPUSH', KEYS[1], job)
+      local id = cjson.decode(job)['execution']['id']
+      return {job, redis.call('HDEL', prefix .. ':requeued', id)}
+    end
+  end
+end
+return false
+"""
+
+# Remet en tête de leur file les jobs d'une liste "en cours" (KEYS[1]): tous,
+# ou seulement ARGV[2]; ils seront repris depuis leur checkpoint
+_REDIS_REQUEUE = """
+local prefix = ARGV[1]
+local jobs = ARGV[2] and {ARGV[2]} or redis.call('LRANGE', KEYS[1], 0, -1)
+local moved = 0
+for _, job in ipairs(jobs) do
+  if redis.call('LREM', KEYS[1], 1, job) > 0 then
+    local payload = cjson.decode(job)
+    local queue = prefix .. ':queue:' .. payload['priority'] .. ':' .. payload['tenant_id']
+    if redis.call('LPUSH', queue, job) == 1 then
+      redis.call('RPUSH', prefix .. ':tenants:' .. payload['priority'], payload['tenant_id'])
+    end
+    redis.call('INCR', prefix .. ':size')
+    redis.call('HSET', prefix .. ':requeued', payload['execution']['id'], 1)
+    moved = moved + 1
+  end
+end
+return moved
+"""
+
+
+class RedisExecutionQueue(ExecutionQueue):
+    """File Redis partagée entre l'API et des processus workers.
+
+    Chaque consommateur a une liste "en cours" et un bail renouvelé toutes
+    les `lease / 3` secondes: à l'expiration du bail (processus tué), un
+    autre consommateur remet ses jobs en file (`recover`).
+
+    Avec des workers séparés, EVENT_BUS_BACKEND=redis relaie les événements
+    d'exécution (SSE/WebSocket) jusqu'à l'API; avec le bus mémoire, l'API
+    ne voit que la fin de l'exécution, lue dans le dépôt.
+    """
+
+    durable = True
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        max_size: int = 1000,
+        prefix: str = "numtema:executions",
+        poll_interval: float = 0.5,
+        lease: float = float(os.getenv("EXECUTION_QUEUE_LEASE", "30"))
+    ):
+        import redis.asyncio as redis
+        self.client = redis.Redis.from_url(
+            url or os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            decode_responses=True
+        )
+        self.max_size = max_size
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._put = self.client.register_script(_REDIS_PUT)
+        self._get = self.client.register_script(_REDIS_GET)
+        self._requeue = self.client.register_script(_REDIS_REQUEUE)
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def _processing_key(self, consumer: str) -> str:
+        return f"{self.prefix}:processing:{consumer}"
+
+    def _lease_key(self, consumer: str) -> str:
+        return f"{self.prefix}:lease:{consumer}"
+
+    async def _renew(self) -> None:
+        await self.client.set(self._lease_key(self.consumer), 1, px=int(self.lease * 1000))
+        await self.client.sadd(f"{self.prefix}:consumers", self.consumer)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self._renew()
+                await self.recover()
+            except Exception:
+                logger.exception("Renouvellement du bail de la file d'exécution impossible")
+
+    async def put(self, job: ExecutionJob) -> None:
+        priority = job.priority.value
+        added = await self._put(
+            keys=[
+                f"{self.prefix}:size",
+                f"{self.prefix}:queue:{priority}:{job.tenant_id}",
+                f"{self.prefix}:tenants:{priority}",
+            ],
+            args=[job.to_json(), self.max_size, job.tenant_id]
+        )
+        if not added:
+            raise QueueFull(f"File d'exécution pleine ({self.max_size})")
+
+    async def get(self) -> ExecutionJob:
+        if self._heartbeat is None or self._heartbeat.done():
+            await self._renew()
+            self._heartbeat = asyncio.ensure_future(self._heartbeat_loop())
+        while True:
+            result = await self._get(
+                keys=[self._processing_key(self.consumer)],
+                args=[self.prefix, *(p.value for p in PRIORITIES)]
+            )
+            if result:
+                data, requeued = result
+                job = ExecutionJob.from_json(data)
+                job.resume = job.resume or bool(requeued)
+                return job
+            await asyncio.sleep(self.poll_interval)
+
+    async def ack(self, job: ExecutionJob) -> None:
+        await self.client.lrem(self._processing_key(self.consumer), 1, job.receipt)
+
+    async def release(self, job: ExecutionJob) -> bool:
+        moved = await self._requeue(
+            keys=[self._processing_key(self.consumer)],
+            args=[self.prefix, job.receipt]
+        )
+        return bool(moved)
+
+    async def recover(self) -> int:
+        recovered = 0
+        for consumer in await self.client.smembers(f"{self.prefix}:consumers"):
+            if consumer == self.consumer or await self.client.exists(self._lease_key(consumer)):
+                continue
+            moved = await self._requeue(keys=[self._processing_key(consumer)], args=[self.prefix])
+            await self.client.srem(f"{self.prefix}:consumers", consumer)
+            if moved:
+                logger.warning("%d exécution(s) du consommateur %s remises en file", moved, consumer)
+            recovered += moved
+        return recovered
+
+    async def close(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        await self.client.delete(self._lease_key(self.consumer))
+        await self.client.srem(f"{self.prefix}:consumers", self.consumer)
+
+    async def depth(self) -> Dict[str, int]:
+        depth = {}
+        for priority in PRIORITIES:
+            tenants = await self.client.lrange(f"{self.prefix}:tenants:{priority.value}", 0, -1)
+            total = 0
+            for tenant in tenants:
+                total += await self.client.llen(f"{self.prefix}:queue:{priority.value}:{tenant}")
+            depth[priority.value] = total
+        return depth
+
+
+# =============================================================================
+# ORDONNANCEUR
+# =============================================================================
+
+ExecutionRunner = Callable[[ExecutionJob], Awaitable[None]]
+
+
+def make_execution_runner(engine, repository) -> ExecutionRunner:
+    """Exécute un job avec le moteur et enregistre le résultat dans le dépôt.
+
+    Un job repris (reprise demandée, ou remis en file après l'arrêt de son
+    worker) repart de son checkpoint, ou du début s'il n'en a pas.
+    """
+
+    async def run(job: ExecutionJob) -> None:
+        if job.resume:
+            await engine.resume(
+                job.workflow, job.execution, max_concurrency=job.max_concurrency, restart=True
+            )
+            await repository.save(job.execution)
+            return
+        await engine.run_async(
+            job.workflow,
+            job.execution.input_data,
+            user_id=job.execution.user_id,
+            parallel=job.parallel,
+            max_concurrency=job.max_concurrency,
+            execution=job.execution
+        )
+        await repository.save(job.execution)
+
+    return run
+
+
+class ExecutionScheduler:
+    """File bornée + pool de workers asyncio.
+
+    Les workers démarrent à la première soumission (ou via `start()`) dans
+    la boucle d'événements courante. Avec `workers=0`, l'ordonnanceur ne
+    fait que remplir la file (workers dans des processus séparés).
+
+    Avec un `repository`, `stop()` enregistre le sort des exécutions
+    interrompues (remises en file: "pending", perdues: "failed") et
+    `recover()` traite au démarrage celles d'un processus disparu. Avec la
+    file mémoire, les exécutions sont marquées de `instance_id` (`claim`)
+    et `recover()` ne touche que celles de cette instance.
+    """
+
+    def __init__(
+        self,
+        runner: ExecutionRunner,
+        queue: Optional[ExecutionQueue] = None,
+        workers: int = 4,
+        wait_samples: int = 1000,
+        repository: Optional[ExecutionRepository] = None,
+        instance_id: Optional[str] = EXECUTION_INSTANCE_ID
+    ):
+        self.runner = runner
+        self.queue = queue if queue is not None else LocalExecutionQueue()
+        self.workers = workers
+        self.repository = repository
+        self.instance_id = instance_id
+        self.running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self._wait_times: Deque[float] = deque(maxlen=wait_samples)
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Job en cours de chaque worker
+        self._current: Dict[int, ExecutionJob] = {}
+
+    def start(self) -> None:
+        """Démarre les workers dans la boucle courante (idempotent)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._tasks = [loop.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Arrête les workers.
+
+        Les exécutions en cours sont annulées puis rendues à la file si elle
+        est durable (reprises par un autre worker depuis leur checkpoint),
+        sinon marquées en échec, comme celles encore en attente en mémoire.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        
+        interrupted, self._current = list(self._current.values()), {}
+        for job in interrupted:
+            requeued = await self.queue.release(job)
+            await self._interrupt(job.execution, requeued)
+        for job in await self.queue.drain():
+            await self._interrupt(job.execution, requeued=False)
+        await self.queue.close()
+
+    async def _interrupt(self, execution: Execution, requeued: bool) -> None:
+        if requeued:
+            execution.status = ExecutionStatus.PENDING
+        else:
+            execution.status = ExecutionStatus.FAILED
+            execution.error = "Exécution interrompue par l'arrêt du serveur"
+            execution.completed_at = datetime.utcnow()
+        if self.repository is not None:
+            await self.repository.save(execution)
+
+    def claim(self, execution: Execution) -> None:
+        """Marque une exécution comme servie par cette instance (file mémoire)"""
+        if not self.queue.durable:
+            execution.owner = self.instance_id
+
+    async def recover(self) -> int:
+        """Traite au démarrage les exécutions laissées par un processus disparu.
+
+        File durable: les jobs des consommateurs sans bail sont remis en
+        file. File mémoire: les exécutions de cette instance encore
+        "pending" ou "running" ne seront jamais servies et sont marquées en
+        échec; celles des autres instances (ou sans `instance_id`) ne sont
+        pas touchées. Retourne le nombre d'exécutions traitées.
+        """
+        if self.queue.durable:
+            return await self.queue.recover()
+        if self.repository is None or self.instance_id is None:
+            return 0
+        orphans: List[Execution] = []
+        for status in (ExecutionStatus.PENDING, ExecutionStatus.RUNNING):
+            cursor = None
+            while True:
+                page, cursor = await self.repository.list_page(status=status, limit=100, cursor=cursor)
+                orphans.extend(execution for execution in page if execution.owner == self.instance_id)
+                if cursor is None:
+                    break
+        for execution in orphans:
+            execution.status = ExecutionStatus.FAILED
+            execution.error = "Exécution interrompue par un redémarrage du serveur"
+            execution.completed_at = datetime.utcnow()
+            await self.repository.save(execution)
+        if orphans:
+            logger.warning("%d exécution(s) orpheline(s) marquée(s) en échec", len(orphans))
+        return len(orphans)
+
+    async def run_forever(self) -> None:
+        """Démarre les workers et attend leur arrêt (processus worker)"""
+        self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
+
+    async def submit(self, job: ExecutionJob) -> None:
+        """Met une exécution en file; lève QueueFull si la file est pleine"""
+        self.claim(job.execution)
+        try:
+            await self.queue.put(job)
+        except QueueFull:
+            self.rejected += 1
+            raise
+        self.submitted += 1
+        if self.workers:
+            self.start()
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self.queue.get()
+            self._current[index] = job
+            self._wait_times.append(time.time() - job.enqueued_at)
+            self.running += 1
+            try:
+                await self.runner(job)
+                if job.execution.status == ExecutionStatus.FAILED:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+            except asyncio.CancelledError:
+                raise  # Job rendu à la file par stop()
+            except Exception:
+                self.failed += 1
+                logger.exception("Exécution %s en échec", job.execution.id)
+            finally:
+                self.running -= 1
+            self._current.pop(index, None)
+            await self.queue.ack(job)
+
+    async def stats(self) -> Dict[str, Any]:
+        """Métriques de la file et des workers"""
+        waits = sorted(self._wait_times)
+        depth = await self.queue.depth()
+        return {
+            "queue_depth": sum(depth.values()),
+            "queue_depth_by_priority": depth,
+            "workers": self.workers,
+            "running": self.running,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_time_ms": {
+                "samples": len(waits),
+                "avg": sum(waits) / len(waits) * 1000 if waits else 0.0,
+                "p50": percentile(waits, 0.50) * 1000,
+                "p95": percentile(waits, 0.95) * 1000,
+                "max": waits[-1] * 1000 if waits else 0.0,
+            },
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+
+
+def create_execution_queue(backend: Optional[str] = None) -> ExecutionQueue:
+    """Crée la file configurée par EXECUTION_QUEUE_BACKEND (memory, redis)"""
+    backend = (backend or os.getenv("EXECUTION_QUEUE_BACKEND", "memory")).lower()
+    max_size = int(os.getenv("EXECUTION_QUEUE_MAX_SIZE", "1000"))
+    if backend == "memory":
+        return LocalExecutionQueue(max_size=max_size)
+    if backend == "redis":
+        return RedisExecutionQueue(max_size=max_size)
+    raise ValueError(f"Backend de file inconnu: {backend}")
+
+
+__all__ = [
+    "QueueFull",
+    "ExecutionJob",
+    "ExecutionQueue",
+    "LocalExecutionQueue",
+    "RedisExecutionQueue",
+    "ExecutionScheduler",
+    "make_execution_runner",
+    "create_execution_queue",
+    "PRIORITIES",
+]
@@ -0,0 +1,53 @@
+"""
+Statistiques des étapes d'exécution
+
+Agrège par node les ExecutionStep d'un ensemble d'exécutions: passages,
+échecs, retries, percentiles p50/p95 des durées (totale et par phase) et
+de la latence LLM, tokens consommés.
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from models import Execution, ExecutionStatus, ExecutionStep
+from utils.metrics import percentile
+
+
+def summarize_steps(executions: Iterable[Execution]) -> Dict[str, Dict[str, Any]]:
+    """Agrégat des étapes terminées, par node_id"""
+    by_node: Dict[str, List[ExecutionStep]] = defaultdict(list)
+    for execution in executions:
+        for step in execution.steps:
+            if step.status != ExecutionStatus.RUNNING:
+                by_node[str(step.node_id)].append(step)
+    return {node_id: _summarize(steps) for node_id, steps in by_node.items()}
+
+
+def _distribution(values: Iterable[Optional[float]]) -> Dict[str, float]:
+    values = sorted(value for value in values if value is not None)
+    return {
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+    }
+
+
+def _summarize(steps: List[ExecutionStep]) -> Dict[str, Any]:
+    return {
+        "node_name": steps[-1].node_name,
+        "runs": len(steps),
+        "failures": sum(1 for step in steps if step.status == ExecutionStatus.FAILED),
+        "retries": sum(step.retries for step in steps),
+        "duration_ms": _distribution(step.duration_ms for step in steps),
+        "prep_ms": _distribution(step.prep_ms for step in steps),
+        "exec_ms": _distribution(step.exec_ms for step in steps),
+        "post_ms": _distribution(step.post_ms for step in steps),
+        "llm_calls": sum(step.llm_calls for step in steps),
+        "llm_latency_ms": _distribution(step.llm_latency_ms for step in steps if step.llm_calls),
+        "prompt_tokens": sum(step.prompt_tokens for step in steps),
+        "completion_tokens": sum(step.completion_tokens for step in steps),
+    }
+
+
+__all__ = [
+    "summarize_steps",
+]
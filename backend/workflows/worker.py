@@ -0,0 +1,56 @@
+"""
+Processus worker d'exécutions
+
+Consomme la file Redis remplie par l'API (EXECUTION_QUEUE_BACKEND=redis,
+EXECUTION_WORKERS=0 côté API) et enregistre les résultats dans le dépôt
+d'exécutions partagé (EXECUTIONS_DATABASE_URL / DATABASE_URL). Un job
+n'est retiré de Redis qu'une fois traité: ceux d'un worker tué sont remis
+en file à l'expiration de son bail (EXECUTION_QUEUE_LEASE).
+
+Usage (depuis backend/):
+    python -m workflows.worker [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+
+from storage import create_execution_repository
+from utils.llm import close_async_clients
+from workflows import workflow_engine
+from workflows.scheduler import ExecutionScheduler, RedisExecutionQueue, make_execution_runner
+
+
+async def serve(concurrency: int) -> None:
+    repository = create_execution_repository()
+    scheduler = ExecutionScheduler(
+        make_execution_runner(workflow_engine, repository),
+        queue=RedisExecutionQueue(),
+        workers=concurrency,
+        repository=repository
+    )
+    # Jobs des workers tués (bail expiré) remis en file avant de servir
+    await scheduler.recover()
+    logging.info("Worker démarré (%d exécutions simultanées)", concurrency)
+    try:
+        await scheduler.run_forever()
+    finally:
+        await close_async_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker d'exécutions Nümtema")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("EXECUTION_WORKER_CONCURRENCY", "4")),
+        help="Nombre d'exécutions simultanées"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()